@@ -83,3 +83,21 @@ class TestTest(CovidcastBase):
 
         # verify old issue is no longer in latest table
         self.assertIsNone(self._find_matches_for_row(base_row)[latest_view])
+
+    def test_issue_intervals(self):
+        # every history row knows the issue that replaced it, also if issues arrive out of order
+
+        def intervals():
+            self._db._cursor.execute("SELECT issue, next_issue FROM epimetric_full_v ORDER BY issue")
+            return list(self._db._cursor)
+
+        open_issue = self._db.open_issue
+        self._insert_rows([CovidcastTestRow.make_default_row(issue=2020_02_02)])
+        self.assertEqual(intervals(), [(2020_02_02, open_issue)])
+
+        self._insert_rows([CovidcastTestRow.make_default_row(issue=2020_02_05)])
+        self.assertEqual(intervals(), [(2020_02_02, 2020_02_05), (2020_02_05, open_issue)])
+
+        # a backfilled issue in between
+        self._insert_rows([CovidcastTestRow.make_default_row(issue=2020_02_03)])
+        self.assertEqual(intervals(), [(2020_02_02, 2020_02_03), (2020_02_03, 2020_02_05), (2020_02_05, open_issue)])
@@ -91,6 +91,13 @@ class DeleteBatch(unittest.TestCase):
                 f'select geo_value, issue from {self._db.latest_view} where time_value=0 order by geo_value',
                 [('d_latest', 2),
                  ('d_nonlatest', 2)]
+            ),
+            # verify the issue intervals were reopened
+            Example(
+                f'select geo_value, issue, next_issue from {self._db.history_view} where time_value=0 order by geo_value, issue',
+                [('d_latest', 1, 2),
+                 ('d_latest', 2, self._db.open_issue),
+                 ('d_nonlatest', 2, self._db.open_issue)]
             )
         ]
 
@@ -288,6 +288,26 @@ class CovidcastTests(CovidcastBase):
       'message': 'success',
     })
 
+  def test_as_of_with_lag(self):
+    """Select the latest issue with a given lag as of a date."""
+
+    # insert placeholder data: the same key reported with lags 2 and 3
+    rows = [
+      CovidcastTestRow.make_default_row(time_value=2000_01_01, value=i*1., issue=2000_01_01+i, lag=i)
+      for i in [2, 3]
+    ]
+    self._insert_rows(rows)
+
+    # make the request
+    response = self.request_based_on_row(rows[0], as_of=2000_01_05, lag=2)
+
+    # the row with lag 2 is the latest of that lag, although a later issue exists
+    self.assertEqual(response, {
+      'result': 1,
+      'epidata': [rows[0].as_api_row_dict()],
+      'message': 'success',
+    })
+
   def test_signal_wildcard(self):
     """Select all signals with a wildcard query."""
 
@@ -344,6 +364,26 @@ class CovidcastTests(CovidcastBase):
     r = fetch(MSA[3])
     self.assertEqual(r['message'], 'no results')
 
+  def test_geo_value_key_table(self):
+    """Select more geo values than are passed as bind parameters, matching them regardless of case."""
+
+    # insert placeholder data with mixed case geo values of a geo type unknown to GeoMapper
+    rows = [
+      CovidcastTestRow.make_default_row(geo_type='dma', geo_value=f'Ab{i:04}', value=i*1.)
+      for i in [1, 2, 3]
+    ]
+    self._insert_rows(rows)
+
+    # more values than FILTER_KEY_TABLE_THRESHOLD, in a different case
+    geo_values = [f'aB{i:04}' for i in range(1, 1002)]
+    response = self.request_based_on_row(rows[0], geo_value=','.join(geo_values))
+
+    self.assertEqual(response['message'], 'success')
+    self.assertEqual(
+      sorted(response['epidata'], key=lambda row: row['geo_value']),
+      [row.as_api_row_dict() for row in rows],
+    )
+
   def test_location_timeline(self):
     """Select a timeline for a particular location."""
 
@@ -0,0 +1,106 @@
+"""
+benchmarks `/covidcast/` requests of increasing width (number of signals x geo types) executed as a single query
+against the same requests split into concurrently run per (signal, geo type) queries merged in python.
+the crossover point, where splitting starts to pay off, is a good value for COVIDCAST_FANOUT_MIN_QUERIES.
+
+needs a database with the epidata schema (e.g. the local docker setup used by the integration tests).
+with `--load` synthetic data for the source `bench` is inserted first (using the regular acquisition process).
+
+usage (with the package installed as `delphi.epidata`):
+    python scripts/benchmarks/covidcast_fanout.py --load [--signals 8] [--days 90]
+    python scripts/benchmarks/covidcast_fanout.py [--widths 1,2,4,8,16] [--repeat 5]
+"""
+import argparse
+from datetime import date, timedelta
+from statistics import median
+from time import perf_counter
+from unittest.mock import patch
+
+from delphi_utils import Nans
+
+from delphi.epidata.common.covidcast_row import CovidcastRow
+from delphi.epidata.server._common import app
+from delphi.epidata.server._config import QUERY_PARALLELISM
+from delphi.epidata.server.endpoints.covidcast import handle
+from delphi.epidata.server.utils.dates import day_to_time_value
+
+SOURCE = "bench"
+# geo types with synthetic geo values that don't need to be known to the geo mapper
+GEO_TYPES = {"county": 3200, "hrr": 306, "msa": 392, "state": 52}
+
+
+def load(signals: int, days: int):
+    # the acquisition code is only needed for loading
+    from delphi.epidata.acquisition.covidcast.database import Database
+
+    db = Database()
+    db.connect()
+    try:
+        start = date(2021, 1, 1)
+        rows = [
+            CovidcastRow(
+                source=SOURCE,
+                signal=f"sig{s}",
+                time_type="day",
+                geo_type=geo_type,
+                time_value=day_to_time_value(start + timedelta(days=d)),
+                geo_value=f"{g:05d}",
+                value=float(g + d),
+                stderr=0.5,
+                sample_size=100.0,
+                missing_value=Nans.NOT_MISSING.value,
+                missing_stderr=Nans.NOT_MISSING.value,
+                missing_sample_size=Nans.NOT_MISSING.value,
+                issue=day_to_time_value(start + timedelta(days=d + 1)),
+                lag=1,
+            )
+            for s in range(signals)
+            for geo_type, count in GEO_TYPES.items()
+            for d in range(days)
+            for g in range(count)
+        ]
+        print(f"loading {len(rows):,} rows")
+        db.insert_or_update_bulk(rows)
+    finally:
+        db.disconnect(True)
+
+
+def run(signals: int, geo_types: int, days: int, fanout: bool) -> float:
+    query = {
+        "signal": f"{SOURCE}:" + ",".join(f"sig{s}" for s in range(signals)),
+        "geo": ";".join(f"{geo_type}:*" for geo_type in list(GEO_TYPES)[:geo_types]),
+        "time": f"day:20210101-{day_to_time_value(date(2021, 1, 1) + timedelta(days=days - 1))}",
+        "format": "csv",
+    }
+    min_queries = 2 if fanout else 0
+    with patch("delphi.epidata.server.endpoints.covidcast.COVIDCAST_FANOUT_MIN_QUERIES", min_queries):
+        with app.test_request_context("/covidcast/", query_string=query):
+            start = perf_counter()
+            handle().get_data()
+            return perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--load", action="store_true", help="insert the synthetic data first")
+    parser.add_argument("--signals", type=int, default=8, help="number of synthetic signals")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--widths", default="1,2,4,8,16", help="number of (signal, geo type) combinations to request")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.load:
+        load(args.signals, args.days)
+
+    print(f"query parallelism: {QUERY_PARALLELISM}")
+    print(f"{'width':>6} {'signals':>8} {'geo types':>10} {'single (s)':>11} {'fan-out (s)':>12} {'speedup':>8}")
+    for width in (int(w) for w in args.widths.split(",")):
+        geo_types = min(len(GEO_TYPES), width)
+        signals = min(args.signals, max(1, width // geo_types))
+        single = median(run(signals, geo_types, args.days, False) for _ in range(args.repeat))
+        fanout = median(run(signals, geo_types, args.days, True) for _ in range(args.repeat))
+        print(f"{signals * geo_types:>6} {signals:>8} {geo_types:>10} {single:>11.3f} {fanout:>12.3f} {single / fanout:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
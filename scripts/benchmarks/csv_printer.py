@@ -0,0 +1,70 @@
+"""
+microbenchmark of the CSV printer against the previous implementation,
+which formatted every row with a `DictWriter` into a shared `StringIO` and emptied it after each row.
+
+usage (with the package installed as `delphi.epidata`):
+    python scripts/benchmarks/csv_printer.py [--rows 1000000]
+"""
+import argparse
+from csv import DictWriter
+from io import StringIO
+from time import perf_counter
+from typing import Dict
+
+from delphi.epidata.server._common import app
+from delphi.epidata.server._printer import CSVPrinter
+
+from printer_throughput import generate_rows
+
+
+class LegacyCSVPrinter(CSVPrinter):
+    """
+    the CSV printer before batching its output
+    """
+
+    _legacy_stream = StringIO()
+    _legacy_writer: DictWriter
+
+    def _format_row(self, first: bool, row: Dict):
+        if first:
+            columns = list(row.keys())
+            self._legacy_writer = DictWriter(self._legacy_stream, columns, lineterminator="\n")
+            self._legacy_writer.writeheader()
+        self._legacy_writer.writerow(row)
+
+        # remove the stream content to print just one line at a time
+        self._legacy_stream.flush()
+        v = self._legacy_stream.getvalue()
+        self._legacy_stream.seek(0)
+        self._legacy_stream.truncate(0)
+        return v
+
+    def _end(self):
+        return ""
+
+
+def run(printer: CSVPrinter, rows: int):
+    size = 0
+    start = perf_counter()
+    for i, row in enumerate(generate_rows(rows)):
+        v = printer._format_row(i == 0, row)
+        if v:
+            size += len(v)
+    size += len(printer._end())
+    return perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{'printer':<10} {'MiB':>8} {'seconds':>8} {'rows/s':>12}")
+    with app.test_request_context("/"):
+        for name, printer in (("legacy", LegacyCSVPrinter()), ("current", CSVPrinter())):
+            elapsed, size = run(printer, args.rows)
+            print(f"{name:<10} {size / 2**20:>8.1f} {elapsed:>8.2f} {args.rows / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+benchmarks the validation of the geo values of a request, as done when parsing the `geo` parameter.
+
+compares the cold start of a process (loading the valid geo values from GeoMapper or from a file written with
+`python -m delphi.epidata.server._geo_values <file>`) and the cost of validating a geo set per request, looking the
+values up with a new GeoMapper every time (as before) or in the frozensets loaded at startup.
+
+usage (with the package installed as `delphi.epidata`):
+    python scripts/benchmarks/geo_values.py [--requests 20] [--geo-values 10]
+"""
+import argparse
+import os
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import delphi_utils
+
+from delphi.epidata.server._geo_values import GEO_TYPE_TRANSLATOR, GeoValues, write_geo_values
+
+
+def time_it(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    return median(timings)
+
+
+def cold_start(path: str = "") -> None:
+    GeoValues(path).load()
+
+
+def validate_geomapper(geo_type: str, values) -> None:
+    allowed_values = delphi_utils.geomap.GeoMapper().get_geo_values(GEO_TYPE_TRANSLATOR[geo_type])
+    assert not set(values) - set(allowed_values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--geo-values", type=int, default=10, help="number of county values to validate per request")
+    args = parser.parse_args()
+
+    loaded = GeoValues()
+    values = sorted(loaded.allowed("county"))[: args.geo_values]
+
+    def validate_frozenset():
+        allowed_values = loaded.allowed("county")
+        assert not set(values) - allowed_values
+
+    with TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "geo_values.json.gz")
+        write_geo_values(path)
+        print(f"{'cold start':>24} {'median (ms)':>12}")
+        print(f"{'GeoMapper':>24} {time_it(cold_start, 5) * 1000:>12.3f}")
+        print(f"{'file':>24} {time_it(lambda: cold_start(path), 5) * 1000:>12.3f} ({os.path.getsize(path)} bytes)")
+
+    print(f"{'validation per request':>24} {'median (ms)':>12}")
+    per_geomapper = time_it(lambda: validate_geomapper("county", values), args.requests)
+    per_frozenset = time_it(validate_frozenset, args.requests * 1000)
+    print(f"{'GeoMapper':>24} {per_geomapper * 1000:>12.3f}")
+    print(f"{'frozenset':>24} {per_frozenset * 1000:>12.6f}")
+    print(f"speedup: {per_geomapper / per_frozenset:.0f}")
+
+
+if __name__ == "__main__":
+    main()
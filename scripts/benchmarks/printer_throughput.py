@@ -0,0 +1,75 @@
+"""
+benchmarks the throughput of the response printers, writing every chunk of a response with a separate syscall
+like a WSGI server does.
+
+compares the per row writes (PRINTER_CHUNK_SIZE=0) with the coalesced chunks of the configured size.
+
+usage (with the package installed as `delphi.epidata`):
+    python scripts/benchmarks/printer_throughput.py [--rows 1000000] [--format classic,json,csv,jsonl]
+"""
+import argparse
+import os
+from time import perf_counter
+from unittest.mock import patch
+
+from delphi.epidata.server._common import app
+from delphi.epidata.server._config import PRINTER_CHUNK_SIZE
+from delphi.epidata.server._printer import create_printer
+
+
+def generate_rows(n: int):
+    for i in range(n):
+        yield {
+            "geo_value": f"{i % 3200:05d}",
+            "signal": "smoothed_cli",
+            "source": "fb-survey",
+            "geo_type": "county",
+            "time_type": "day",
+            "time_value": 20200101 + i % 28,
+            "direction": None,
+            "issue": 20200201,
+            "lag": 3,
+            "missing_value": 0,
+            "missing_stderr": 0,
+            "missing_sample_size": 0,
+            "value": i * 0.25,
+            "stderr": 0.5,
+            "sample_size": 100.0,
+        }
+
+
+def run(format: str, rows: int, chunk_size: int):
+    fd = os.open(os.devnull, os.O_WRONLY)
+    writes = 0
+    size = 0
+    try:
+        with patch("delphi.epidata.server._printer.PRINTER_CHUNK_SIZE", chunk_size), app.test_request_context("/"):
+            start = perf_counter()
+            response = create_printer(None if format == "classic" else format)(generate_rows(rows))
+            for chunk in response.response:
+                data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                os.write(fd, data)
+                writes += 1
+                size += len(data)
+            elapsed = perf_counter() - start
+    finally:
+        os.close(fd)
+    return elapsed, writes, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", default="classic,json,csv,jsonl")
+    parser.add_argument("--chunk-size", type=int, default=PRINTER_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    print(f"{'format':<8} {'chunk size':>10} {'writes':>10} {'MiB':>8} {'seconds':>8} {'rows/s':>12}")
+    for format in args.format.split(","):
+        for chunk_size in (0, args.chunk_size):
+            elapsed, writes, size = run(format, args.rows, chunk_size)
+            print(f"{format:<8} {chunk_size:>10} {writes:>10} {size / 2**20:>8.1f} {elapsed:>8.2f} {args.rows / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
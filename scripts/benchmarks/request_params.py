@@ -0,0 +1,86 @@
+"""
+benchmarks the per request overhead of parsing the parameters of a `/covidcast/` request, as done by the rate limiter
+(multiples count and dashboard allowlist) and again by the endpoint, without touching the database.
+
+compares parsing the time values every time (the per process cache of parsed day and week values cleared before each
+request) with the cache kept warm, as for the repeated date lists of a dashboard. the modes alternate over several
+rounds and the best median of each is reported, the overhead is a fraction of a millisecond and single runs are noisy.
+
+usage (with the package installed as `delphi.epidata`):
+    python scripts/benchmarks/request_params.py [--requests 200] [--rounds 5] [--geo-values 3] [--time-values 30]
+"""
+import argparse
+from datetime import date, timedelta
+from statistics import median
+from time import perf_counter
+
+from delphi.epidata.server._common import app
+from delphi.epidata.server._limiter import check_signals_allowlist, get_multiples_count
+from delphi.epidata.server._params import (
+    extract_date,
+    extract_dates,
+    extract_integer,
+    parse_day_value,
+    parse_geo_sets,
+    parse_source_signal_sets,
+    parse_time_set,
+    parse_week_value,
+)
+
+GEO_VALUES = ["ca", "ny", "pa", "tx", "fl", "wa", "oh", "mi"]
+
+
+def handle_stub(request):
+    """
+    the parameter handling of a `/covidcast/` request: the limiter's checks, then the endpoint's parsing
+    """
+    get_multiples_count(request)
+    check_signals_allowlist(request)
+    parse_source_signal_sets()
+    parse_time_set()
+    parse_geo_sets()
+    extract_date("as_of")
+    extract_dates("issues")
+    extract_integer("lag")
+
+
+def run(requests: int, geo_values: int, time_values: int, cached: bool) -> float:
+    days = [(date(2021, 1, 1) + timedelta(days=i)).strftime("%Y%m%d") for i in range(time_values)]
+    query = {
+        "signal": "fb-survey:smoothed_wcli,smoothed_wili",
+        "geo": "state:" + ",".join(GEO_VALUES[:geo_values]),
+        "time": "day:" + ",".join(days),
+        "issues": "20210401",
+    }
+    timings = []
+    for _ in range(requests):
+        if not cached:
+            parse_day_value.cache_clear()
+            parse_week_value.cache_clear()
+        with app.test_request_context("/covidcast/", query_string=query) as ctx:
+            start = perf_counter()
+            handle_stub(ctx.request)
+            timings.append(perf_counter() - start)
+    return median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--geo-values", type=int, default=3, help=f"number of geo values to request (up to {len(GEO_VALUES)})")
+    parser.add_argument("--time-values", type=int, default=30, help="number of listed days to request")
+    args = parser.parse_args()
+
+    uncached = cached = float("inf")
+    for _ in range(args.rounds):
+        uncached = min(uncached, run(args.requests, args.geo_values, args.time_values, False))
+        cached = min(cached, run(args.requests, args.geo_values, args.time_values, True))
+    print(f"{'time values':>12} {'median per request (ms)':>24}")
+    print(f"{'parsed':>12} {uncached * 1000:>24.3f}")
+    print(f"{'cached':>12} {cached * 1000:>24.3f}")
+    print(f"speedup: {uncached / cached:.2f}")
+
+
+if __name__ == "__main__":
+    main()
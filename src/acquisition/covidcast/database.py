@@ -34,6 +34,8 @@ class Database:
   latest_view = latest_table + "_v"
   history_table = "epimetric_full"
   history_view = history_table + "_v"
+  # `next_issue` of the rows that are still the latest issue of their key (see "v4_schema.sql")
+  open_issue = 2147483647
   # TODO: consider using class variables like this for dimension table names too
   # TODO: also consider that for composite key tuples, like short_comp_key and long_comp_key as used in delete_batch()
 
@@ -104,6 +106,27 @@ class Database:
     output = [self._cursor.column_names] + self._cursor.fetchall()
     get_structured_logger('do_analyze').info("ANALYZE results", results=str(output))
 
+  def _update_issue_intervals_sql(self, key_table):
+    """
+    SQL that recomputes `next_issue` of all history rows with a (signal, geo, time) key that appears in `key_table`
+    (a table with the columns of the load table), as issues can be added or removed in between existing ones
+    """
+    return f'''
+        UPDATE {self.history_table} h JOIN (
+            SELECT
+                f.epimetric_id,
+                LEAD(f.issue, 1, {self.open_issue}) OVER (PARTITION BY f.signal_key_id, f.geo_key_id, f.time_type, f.time_value ORDER BY f.issue) AS next_issue
+            FROM {self.history_table} f JOIN (
+                SELECT DISTINCT sd.signal_key_id, gd.geo_key_id, k.time_type, k.time_value
+                    FROM `{key_table}` k
+                        INNER JOIN signal_dim sd USING (source, `signal`)
+                        INNER JOIN geo_dim gd USING (geo_type, geo_value)
+            ) changed USING (signal_key_id, geo_key_id, time_type, time_value)
+        ) n USING (epimetric_id)
+        SET h.next_issue = n.next_issue
+        WHERE h.next_issue <> n.next_issue
+    '''
+
   def insert_or_update_bulk(self, cc_rows):
     return self.insert_or_update_batch(cc_rows)
 
@@ -260,6 +283,17 @@ class Database:
             `missing_sample_size` = sl.`missing_sample_size`
     '''
 
+    # close the issue intervals of the rows superseded by this load (and of the loaded rows, if they are backfills)
+    epimetric_full_intervals = self._update_issue_intervals_sql(self.load_table)
+
+    # bump the generation of every signal touched by this load, so cached API responses get invalidated
+    signal_version_bump = f'''
+        INSERT INTO signal_version (`source`, `signal`)
+            SELECT DISTINCT sl.source, sl.signal
+                FROM {self.load_table} AS sl
+        ON DUPLICATE KEY UPDATE `version` = `version` + 1
+    '''
+
     # NOTE: DO NOT `TRUNCATE` THIS TABLE!  doing so will ruin the AUTO_INCREMENT counter that the history and latest tables depend on...
     epimetric_load_delete_processed = f'''
         DELETE FROM `{self.load_table}`
@@ -282,10 +316,18 @@ class Database:
       time_q.append(time.time())
       logger.debug('epimetric_full_load', rows=self._cursor.rowcount, elapsed=time_q[-1]-time_q[-2])
 
+      self._cursor.execute(epimetric_full_intervals)
+      time_q.append(time.time())
+      logger.debug('epimetric_full_intervals', rows=self._cursor.rowcount, elapsed=time_q[-1]-time_q[-2])
+
       self._cursor.execute(epimetric_latest_load)
       time_q.append(time.time())
       logger.debug('epimetric_latest_load', rows=self._cursor.rowcount, elapsed=time_q[-1]-time_q[-2])
 
+      self._cursor.execute(signal_version_bump)
+      time_q.append(time.time())
+      logger.debug('signal_version_bump', rows=self._cursor.rowcount, elapsed=time_q[-1]-time_q[-2])
+
       self._cursor.execute(epimetric_load_delete_processed)
       time_q.append(time.time())
       logger.debug('epimetric_load_delete_processed', rows=self._cursor.rowcount, elapsed=time_q[-1]-time_q[-2])
@@ -397,6 +439,16 @@ FROM {self.history_view} h JOIN (
   ) d USING ({long_comp_key});
 '''
 
+    # reopen the issue intervals of the rows preceding the deleted ones
+    # NOTE: this must be executed *AFTER* `delete_history_sql` as well
+    update_intervals_sql = self._update_issue_intervals_sql(tmp_table_name)
+
+    signal_version_bump_sql = f'''
+INSERT INTO signal_version (`source`, `signal`)
+  SELECT DISTINCT `source`, `signal` FROM {tmp_table_name} WHERE delete_history_id IS NOT NULL
+ON DUPLICATE KEY UPDATE `version` = `version` + 1;
+'''
+
     drop_tmp_table_sql = f'DROP TABLE IF EXISTS {tmp_table_name}'
 
     total = None
@@ -427,6 +479,10 @@ FROM {self.history_view} h JOIN (
       print(f"delete_latest_sql:{self._cursor.rowcount}")
       self._cursor.execute(update_latest_sql)
       print(f"update_latest_sql:{self._cursor.rowcount}")
+      self._cursor.execute(update_intervals_sql)
+      print(f"update_intervals_sql:{self._cursor.rowcount}")
+      self._cursor.execute(signal_version_bump_sql)
+      print(f"signal_version_bump_sql:{self._cursor.rowcount}")
       self._connection.commit()
 
       if total == -1:
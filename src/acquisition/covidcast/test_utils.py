@@ -163,7 +163,7 @@ class CovidcastBase(unittest.TestCase):
         self._db.connect()
 
         # empty all of the data tables
-        for table in "epimetric_load  epimetric_latest  epimetric_full  geo_dim  signal_dim".split():
+        for table in "epimetric_load  epimetric_latest  epimetric_full  geo_dim  signal_dim  signal_version".split():
             self._db._cursor.execute(f"TRUNCATE TABLE {table};")
         self.localSetUp()
         self._db._connection.commit()
@@ -0,0 +1,6 @@
+-- the api labels unordered covidcast rows from a copy of the dimension tables,
+-- so it reads the fact and dimension tables directly instead of only through the joining views
+CREATE VIEW `epidata`.`signal_dim`       AS SELECT * FROM `covid`.`signal_dim`;
+CREATE VIEW `epidata`.`geo_dim`          AS SELECT * FROM `covid`.`geo_dim`;
+CREATE VIEW `epidata`.`epimetric_full`   AS SELECT * FROM `covid`.`epimetric_full`;
+CREATE VIEW `epidata`.`epimetric_latest` AS SELECT * FROM `covid`.`epimetric_latest`;
@@ -0,0 +1,61 @@
+USE covid;
+
+-- issue intervals for `as_of` queries, see `next_issue` in "v4_schema.sql".
+-- the api uses them as soon as `epimetric_full_v` provides the column, so the views are only replaced after the backfill.
+
+ALTER TABLE epimetric_full
+    ADD COLUMN `next_issue` INT(11) NOT NULL DEFAULT 2147483647,
+    ALGORITHM=INSTANT;
+-- `epimetric_latest` declares the column as well in "v4_schema.sql", it is always 2147483647 there
+ALTER TABLE epimetric_latest
+    ADD COLUMN `next_issue` INT(11) NOT NULL DEFAULT 2147483647,
+    ALGORITHM=INSTANT;
+
+-- backfill, acquisition runs have to be paused until the views are replaced below
+UPDATE epimetric_full h JOIN (
+    SELECT
+        epimetric_id,
+        LEAD(issue, 1, 2147483647) OVER (PARTITION BY signal_key_id, geo_key_id, time_type, time_value ORDER BY issue) AS next_issue
+    FROM epimetric_full
+) n USING (epimetric_id)
+SET h.next_issue = n.next_issue
+WHERE h.next_issue <> n.next_issue;
+
+ALTER TABLE epimetric_full
+    ADD INDEX `value_key_tgn` (`signal_key_id`, `time_type`, `time_value`, `geo_key_id`, `next_issue`, `issue`);
+
+CREATE OR REPLACE VIEW epimetric_full_v AS
+    SELECT
+        0 AS `is_latest_issue`,
+        NULL AS `direction`,
+        `t2`.`source` AS `source`,
+        `t2`.`signal` AS `signal`,
+        `t3`.`geo_type` AS `geo_type`,
+        `t3`.`geo_value` AS `geo_value`,
+        `t1`.`epimetric_id` AS `epimetric_id`,
+        `t1`.`strat_key_id` AS `strat_key_id`,
+        `t1`.`issue` AS `issue`,
+        `t1`.`data_as_of_dt` AS `data_as_of_dt`,
+        `t1`.`time_type` AS `time_type`,
+        `t1`.`time_value` AS `time_value`,
+        `t1`.`reference_dt` AS `reference_dt`,
+        `t1`.`value` AS `value`,
+        `t1`.`stderr` AS `stderr`,
+        `t1`.`sample_size` AS `sample_size`,
+        `t1`.`lag` AS `lag`,
+        `t1`.`value_updated_timestamp` AS `value_updated_timestamp`,
+        `t1`.`computation_as_of_dt` AS `computation_as_of_dt`,
+        `t1`.`missing_value` AS `missing_value`,
+        `t1`.`missing_stderr` AS `missing_stderr`,
+        `t1`.`missing_sample_size` AS `missing_sample_size`,
+        `t1`.`signal_key_id` AS `signal_key_id`,
+        `t1`.`geo_key_id` AS `geo_key_id`,
+        `t1`.`next_issue` AS `next_issue`
+    FROM `epimetric_full` `t1`
+        JOIN `signal_dim` `t2` USING (`signal_key_id`)
+        JOIN `geo_dim` `t3` USING (`geo_key_id`);
+
+-- the aliases list the columns as of their creation
+CREATE OR REPLACE VIEW `epidata`.`epimetric_full_v` AS SELECT * FROM `covid`.`epimetric_full_v`;
+CREATE OR REPLACE VIEW `epidata`.`epimetric_full`   AS SELECT * FROM `covid`.`epimetric_full`;
+CREATE OR REPLACE VIEW `epidata`.`epimetric_latest` AS SELECT * FROM `covid`.`epimetric_latest`;
@@ -0,0 +1,17 @@
+USE covid;
+
+-- generation counter per signal, see `signal_version` in "v4_schema.sql"
+CREATE TABLE `signal_version` (
+    `source` VARCHAR(32) NOT NULL,
+    `signal` VARCHAR(64) NOT NULL,
+    `version` BIGINT(20) UNSIGNED NOT NULL DEFAULT 1,
+    `last_modified` TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+
+    PRIMARY KEY (`source`, `signal`)
+) ENGINE=InnoDB;
+
+-- seed with all known signals
+INSERT INTO `signal_version` (`source`, `signal`)
+    SELECT `source`, `signal` FROM `signal_dim`;
+
+CREATE VIEW `epidata`.`signal_version` AS SELECT * FROM `covid`.`signal_version`;
@@ -42,16 +42,24 @@ CREATE TABLE epimetric_full (
     `missing_value` INT(1) DEFAULT '0',
     `missing_stderr` INT(1) DEFAULT '0',
     `missing_sample_size` INT(1) DEFAULT '0',
+    -- the issue that replaced this one (2147483647 while it is the latest issue), maintained by the acquisition.
+    -- the issue valid `as_of` a given date is then `issue <= as_of AND as_of < next_issue`
+    `next_issue` INT(11) NOT NULL DEFAULT 2147483647,
 
     UNIQUE INDEX `value_key_tig` (`signal_key_id`, `time_type`, `time_value`, `issue`, `geo_key_id`),
     UNIQUE INDEX `value_key_tgi` (`signal_key_id`, `time_type`, `time_value`, `geo_key_id`, `issue`),
     UNIQUE INDEX `value_key_itg` (`signal_key_id`, `issue`, `time_type`, `time_value`, `geo_key_id`),
     UNIQUE INDEX `value_key_igt` (`signal_key_id`, `issue`, `geo_key_id`, `time_type`, `time_value`),
     UNIQUE INDEX `value_key_git` (`signal_key_id`, `geo_key_id`, `issue`, `time_type`, `time_value`),
-    UNIQUE INDEX `value_key_gti` (`signal_key_id`, `geo_key_id`, `time_type`, `time_value`, `issue`)
+    UNIQUE INDEX `value_key_gti` (`signal_key_id`, `geo_key_id`, `time_type`, `time_value`, `issue`),
+    INDEX `value_key_tgn` (`signal_key_id`, `time_type`, `time_value`, `geo_key_id`, `next_issue`, `issue`)
 ) ENGINE=InnoDB;
 
 CREATE TABLE epimetric_latest (
+    -- declared to keep the table in sync with `epimetric_full` (see "migrations/epimetric_next_issue_v0.1.sql"),
+    -- always 2147483647 here
+    `next_issue` INT(11) NOT NULL DEFAULT 2147483647,
+
     PRIMARY KEY (`epimetric_id`),
     UNIQUE INDEX `value_key_tg` (`signal_key_id`, `time_type`, `time_value`, `geo_key_id`),
     UNIQUE INDEX `value_key_gt` (`signal_key_id`, `geo_key_id`, `time_type`, `time_value`)
@@ -121,7 +129,8 @@ CREATE OR REPLACE VIEW epimetric_full_v AS
         `t1`.`missing_stderr` AS `missing_stderr`,
         `t1`.`missing_sample_size` AS `missing_sample_size`,
         `t1`.`signal_key_id` AS `signal_key_id`,
-        `t1`.`geo_key_id` AS `geo_key_id`
+        `t1`.`geo_key_id` AS `geo_key_id`,
+        `t1`.`next_issue` AS `next_issue`
     FROM `epimetric_full` `t1`
         JOIN `signal_dim` `t2` USING (`signal_key_id`)
         JOIN `geo_dim` `t3` USING (`geo_key_id`);
@@ -165,6 +174,17 @@ CREATE TABLE `covidcast_meta_cache` (
 ) ENGINE=InnoDB;
 INSERT INTO covidcast_meta_cache VALUES (0, '[]');
 
+-- generation counter per signal, bumped by the acquisition whenever rows of a signal are added, updated, or deleted.
+-- used by the API server to validate cached responses and compute conditional GET validators.
+CREATE TABLE `signal_version` (
+    `source` VARCHAR(32) NOT NULL,
+    `signal` VARCHAR(64) NOT NULL,
+    `version` BIGINT(20) UNSIGNED NOT NULL DEFAULT 1,
+    `last_modified` TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+
+    PRIMARY KEY (`source`, `signal`)
+) ENGINE=InnoDB;
+
 CREATE TABLE `coverage_crossref` (
     `signal_key_id` bigint NOT NULL,
     `geo_key_id` bigint NOT NULL,
@@ -9,3 +9,8 @@ CREATE VIEW `epidata`.`epimetric_full_v`     AS SELECT * FROM `covid`.`epimetric
 CREATE VIEW `epidata`.`epimetric_latest_v`   AS SELECT * FROM `covid`.`epimetric_latest_v`;
 CREATE VIEW `epidata`.`covidcast_meta_cache` AS SELECT * FROM `covid`.`covidcast_meta_cache`;
 CREATE VIEW `epidata`.`coverage_crossref_v`  AS SELECT * FROM `covid`.`coverage_crossref_v`;
+CREATE VIEW `epidata`.`signal_version`       AS SELECT * FROM `covid`.`signal_version`;
+CREATE VIEW `epidata`.`signal_dim`           AS SELECT * FROM `covid`.`signal_dim`;
+CREATE VIEW `epidata`.`geo_dim`              AS SELECT * FROM `covid`.`geo_dim`;
+CREATE VIEW `epidata`.`epimetric_full`       AS SELECT * FROM `covid`.`epimetric_full`;
+CREATE VIEW `epidata`.`epimetric_latest`     AS SELECT * FROM `covid`.`epimetric_latest`;
@@ -8,6 +8,34 @@ import redis
 REDIS_HOST = os.environ.get("REDIS_HOST", "delphi_redis")
 REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "1234")
 LAST_USED_KEY_PATTERN = "*LAST_USED*"
+# number of keys read from redis (and inserted into the database) at once
+BATCH_SIZE = 1000
+
+
+def _read_last_used(redis_cli):
+    """
+    yields (redis key, api key, last used date) of the keys written by the api servers, without blocking redis
+    (`SCAN` instead of `KEYS`)
+    """
+    batch = []
+    for key in redis_cli.scan_iter(match=LAST_USED_KEY_PATTERN, count=BATCH_SIZE):
+        batch.append(key)
+        if len(batch) >= BATCH_SIZE:
+            yield from _parse_batch(redis_cli, batch)
+            batch = []
+    if batch:
+        yield from _parse_batch(redis_cli, batch)
+
+
+def _parse_batch(redis_cli, keys):
+    for key, value in zip(keys, redis_cli.mget(keys)):
+        if value is None:
+            # deleted in the meantime
+            continue
+        try:
+            yield key, str(key).split("/")[1], dtime.strptime(str(value), "%Y-%m-%d").date()
+        except (IndexError, ValueError):
+            print(f"skipping malformed last used entry {key}={value}")
 
 
 def main():
@@ -16,23 +44,45 @@ def main():
     cnx = mysql.connector.connect(database="epidata", user=u, password=p, host=secrets.db.host)
     cur = cnx.cursor()
 
-    redis_keys = redis_cli.keys(pattern=LAST_USED_KEY_PATTERN)
-    today_date = dtime.today().date()
-    for key in redis_keys:
-        api_key, last_time_used = str(key).split("/")[1], dtime.strptime(str(redis_cli.get(key)), "%Y-%m-%d").date()
-        cur.execute(
-            f"""
-            UPDATE
-                api_user
-            SET last_time_used = "{last_time_used}"
-            WHERE api_key = "{api_key}" AND (last_time_used < "{last_time_used}" OR last_time_used IS NULL)
+    # collect the dates in a temporary table, to update all users with a single statement
+    cur.execute(
         """
-        )
-        redis_cli.delete(key)
+        CREATE TEMPORARY TABLE last_used_tmp (
+            api_key VARCHAR(50) NOT NULL PRIMARY KEY,
+            last_time_used DATE NOT NULL
+        ) ENGINE=MEMORY
+    """
+    )
+    redis_keys = []
+    rows = []
+    for key, api_key, last_time_used in _read_last_used(redis_cli):
+        redis_keys.append(key)
+        rows.append((api_key, last_time_used))
+        if len(rows) >= BATCH_SIZE:
+            cur.executemany("INSERT INTO last_used_tmp VALUES (%s, %s) ON DUPLICATE KEY UPDATE last_time_used = GREATEST(last_time_used, VALUES(last_time_used))", rows)
+            rows = []
+    if rows:
+        cur.executemany("INSERT INTO last_used_tmp VALUES (%s, %s) ON DUPLICATE KEY UPDATE last_time_used = GREATEST(last_time_used, VALUES(last_time_used))", rows)
+
+    cur.execute(
+        """
+        UPDATE
+            api_user u
+            JOIN last_used_tmp t ON t.api_key = u.api_key
+        SET u.last_time_used = t.last_time_used
+        WHERE u.last_time_used < t.last_time_used OR u.last_time_used IS NULL
+    """
+    )
+    print(f"updated the last used date of {cur.rowcount} users from {len(redis_keys)} keys")
+    cur.execute("DROP TEMPORARY TABLE last_used_tmp")
     cur.close()
     cnx.commit()
     cnx.close()
 
+    # only remove the keys once their dates are stored
+    for start in range(0, len(redis_keys), BATCH_SIZE):
+        redis_cli.delete(*redis_keys[start : start + BATCH_SIZE])
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,168 @@
+from threading import Lock
+from time import time
+from typing import Dict, Optional, Set
+from uuid import uuid4
+
+import redis
+from delphi_utils import get_structured_logger
+from flask import Blueprint, g, request
+
+from ._common import app
+from ._config import (
+    ADMISSION_LEASE,
+    ADMISSION_LIMITS,
+    ADMISSION_REDIS,
+    ADMISSION_RETRY_AFTER,
+    REDIS_HOST,
+    REDIS_PASSWORD,
+)
+from ._exceptions import ServiceUnavailableException
+from ._metrics import metrics
+
+# parameters that make covidcast read the history instead of the latest values
+_HISTORY_PARAMS = ("as_of", "issues", "lag")
+
+
+class AdmissionGate:
+    """
+    limits the number of concurrently running requests of an endpoint or query class within this process.
+    requests beyond the limit are rejected right away, a waiting request would block its worker (see `SingleFlight`)
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._lock = Lock()
+        self._active: Set[str] = set()
+
+    def enter(self) -> Optional[str]:
+        """
+        takes a slot, returns a token to leave with or None if there is no free slot
+        """
+        with self._lock:
+            if len(self._active) >= self.limit:
+                return None
+            token = uuid4().hex
+            self._active.add(token)
+            self._report(len(self._active))
+            return token
+
+    def leave(self, token: str) -> None:
+        with self._lock:
+            self._active.discard(token)
+            self._report(len(self._active))
+
+    def _report(self, in_flight: int) -> None:
+        metrics.set(f"admission.{self.name}.in_flight", in_flight)
+
+
+class RedisAdmissionGate(AdmissionGate):
+    """
+    an admission gate shared by all processes using the same redis, a slot is a member of a sorted set scored by
+    the time it was taken. abandoned slots expire after `ADMISSION_LEASE` seconds.
+    if redis is not available, requests are let through
+    """
+
+    def __init__(self, name: str, limit: int, r: redis.Redis):
+        super().__init__(name, limit)
+        self._redis = r
+        self._slots_key = f"ADMISSION/{name}/slots"
+
+    def enter(self) -> Optional[str]:
+        token = uuid4().hex
+        now = time()
+        try:
+            pipe = self._redis.pipeline()
+            pipe.zremrangebyscore(self._slots_key, "-inf", now - ADMISSION_LEASE)
+            pipe.zadd(self._slots_key, {token: now})
+            pipe.expire(self._slots_key, ADMISSION_LEASE)
+            pipe.zrank(self._slots_key, token)
+            pipe.zcard(self._slots_key)
+            rank, taken = pipe.execute()[-2:]
+            if rank is not None and rank < self.limit:
+                self._report(taken)
+                return token
+            pipe = self._redis.pipeline()
+            pipe.zrem(self._slots_key, token)
+            pipe.zcard(self._slots_key)
+            self._report(pipe.execute()[-1])
+            return None
+        except redis.RedisError as e:
+            get_structured_logger("admission").warning("failed to get a slot from redis", exception=e)
+            return token
+
+    def leave(self, token: str) -> None:
+        try:
+            pipe = self._redis.pipeline()
+            pipe.zrem(self._slots_key, token)
+            pipe.zcard(self._slots_key)
+            self._report(pipe.execute()[-1])
+        except redis.RedisError as e:
+            get_structured_logger("admission").warning("failed to release a slot in redis", exception=e)
+
+
+_gates: Dict[str, AdmissionGate] = {}
+_gates_lock = Lock()
+_redis: Optional[redis.Redis] = None
+
+
+def _get_gate(name: str) -> Optional[AdmissionGate]:
+    global _redis
+    limit = ADMISSION_LIMITS.get(name)
+    if limit is None:
+        return None
+    with _gates_lock:
+        gate = _gates.get(name)
+        if gate is None:
+            if ADMISSION_REDIS:
+                if _redis is None:
+                    _redis = redis.Redis(host=REDIS_HOST, password=REDIS_PASSWORD)
+                gate = RedisAdmissionGate(name, limit, _redis)
+            else:
+                gate = AdmissionGate(name, limit)
+            _gates[name] = gate
+        return gate
+
+
+def query_class(endpoint: str) -> str:
+    """
+    the class of the current request to the given endpoint, which is the endpoint itself unless it reads the history
+    """
+    if endpoint == "covidcast" and (request.path.rstrip("/").endswith("/backfill") or any(request.values.get(p) for p in _HISTORY_PARAMS)):
+        return "history"
+    return endpoint
+
+
+def admit(endpoint: str) -> None:
+    """
+    takes a slot of the query class of the current request, or rejects it with 503 if there is none free.
+    the slot is released once the request (including a streamed response) ended
+    """
+    if not ADMISSION_LIMITS or "admission" in g:
+        return
+    # a query class can be limited separately from its endpoint
+    gate = _get_gate(query_class(endpoint)) or _get_gate(endpoint)
+    if gate is None:
+        return
+    token = gate.enter()
+    if token is None:
+        metrics.increment(f"admission.{gate.name}.rejected")
+        get_structured_logger("admission").warning("request rejected", gate=gate.name)
+        raise ServiceUnavailableException(f"too many concurrent requests, retry in {ADMISSION_RETRY_AFTER} seconds", ADMISSION_RETRY_AFTER)
+    metrics.increment(f"admission.{gate.name}.admitted")
+    g.admission = (gate, token)
+
+
+def apply_admission(bp: Blueprint) -> None:
+    """
+    puts the requests to the given blueprint under admission control
+    """
+    bp.before_request(lambda: admit(bp.name))
+
+
+@app.teardown_request
+def _leave(exception=None):
+    admission = g.pop("admission", None)
+    if admission is not None:
+        gate, token = admission
+        gate.leave(token)
@@ -0,0 +1,259 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from hashlib import sha1
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Dict, Generic, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union
+
+import orjson
+import redis
+from delphi_utils import get_structured_logger
+from werkzeug.http import http_date, quote_etag
+
+from ._config import (
+    REDIS_HOST,
+    REDIS_PASSWORD,
+    RESPONSE_CACHE_IMMUTABLE_TTL,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    RESPONSE_CACHE_REDIS,
+    RESPONSE_CACHE_TTL,
+)
+from ._params import GeoSet, SourceSignalSet, TimeSet
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    a thread-safe least recently used cache with an optional time to live (in seconds, None or 0 means forever)
+    per entry and an optional bound on the total weight of its entries
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: Optional[float] = None,
+        max_weight: Optional[int] = None,
+        weigher: Callable[[V], int] = lambda _: 1,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self._weigher = weigher
+        self._weight = 0
+        self._entries: "OrderedDict[K, Tuple[V, Optional[float], int]]" = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires, _ = entry
+            if expires is not None and expires <= monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        weight = self._weigher(value)
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, monotonic() + ttl if ttl else None, weight)
+            self._weight += weight
+            while len(self._entries) > self.max_entries or (self.max_weight is not None and self._weight > self.max_weight):
+                self._remove(next(iter(self._entries)))
+
+    def pop(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._remove(key)
+            return entry[0] if entry else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._weight = 0
+
+    def _remove(self, key: K) -> Optional[Tuple[V, Optional[float], int]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._weight -= entry[2]
+        return entry
+
+
+class ResponseValidator(NamedTuple):
+    """
+    identifies a version of the data behind a response, used as response cache key and for conditional requests.
+    immutable data won't change anymore and is kept longer in the cache
+    """
+
+    tag: str
+    last_modified: Optional[float] = None
+    immutable: bool = False
+
+    @property
+    def last_modified_date(self) -> Optional[datetime]:
+        if self.last_modified is None:
+            return None
+        return datetime.fromtimestamp(int(self.last_modified), timezone.utc)
+
+    def headers(self, etag: str) -> Dict[str, str]:
+        headers = {"ETag": quote_etag(etag, weak=True)}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = http_date(int(self.last_modified))
+        return headers
+
+
+def canonical_sets(sets: Optional[Sequence[Union[GeoSet, SourceSignalSet]]]) -> List[Tuple[str, Union[bool, List[str]]]]:
+    """
+    converts the given sets into an order independent form by merging sets of the same type
+    """
+    merged: Dict[str, Union[bool, set]] = {}
+    for s in sets or []:
+        set_type, values = (s.geo_type, s.geo_values) if isinstance(s, GeoSet) else (s.source, s.signal)
+        current = merged.get(set_type, set())
+        if current is True or (isinstance(values, bool) and values):
+            merged[set_type] = True
+        else:
+            merged[set_type] = current | set(values or [])
+    return [(k, v if v is True else sorted(v)) for k, v in sorted(merged.items())]
+
+
+def canonical_time_set(time_set: Optional[TimeSet]) -> Optional[Tuple[str, Any]]:
+    if not time_set:
+        return None
+    if isinstance(time_set.time_values, bool):
+        return (time_set.time_type, time_set.time_values)
+    return (time_set.time_type, time_set.to_ranges().time_values)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    computes a stable key of the given JSON serializable parts
+    """
+    return sha1(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class ResponseCapture:
+    """
+    collects the chunks of a streamed response and stores them in the cache (if any) once the response was completely sent.
+    `on_finish` receives the complete response, or None if it failed or was too large to keep
+    """
+
+    def __init__(
+        self,
+        cache: Optional["ResponseCache"],
+        key: str,
+        immutable: bool = False,
+        on_finish: Optional[Callable[[Optional[bytes]], None]] = None,
+    ):
+        self._cache = cache
+        self._key = key
+        self._immutable = immutable
+        self._on_finish = on_finish
+        self._chunks: Optional[List[bytes]] = []
+        self._size = 0
+
+    def write(self, chunk: Union[str, bytes]) -> None:
+        if self._chunks is None:
+            return
+        data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+        self._size += len(data)
+        if self._size > RESPONSE_CACHE_MAX_ENTRY_BYTES:
+            # too large to keep around, don't let anyone wait for it
+            self._chunks = None
+            if self._on_finish is not None:
+                self._on_finish(None)
+            return
+        self._chunks.append(data)
+
+    def finish(self, success: bool) -> None:
+        body = b"".join(self._chunks) if success and self._chunks is not None else None
+        if body is not None and self._cache is not None:
+            self._cache.set(self._key, body, self._immutable)
+        if self._on_finish is not None:
+            self._on_finish(body)
+        self._chunks = None
+
+
+class ResponseCache:
+    """
+    cache of fully serialized responses with a process local LRU tier and an optional shared redis tier
+    """
+
+    def __init__(self, local: LRUCache[str, bytes], use_redis: bool = False):
+        self._local = local
+        self._use_redis = use_redis
+        self._redis: Optional[redis.Redis] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._local.max_entries > 0
+
+    def _get_redis(self) -> Optional[redis.Redis]:
+        if not self._use_redis:
+            return None
+        if self._redis is None:
+            self._redis = redis.Redis(host=REDIS_HOST, password=REDIS_PASSWORD)
+        return self._redis
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        body = self._local.get(key)
+        if body is not None:
+            return body
+        r = self._get_redis()
+        if r is None:
+            return None
+        try:
+            body = r.get(f"RESPONSE/{key}")
+        except redis.RedisError as e:
+            get_structured_logger("response_cache").warning("failed to read from redis", exception=e)
+            return None
+        if body is not None:
+            self._local.set(key, body)
+        return body
+
+    def set(self, key: str, body: bytes, immutable: bool = False) -> None:
+        if not self.enabled:
+            return
+        ttl = RESPONSE_CACHE_IMMUTABLE_TTL if immutable else RESPONSE_CACHE_TTL
+        self._local.set(key, body, ttl)
+        r = self._get_redis()
+        if r is None:
+            return
+        try:
+            r.set(f"RESPONSE/{key}", body, ex=ttl)
+        except redis.RedisError as e:
+            get_structured_logger("response_cache").warning("failed to write to redis", exception=e)
+
+    def capture(
+        self,
+        key: str,
+        immutable: bool = False,
+        on_finish: Optional[Callable[[Optional[bytes]], None]] = None,
+    ) -> ResponseCapture:
+        return ResponseCapture(self, key, immutable, on_finish)
+
+    def clear(self) -> None:
+        self._local.clear()
+
+
+response_cache = ResponseCache(
+    LRUCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES, len),
+    RESPONSE_CACHE_REDIS,
+)
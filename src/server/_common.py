@@ -12,15 +12,23 @@ from ._config import SECRET, REVERSE_PROXY_DEPTH
 from ._db import engine
 from ._exceptions import DatabaseErrorException, EpiDataException
 from ._security import current_user, _is_public_route, resolve_auth_token, update_key_last_time_used, ERROR_MSG_INVALID_KEY
+from ._singleflight import single_flight
 
 
 app = Flask("EpiData", static_url_path="")
 app.config["SECRET"] = SECRET
 
 
+def current_engine() -> Engine:
+    """
+    the engine the queries of this request run on, see `_routing.py`
+    """
+    return g.get("engine", engine)
+
+
 def _get_db() -> Connection:
     if "db" not in g:
-        conn = engine.connect()
+        conn = current_engine().connect()
         g.db = conn
     return g.db
 
@@ -152,6 +160,9 @@ def teardown_db(exception=None):
     if "user" in g:
         g.pop("user")
 
+    # don't keep identical requests waiting for a response that won't come
+    single_flight.release_request_flights()
+
     # close the db connection
     db = g.pop("db", None)
 
@@ -0,0 +1,97 @@
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+import zlib
+
+from flask import request
+import zstandard
+
+from ._config import (
+    COMPRESSION_ENCODINGS,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_ZSTD_LEVEL,
+)
+
+
+class _GzipCompressor:
+    def __init__(self):
+        # wbits 16 + MAX_WBITS writes a gzip instead of a zlib container
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # flush the block, so clients can decode everything sent so far
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _ZstdCompressor:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        # flush the block, so clients can decode everything sent so far
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+_COMPRESSORS = {
+    "zstd": _ZstdCompressor,
+    "gzip": _GzipCompressor,
+}
+
+
+def negotiate_encoding() -> Optional[str]:
+    """
+    picks the content encoding to use based on the `Accept-Encoding` header of the current request
+    """
+    # only consider explicitly listed encodings, a `*` shouldn't make us send zstd to a client not knowing it
+    accepted = {value.lower(): quality for value, quality in request.accept_encodings}
+    best: Optional[str] = None
+    best_quality = 0.0
+    for encoding in COMPRESSION_ENCODINGS:
+        quality = accepted.get(encoding, 0)
+        if encoding in _COMPRESSORS and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compress_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    compressor = _COMPRESSORS[encoding]()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_stream(chunks: Iterable[bytes], headers: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, str], Iterator[bytes]]:
+    """
+    compresses the given stream of chunks with the encoding negotiated with the client.
+    nothing is pulled from the stream before the headers are sent, so its size is unknown and it is always compressed
+    once an encoding is negotiated. returns the headers to send along with the (compressed) stream
+    """
+    headers = dict(headers or {})
+    if not COMPRESSION_ENCODINGS:
+        return headers, iter(chunks)
+    headers["Vary"] = "Accept-Encoding"
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return headers, iter(chunks)
+    headers["Content-Encoding"] = encoding
+    return headers, _compress_chunks(chunks, encoding)
+
+
+def compress_body(body: bytes, headers: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, str], bytes]:
+    """
+    compresses a complete response body like `compress_stream`, unless it is smaller than `COMPRESSION_MIN_SIZE`
+    """
+    if len(body) < COMPRESSION_MIN_SIZE:
+        headers = dict(headers or {})
+        if COMPRESSION_ENCODINGS:
+            headers["Vary"] = "Accept-Encoding"
+        return headers, body
+    headers, chunks = compress_stream([body], headers)
+    return headers, b"".join(chunks)
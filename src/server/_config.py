@@ -12,6 +12,30 @@ VERSION = "4.1.40"
 MAX_RESULTS = int(10e6)
 MAX_COMPATIBILITY_RESULTS = int(3650)
 
+# number of rows fetched at once from a streamed result set
+QUERY_FETCH_SIZE = int(os.environ.get("QUERY_FETCH_SIZE", 1000))
+# number of threads per process running the queries of multi query endpoints concurrently, each on its own pooled
+# connection (so keep it below the connection pool size), 0 or 1 runs them one after another on the request connection
+QUERY_PARALLELISM = int(os.environ.get("QUERY_PARALLELISM", 4))
+# number of fetched batches a concurrently running query may buffer ahead of the response being sent
+QUERY_PARALLEL_BUFFER = int(os.environ.get("QUERY_PARALLEL_BUFFER", 4))
+# minimum number of (signal, geo type) combinations of a covidcast request to split it into concurrently run queries
+# merged by their sort order instead of a single query, 0 disables splitting. off until its crossover against the single
+# query is measured on production data with scripts/benchmarks/covidcast_fanout.py
+COVIDCAST_FANOUT_MIN_QUERIES = int(os.environ.get("COVIDCAST_FANOUT_MIN_QUERIES", 0))
+
+# minimum size (in bytes) of the chunks a streamed response is written in, 0 writes every row separately
+PRINTER_CHUNK_SIZE = int(os.environ.get("PRINTER_CHUNK_SIZE", 64 * 1024))
+# maximum number of seconds formatted rows are buffered before they are written regardless of the chunk size
+PRINTER_FLUSH_INTERVAL = float(os.environ.get("PRINTER_FLUSH_INTERVAL", 0.5))
+
+# number of rows collected into a single record batch (or row group) by the Arrow and Parquet output formats
+ARROW_BATCH_SIZE = int(os.environ.get("ARROW_BATCH_SIZE", 10000))
+
+# number of distinct values in a single filter above which the values are passed as one JSON key table
+# (expanded via JSON_TABLE) instead of a list of individual bind parameters
+FILTER_KEY_TABLE_THRESHOLD = int(os.environ.get("FILTER_KEY_TABLE_THRESHOLD", 1000))
+
 SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI", "sqlite:///test.db")
 SQLALCHEMY_DATABASE_URI_PRIMARY = os.environ.get("SQLALCHEMY_DATABASE_URI_PRIMARY")
 
@@ -109,6 +133,12 @@ RATELIMIT_STRATEGY = os.environ.get("RATELIMIT_STRATEGY", "fixed-window")
 
 # see https://flask-limiter.readthedocs.io/en/stable/#configuration
 RATELIMIT_STORAGE_URL = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:6379"
+# whether every process counts the rate limits itself and reconciles its counts with redis in batches, instead of a
+# redis round trip for every check (see `_limiter_storage.py`). limits can be overshot by the hits the other processes
+# make within one reconciliation interval
+RATELIMIT_LOCAL = os.environ.get("RATELIMIT_LOCAL", "false").lower() in ("true", "1", "yes")
+# seconds between the reconciliations of the local counts with redis
+RATELIMIT_SYNC_INTERVAL = float(os.environ.get("RATELIMIT_SYNC_INTERVAL", 1))
 
 API_KEY_REGISTRATION_FORM_LINK = "https://forms.gle/hkBr5SfQgxguAfEt7"
 # ^ shortcut to "https://docs.google.com/forms/d/e/1FAIpQLSe5i-lgb9hcMVepntMIeEo8LUZUMTUnQD3hbrQI3vSteGsl4w/viewform?usp=sf_link"
@@ -119,3 +149,96 @@ API_KEY_REMOVAL_REQUEST_LINK = "https://forms.gle/GucFmZHTMgEFjH197"
 # ^ shortcut to "https://docs.google.com/forms/d/e/1FAIpQLSff30tsq4xwPCoUbvaIygLSMs_Mt8eDhHA0rifBoIrjo8J5lw/viewform"
 API_KEY_REMOVAL_REQUEST_LINK_LOCAL = "https://api.delphi.cmu.edu/epidata/admin/removal_request"
 # ^ redirects to API_KEY_REMOVAL_REQUEST_LINK
+
+# response cache for query endpoints, see `_cache.py`
+# maximum number of responses kept in the process local cache, 0 disables response caching completely
+# (the default in testing mode, as the tests truncate and refill the tables under a running server)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 256 if TESTING_MODE is False else 0))
+# maximum total size (in bytes) of the process local cache
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# responses larger than this (in bytes) are streamed but not cached
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRY_BYTES", 8 * 1024 * 1024))
+# seconds a response stays cached; entries are invalidated earlier by the per signal generation counters
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 60 * 60))
+# seconds a response of an immutable query (e.g. `as_of` in the past) stays cached
+RESPONSE_CACHE_IMMUTABLE_TTL = int(os.environ.get("RESPONSE_CACHE_IMMUTABLE_TTL", 7 * 24 * 60 * 60))
+# whether to share cached responses between processes and hosts via redis
+RESPONSE_CACHE_REDIS = os.environ.get("RESPONSE_CACHE_REDIS", "false").lower() in ("true", "1", "yes")
+# seconds the per signal generation counters are memoized in process, 0 looks them up for every request
+SIGNAL_VERSION_TTL = float(os.environ.get("SIGNAL_VERSION_TTL", 0))
+
+# coalescing of identical concurrent requests of different processes and hosts, see `_singleflight.py`. it is active
+# along with RESPONSE_CACHE_REDIS, which shares the response
+# seconds a request waits for the response of an identical one before running on its own, 0 disables coalescing
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get("SINGLE_FLIGHT_TIMEOUT", 30))
+
+# on the fly compression of query responses, see `_compression.py`
+# supported encodings in order of preference, empty disables compression (e.g. when a proxy already compresses)
+COMPRESSION_ENCODINGS = [e.strip() for e in os.environ.get("COMPRESSION_ENCODINGS", "zstd,gzip").lower().split(",") if e.strip()]
+# complete (e.g. cached) responses smaller than this (in bytes) are sent uncompressed, streamed ones are always compressed
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 5))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", 3))
+# whether covidcast requests with `order=none` query the fact tables directly and attach the labels from a process
+# local copy of the dimension tables, see `covidcast_utils/dimensions.py`
+# (disabled in testing mode, as the tests reset the dimension tables under a running server)
+COVIDCAST_DIMENSION_CACHE = os.environ.get("COVIDCAST_DIMENSION_CACHE", str(TESTING_MODE is False)).lower() in ("true", "1", "yes")
+# seconds the copy of the dimension tables is used without checking for new rows, 0 checks for every request
+DIMENSION_CACHE_TTL = float(os.environ.get("DIMENSION_CACHE_TTL", 0))
+# whether the metadata endpoints keep the parsed `covidcast_meta_cache` in process until its timestamp changes, see
+# `covidcast_utils/meta_cache.py` (disabled in testing mode, as the tests rewrite the table within the same second)
+COVIDCAST_META_CACHE = os.environ.get("COVIDCAST_META_CACHE", str(TESTING_MODE is False)).lower() in ("true", "1", "yes")
+# seconds the parsed metadata is used without probing its timestamp, 0 probes for every request
+META_CACHE_TTL = float(os.environ.get("META_CACHE_TTL", 0))
+# whether `as_of` queries use the issue intervals (`next_issue`) maintained by the acquisition instead of grouping the
+# history by key: "auto" uses them once the history view provides them (see "migrations/epimetric_next_issue_v0.1.sql")
+AS_OF_ISSUE_INTERVALS = os.environ.get("AS_OF_ISSUE_INTERVALS", "auto").lower()
+
+# admission control in front of the endpoints, see `_admission.py`
+# maximum number of concurrently running requests per endpoint (e.g. "covidcast_meta=8") or query class ("history" for
+# covidcast queries of past issues), endpoints without a limit are not restricted. requests finding no free slot are
+# rejected right away (503)
+ADMISSION_LIMITS = {
+    name.strip(): int(limit)
+    for name, _, limit in (entry.partition("=") for entry in os.environ.get("ADMISSION_LIMITS", "").split(","))
+    if name.strip() and limit.strip()
+}
+# seconds rejected clients are asked to wait before retrying (`Retry-After`)
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", 5))
+# whether the limits apply across processes and hosts via redis instead of per process
+ADMISSION_REDIS = os.environ.get("ADMISSION_REDIS", "false").lower() in ("true", "1", "yes")
+# seconds after which a slot in redis counts as abandoned, e.g. when its process died (should exceed the longest request)
+ADMISSION_LEASE = int(os.environ.get("ADMISSION_LEASE", 15 * 60))
+
+# routing of expensive queries to their own connection pool (or replica), see `_routing.py`
+# estimated cost (roughly the number of rows read) from which on a request runs on the heavy engine, 0 disables routing
+HEAVY_QUERY_COST_THRESHOLD = float(os.environ.get("HEAVY_QUERY_COST_THRESHOLD", 0))
+# database the heavy queries run on, e.g. a replica dedicated to them, defaults to the regular one
+SQLALCHEMY_DATABASE_URI_HEAVY = os.environ.get("SQLALCHEMY_DATABASE_URI_HEAVY", SQLALCHEMY_DATABASE_URI)
+# overrides of SQLALCHEMY_ENGINE_OPTIONS for the heavy engine, e.g. a smaller pool: {"pool_size": 2, "max_overflow": 0}
+SQLALCHEMY_HEAVY_ENGINE_OPTIONS = {**SQLALCHEMY_ENGINE_OPTIONS, **json.loads(os.environ.get("SQLALCHEMY_HEAVY_ENGINE_OPTIONS", "{}"))}
+# seconds a statement on the heavy engine may run before the database aborts it (MySQL `max_execution_time`), 0 for no limit
+HEAVY_QUERY_TIMEOUT = float(os.environ.get("HEAVY_QUERY_TIMEOUT", 0))
+
+# in process cache of the users (and their roles) of api keys, see `_security.py`
+# seconds a resolved user is reused without looking it up again, 0 disables the cache (the default in testing mode, as
+# the tests change the users directly in the database). changes made with the admin pages apply right away in the
+# process serving them, other processes pick them up after this time
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", 60 if TESTING_MODE is False else 0))
+# seconds an unknown api key is remembered as invalid
+AUTH_CACHE_NEGATIVE_TTL = float(os.environ.get("AUTH_CACHE_NEGATIVE_TTL", 10))
+# maximum number of cached api keys
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", 10000))
+# maximum number of lookups per second of api keys that are not cached, further requests with uncached keys are
+# rejected (429) to bound the database load of key guessing, 0 for no limit
+AUTH_CACHE_MISS_RATE = float(os.environ.get("AUTH_CACHE_MISS_RATE", 50))
+
+# tracking of the days api keys were last used, see `_last_used.py`
+# seconds between the batched writes of a background thread, 0 writes synchronously in the request
+LAST_USED_FLUSH_INTERVAL = float(os.environ.get("LAST_USED_FLUSH_INTERVAL", 10))
+# maximum number of keys written in one redis pipeline (a flush starts early once this many are pending)
+LAST_USED_BATCH_SIZE = int(os.environ.get("LAST_USED_BATCH_SIZE", 500))
+
+# gzipped json of the valid geo values per geo type, written with `python -m delphi.epidata.server._geo_values <file>`,
+# to skip loading the GeoMapper crosswalk tables when a process starts, see `_geo_values.py`. empty uses GeoMapper
+GEO_VALUES_FILE = os.environ.get("GEO_VALUES_FILE", "")
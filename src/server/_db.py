@@ -1,11 +1,19 @@
 import functools
 from inspect import signature, Parameter
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 
-from ._config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_DATABASE_URI_PRIMARY, SQLALCHEMY_ENGINE_OPTIONS
+from ._config import (
+    HEAVY_QUERY_COST_THRESHOLD,
+    HEAVY_QUERY_TIMEOUT,
+    SQLALCHEMY_DATABASE_URI,
+    SQLALCHEMY_DATABASE_URI_HEAVY,
+    SQLALCHEMY_DATABASE_URI_PRIMARY,
+    SQLALCHEMY_ENGINE_OPTIONS,
+    SQLALCHEMY_HEAVY_ENGINE_OPTIONS,
+)
 
 
 # _db.py exists so that we dont have a circular dependency:
@@ -54,6 +62,19 @@ def default_session(sess):
 engine: Engine = create_engine(SQLALCHEMY_DATABASE_URI, **SQLALCHEMY_ENGINE_OPTIONS, execution_options={'engine_id': 'default'})
 Session = sessionmaker(bind=engine)
 
+if HEAVY_QUERY_COST_THRESHOLD > 0:
+    # expensive queries (see `_routing.py`) get a pool of their own, and possibly their own replica, so that they can't
+    # starve the cheap ones of connections
+    heavy_engine: Engine = create_engine(SQLALCHEMY_DATABASE_URI_HEAVY, **SQLALCHEMY_HEAVY_ENGINE_OPTIONS, execution_options={'engine_id': 'heavy_engine'})
+    if HEAVY_QUERY_TIMEOUT > 0 and heavy_engine.dialect.name == "mysql":
+        @event.listens_for(heavy_engine, "connect")
+        def _limit_execution_time(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET SESSION max_execution_time = {int(HEAVY_QUERY_TIMEOUT * 1000)}")
+            cursor.close()
+else:
+    heavy_engine: Engine = engine
+
 if SQLALCHEMY_DATABASE_URI_PRIMARY and SQLALCHEMY_DATABASE_URI_PRIMARY != SQLALCHEMY_DATABASE_URI:
     # if available, use the main/primary DB for write operations.  DB replication processes should be in place to
     # propagate any written changes to the regular (load balanced) replicas.
@@ -36,3 +36,12 @@ class DatabaseErrorException(EpiDataException):
         if details:
             msg = f"{msg}: {details}"
         super(DatabaseErrorException, self).__init__(msg, 500)
+
+
+class ServiceUnavailableException(EpiDataException):
+    def __init__(self, message: str, retry_after: int):
+        super(ServiceUnavailableException, self).__init__(message, 503)
+        # also in the classic format, so that clients and proxies know to back off
+        self.code = 503
+        self.response.status_code = 503
+        self.response.headers["Retry-After"] = str(retry_after)
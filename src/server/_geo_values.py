@@ -0,0 +1,88 @@
+import gzip
+import json
+import sys
+from threading import Lock
+from time import perf_counter
+from typing import Dict, FrozenSet, Optional
+
+import delphi_utils
+from delphi_utils import get_structured_logger
+
+from ._config import GEO_VALUES_FILE
+
+# TODO: keep this translator in sync with CsvImporter.GEOGRAPHIC_RESOLUTIONS in acquisition/covidcast/ and with GeoMapper
+# NOTE: We are not including `hsa_nci` here as the geomapper code does not support that version of the HSA definition.
+GEO_TYPE_TRANSLATOR = {
+    "county": "fips",
+    "state": "state_id",
+    "zip": "zip",
+    "hrr": "hrr",
+    "hhs": "hhs",
+    "msa": "msa",
+    "nation": "nation",
+}
+
+
+def read_geo_values(path: str = "") -> Dict[str, FrozenSet[str]]:
+    """
+    reads the valid geo values of the supported geo types, from the given file written by `write_geo_values`
+    or else from GeoMapper (which loads all of its crosswalk tables)
+    """
+    if path:
+        with gzip.open(path, "rt") as f:
+            stored = json.load(f)
+        return {geo_type: frozenset(stored[geo_type]) for geo_type in GEO_TYPE_TRANSLATOR}
+    mapper = delphi_utils.geomap.GeoMapper()
+    return {geo_type: frozenset(mapper.get_geo_values(mapper_type)) for geo_type, mapper_type in GEO_TYPE_TRANSLATOR.items()}
+
+
+def write_geo_values(path: str) -> None:
+    """
+    stores the valid geo values from GeoMapper as gzipped json, to be used with `GEO_VALUES_FILE`
+    """
+    geo_values = read_geo_values()
+    with gzip.open(path, "wt") as f:
+        json.dump({geo_type: sorted(values) for geo_type, values in geo_values.items()}, f, separators=(",", ":"))
+
+
+class GeoValues:
+    """
+    the valid geo values per geo type, loaded once per process into frozensets
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._lock = Lock()
+        self._values: Optional[Dict[str, FrozenSet[str]]] = None
+
+    def load(self) -> Dict[str, FrozenSet[str]]:
+        values = self._values
+        if values is None:
+            with self._lock:
+                if self._values is None:
+                    start = perf_counter()
+                    self._values = read_geo_values(self.path)
+                    get_structured_logger("geo_values").info(
+                        "loaded geo values",
+                        source=self.path or "GeoMapper",
+                        geo_types=len(self._values),
+                        duration_ms=round((perf_counter() - start) * 1000, 1),
+                    )
+                values = self._values
+        return values
+
+    def allowed(self, geo_type: str) -> Optional[FrozenSet[str]]:
+        """
+        returns the valid values of the given geo type, None if the type is unknown to GeoMapper
+        """
+        if geo_type not in GEO_TYPE_TRANSLATOR:
+            return None
+        return self.load()[geo_type]
+
+
+valid_geo_values = GeoValues(GEO_VALUES_FILE)
+
+
+if __name__ == "__main__":
+    # python -m delphi.epidata.server._geo_values <file>
+    write_geo_values(sys.argv[1])
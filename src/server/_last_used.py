@@ -0,0 +1,108 @@
+import atexit
+import os
+from datetime import date
+from threading import Event, Lock, Thread
+from typing import Dict, Optional
+
+import redis
+from delphi_utils import get_structured_logger
+
+from ._config import LAST_USED_BATCH_SIZE, LAST_USED_FLUSH_INTERVAL, REDIS_HOST, REDIS_PASSWORD
+from ._metrics import metrics
+
+# redis key of the day an api key was last used, picked up by `maintenance/update_last_usage.py`
+LAST_USED_KEY = "LAST_USED/{}"
+
+
+class LastUsedWriter:
+    """
+    records the days api keys were last used in redis. every key is written at most once per day and process,
+    by a background thread in pipelined batches, so that requests never wait for redis.
+    with a `flush_interval` of 0 the keys are written right away instead
+    """
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = Lock()
+        self._wakeup = Event()
+        # api key -> day to write
+        self._pending: Dict[str, str] = {}
+        # api keys written on `_day`
+        self._written: Dict[str, str] = {}
+        self._day: Optional[str] = None
+        self._thread: Optional[Thread] = None
+        self._pid: Optional[int] = None
+        self._pool: Optional[redis.ConnectionPool] = None
+
+    def _get_redis(self) -> redis.Redis:
+        if self._pool is None:
+            self._pool = redis.ConnectionPool(host=REDIS_HOST, password=REDIS_PASSWORD)
+        return redis.Redis(connection_pool=self._pool)
+
+    def _ensure_thread(self) -> None:
+        # (re)started lazily, as threads don't survive forking the worker processes
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pool = None
+            self._thread = Thread(target=self._run, name="epidata_last_used", daemon=True)
+            self._thread.start()
+
+    def record(self, api_key: str) -> None:
+        """
+        notes that the given api key is used today
+        """
+        day = date.today().isoformat()
+        with self._lock:
+            if day != self._day:
+                self._day = day
+                self._written.clear()
+            if api_key in self._written or api_key in self._pending:
+                metrics.increment("last_used.deduplicated")
+                return
+            self._pending[api_key] = day
+            if self.flush_interval > 0:
+                self._ensure_thread()
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        writes the pending keys, they are retried with the next flush if redis is not available
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        items = list(batch.items())
+        try:
+            r = self._get_redis()
+            for start in range(0, len(items), self.batch_size):
+                pipe = r.pipeline(transaction=False)
+                for api_key, day in items[start : start + self.batch_size]:
+                    pipe.set(LAST_USED_KEY.format(api_key), day)
+                pipe.execute()
+        except redis.RedisError as e:
+            get_structured_logger("last_used").warning("failed to write last used days", keys=len(batch), exception=e)
+            with self._lock:
+                for api_key, day in batch.items():
+                    self._pending.setdefault(api_key, day)
+            return
+        metrics.increment("last_used.written", len(batch))
+        with self._lock:
+            for api_key, day in batch.items():
+                if day == self._day:
+                    self._written[api_key] = day
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+last_used_writer = LastUsedWriter(LAST_USED_FLUSH_INTERVAL, LAST_USED_BATCH_SIZE)
+# don't lose the keys of the last seconds when the process ends
+atexit.register(last_used_writer.flush)
@@ -1,12 +1,13 @@
 from delphi.epidata.server.endpoints.covidcast_utils.dashboard_signals import DashboardSignals
-from flask import Response, request
+from flask import Response, g, request
 from flask_limiter import Limiter, HEADERS
 from redis import Redis
 from werkzeug.exceptions import Unauthorized, TooManyRequests
 
 from ._common import app, get_real_ip_addr
-from ._config import RATE_LIMIT, RATELIMIT_STORAGE_URL, REDIS_HOST, REDIS_PASSWORD
+from ._config import RATE_LIMIT, RATELIMIT_LOCAL, RATELIMIT_STORAGE_URL, REDIS_HOST, REDIS_PASSWORD
 from ._exceptions import ValidationFailedException
+from ._limiter_storage import LOCAL_STORAGE_PREFIX
 from ._params import extract_dates, extract_integers, extract_strings, parse_source_signal_sets
 from ._security import _is_public_route, current_user, resolve_auth_token, ERROR_MSG_RATE_LIMIT, ERROR_MSG_MULTIPLES
 
@@ -70,8 +71,11 @@ def get_multiples_count(request):
     return multiple_selection_allowed
 
 
+# signals of the dashboard, which can be requested without a rate limit
+_signals_allowlist = frozenset(":".join(ss_pair) for ss_pair in DashboardSignals().srcsig_list())
+
+
 def check_signals_allowlist(request):
-    signals_allowlist = {":".join(ss_pair) for ss_pair in DashboardSignals().srcsig_list()}
     request_signals = set()
     try:
         source_signal_sets = parse_source_signal_sets()
@@ -88,7 +92,7 @@ def check_signals_allowlist(request):
             request_signals.add(f"{source_signal.source}:{signal}")
     if len(request_signals) == 0:
         return False
-    return request_signals.issubset(signals_allowlist)
+    return request_signals.issubset(_signals_allowlist)
 
 
 def _resolve_tracking_key() -> str:
@@ -99,7 +103,7 @@ def _resolve_tracking_key() -> str:
 limiter = Limiter(
     _resolve_tracking_key,
     app=app,
-    storage_uri=RATELIMIT_STORAGE_URL,
+    storage_uri=LOCAL_STORAGE_PREFIX + RATELIMIT_STORAGE_URL if RATELIMIT_LOCAL else RATELIMIT_STORAGE_URL,
     request_identifier=lambda: "EpidataLimiter",
     headers_enabled=True,
     header_name_mapping={
@@ -119,6 +123,13 @@ def ratelimit_handler(e):
 
 @limiter.request_filter
 def _no_rate_limit() -> bool:
+    # evaluated for every limit check of the request, but the decision doesn't change
+    if "no_rate_limit" not in g:
+        g.no_rate_limit = _is_exempt()
+    return g.no_rate_limit
+
+
+def _is_exempt() -> bool:
     if _is_public_route():
         # no rate limit for public routes
         return True
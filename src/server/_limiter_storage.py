@@ -0,0 +1,200 @@
+import os
+from math import ceil
+from threading import Event, Lock, Thread
+from time import time
+from typing import Dict, Optional, Tuple
+
+import redis
+from delphi_utils import get_structured_logger
+from limits.storage import Storage
+
+from ._config import RATELIMIT_SYNC_INTERVAL
+from ._metrics import metrics
+
+# prefix of a redis storage uri to count locally in front of it
+LOCAL_STORAGE_PREFIX = "local+"
+
+
+class _Counter:
+    """
+    the hits of a fixed window: as counted in redis at the last reconciliation, plus the ones of this process since
+    """
+
+    __slots__ = ("synced", "pending", "expires", "touched")
+
+    def __init__(self, synced: int, expires: float):
+        self.synced = synced
+        self.pending = 0
+        # end of the window as unix timestamp
+        self.expires = expires
+        # whether used since the last reconciliation
+        self.touched = False
+
+    @property
+    def count(self) -> int:
+        return self.synced + self.pending
+
+
+class LocalRedisStorage(Storage):
+    """
+    a fixed window rate limit storage counting the hits in process, which reconciles its counts with redis in
+    pipelined batches every `RATELIMIT_SYNC_INTERVAL` seconds from a background thread.
+    only the first use of a limit within a window waits for redis, hits of other processes show up with the next
+    reconciliation. if redis is not available, the hits are limited per process until it is back.
+    used by prefixing the redis storage uri with "local+"
+    """
+
+    STORAGE_SCHEME = ["local+redis"]
+
+    def __init__(self, uri: str, sync_interval: float = RATELIMIT_SYNC_INTERVAL, **options):
+        super().__init__(uri, **options)
+        self._redis = redis.Redis.from_url(uri[len(LOCAL_STORAGE_PREFIX) :])
+        self.sync_interval = sync_interval
+        self._lock = Lock()
+        self._counters: Dict[str, _Counter] = {}
+        self._wakeup = Event()
+        self._thread: Optional[Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def base_exceptions(self):
+        return redis.RedisError
+
+    def _ensure_thread(self) -> None:
+        # (re)started lazily, as threads don't survive forking the worker processes
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = Thread(target=self._run, name="epidata_rate_limits", daemon=True)
+            self._thread.start()
+
+    def _current(self, key: str) -> Optional[_Counter]:
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is not None and counter.expires <= time():
+                del self._counters[key]
+                return None
+            if counter is not None:
+                counter.touched = True
+            return counter
+
+    def _remember(self, key: str, count: int, expires: float) -> _Counter:
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or counter.expires <= time():
+                counter = self._counters[key] = _Counter(count, expires)
+            self._ensure_thread()
+            return counter
+
+    def _load(self, key: str, expiry: Optional[int] = None, amount: int = 0) -> Tuple[int, Optional[float]]:
+        """
+        reads (and with an `expiry` increments) the count of the given key in redis, returns it with the end of its
+        window, which is None if there is no window
+        """
+        metrics.increment("rate_limit.redis_reads")
+        pipe = self._redis.pipeline(transaction=False)
+        if expiry is not None:
+            pipe.set(key, 0, ex=expiry, nx=True)
+            pipe.incrby(key, amount)
+        else:
+            pipe.get(key)
+        pipe.pttl(key)
+        *_, value, ttl = pipe.execute()
+        if ttl < 0:
+            return 0, None
+        return int(value or 0), time() + ttl / 1000
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        counter = self._current(key)
+        if counter is None:
+            # first hit of this window in this process, start from the global count
+            count, expires = self._load(key, expiry, amount)
+            self._remember(key, count, expires or time() + expiry)
+            return count
+        with self._lock:
+            counter.pending += amount
+            counter.touched = True
+            return counter.count
+
+    def get(self, key: str) -> int:
+        counter = self._current(key)
+        if counter is None:
+            count, expires = self._load(key)
+            if expires is None:
+                return 0
+            counter = self._remember(key, count, expires)
+        return counter.count
+
+    def get_expiry(self, key: str) -> float:
+        counter = self._current(key)
+        if counter is None:
+            _, expires = self._load(key)
+            return expires or time()
+        return counter.expires
+
+    def check(self) -> bool:
+        try:
+            return self._redis.ping()
+        except redis.RedisError:
+            return False
+
+    def reset(self) -> Optional[int]:
+        with self._lock:
+            self._counters.clear()
+        return None
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._counters.pop(key, None)
+        self._redis.delete(key)
+
+    def sync(self) -> None:
+        """
+        sends the hits of this process to redis and picks up the ones of the other processes,
+        for the limits used since the last reconciliation
+        """
+        now = time()
+        with self._lock:
+            for key in [key for key, counter in self._counters.items() if counter.expires <= now]:
+                del self._counters[key]
+            batch = [(key, counter, counter.pending) for key, counter in self._counters.items() if counter.touched]
+            for _, counter, _ in batch:
+                counter.touched = False
+        if not batch:
+            return
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for key, counter, pending in batch:
+                if pending:
+                    # the window may have ended in redis already, e.g. by a slightly different clock
+                    pipe.set(key, 0, ex=max(1, ceil(counter.expires - now)), nx=True)
+                    pipe.incrby(key, pending)
+                else:
+                    pipe.get(key)
+                pipe.pttl(key)
+            results = iter(pipe.execute())
+        except redis.RedisError as e:
+            get_structured_logger("rate_limit").warning("failed to reconcile rate limits", keys=len(batch), exception=e)
+            with self._lock:
+                for _, counter, _ in batch:
+                    counter.touched = True
+            return
+        metrics.increment("rate_limit.syncs")
+        metrics.increment("rate_limit.synced_keys", len(batch))
+        with self._lock:
+            for key, counter, pending in batch:
+                if pending:
+                    next(results)
+                value, ttl = next(results), next(results)
+                if ttl < 0:
+                    # the window ended
+                    if self._counters.get(key) is counter:
+                        del self._counters[key]
+                    continue
+                counter.synced = int(value or 0)
+                counter.pending -= pending
+                counter.expires = now + ttl / 1000
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.sync_interval)
+            self.sync()
@@ -0,0 +1,34 @@
+from threading import Lock
+from typing import Dict
+
+
+class Counters:
+    """
+    thread-safe, process local event counters and gauges, exposed at `/admin/metrics`
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counts: Dict[str, float] = {}
+
+    def increment(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self._counts[name] = value
+
+    def get(self, name: str) -> float:
+        return self._counts.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(sorted(self._counts.items()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+metrics = Counters()
@@ -0,0 +1,137 @@
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, Queue
+from threading import Event, Lock
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from ._config import QUERY_FETCH_SIZE, QUERY_PARALLEL_BUFFER, QUERY_PARALLELISM
+from ._db import engine
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+# number of workers not running a query, queries are only dispatched to idle workers and never queued,
+# so that all queries of a request run at the same time (which merging their rows relies on)
+_idle_workers = QUERY_PARALLELISM
+
+# marks the end of the rows of a query
+_END = object()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=QUERY_PARALLELISM, thread_name_prefix="epidata_query")
+        return _executor
+
+
+def is_parallel_enabled(num_queries: int) -> bool:
+    return QUERY_PARALLELISM > 1 and num_queries > 1
+
+
+def _reserve_workers(n: int) -> bool:
+    global _idle_workers
+    with _executor_lock:
+        if n > _idle_workers:
+            return False
+        _idle_workers -= n
+        return True
+
+
+def _release_worker() -> None:
+    global _idle_workers
+    with _executor_lock:
+        _idle_workers += 1
+
+
+class ParallelQuery:
+    """
+    a query running in the background on its own pooled connection.
+    the rows are handed over in batches through a bounded buffer, so it can be consumed like a streamed result
+    (`keys` and `fetchmany`) while it is still running
+    """
+
+    def __init__(self, query: str, params: Dict[str, Any], stop: Event, bind: Engine = engine):
+        self._bind = bind
+        self._queue: "Queue[Any]" = Queue(maxsize=QUERY_PARALLEL_BUFFER)
+        self._stop = stop
+        self._keys: Optional[List[str]] = None
+        self._done = False
+        _get_executor().submit(self._run, query, params)
+
+    def _put(self, item: Any) -> bool:
+        # wait for the consumer to catch up, unless it isn't interested anymore
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _run(self, query: str, params: Dict[str, Any]) -> None:
+        try:
+            self._execute(query, params)
+        finally:
+            _release_worker()
+
+    def _execute(self, query: str, params: Dict[str, Any]) -> None:
+        if self._stop.is_set():
+            return
+        try:
+            with self._bind.connect() as conn:
+                r = conn.execution_options(stream_results=True).execute(text(query), **params)
+                if not self._put(list(r.keys())):
+                    return
+                while True:
+                    batch = r.fetchmany(QUERY_FETCH_SIZE)
+                    if not batch:
+                        break
+                    if not self._put(batch):
+                        return
+            self._put(_END)
+        except Exception as e:
+            self._put(e)
+
+    def _get(self) -> Any:
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+                break
+            except Empty:
+                if self._stop.is_set():
+                    return _END
+        if isinstance(item, Exception):
+            self._done = True
+            raise item
+        return item
+
+    def keys(self) -> List[str]:
+        if self._keys is None and self._done:
+            # failed before sending the columns
+            return []
+        if self._keys is None:
+            item = self._get()
+            self._keys = [] if item is _END else item
+        return self._keys
+
+    def fetchmany(self, _size: int = QUERY_FETCH_SIZE) -> Sequence[Any]:
+        if self._done or not self.keys():
+            return []
+        item = self._get()
+        if item is _END:
+            self._done = True
+            return []
+        return item
+
+
+def start_queries(queries: Sequence[Tuple[str, Dict[str, Any]]], stop: Event, bind: Engine = engine) -> Optional[List[ParallelQuery]]:
+    """
+    dispatches the given (already limited) queries to the bounded thread pool to run on `bind`, `stop` cancels all of them.
+    returns None if there are not enough idle workers to run all of them at once
+    """
+    if not _reserve_workers(len(queries)):
+        return None
+    return [ParallelQuery(query, params, stop, bind) for query, params in queries]
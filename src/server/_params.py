@@ -1,16 +1,25 @@
 from math import inf
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Optional, Sequence, Tuple, Union
-import delphi_utils
 
 from flask import request
 
 
 from ._exceptions import ValidationFailedException
+from ._geo_values import valid_geo_values
 from .utils import days_in_range, weeks_in_range, guess_time_value_is_day, guess_time_value_is_week, IntRange, TimeValues, days_to_ranges, weeks_to_ranges
 from ._validate import require_any, require_all
 
+_MULTI_ARG_PATTERN = re.compile(r"^([\w\-_]+):(.*)$", re.MULTILINE)
+_SINGLE_ARG_PATTERN = re.compile(r"^([\w\-_]+):([\w\-_]+)$", re.MULTILINE)
+_WEEK_PATTERN = re.compile(r"^(\d{6})$", re.MULTILINE)
+_WEEK_RANGE_PATTERN = re.compile(r"^(\d{6})-(\d{6})$", re.MULTILINE)
+_DAY_PATTERN = re.compile(r"^(\d{8})$", re.MULTILINE)
+_ISO_DAY_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})$", re.MULTILINE)
+_DAY_RANGE_PATTERN = re.compile(r"^(\d{8})-(\d{8})$", re.MULTILINE)
+_ISO_DAY_RANGE_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})--(\d{4}-\d{2}-\d{2})$", re.MULTILINE)
 
 def _parse_common_multi_arg(key: str) -> List[Tuple[str, Union[bool, Sequence[str]]]]:
     # support multiple request parameter with the same name
@@ -21,9 +30,8 @@ def _parse_common_multi_arg(key: str) -> List[Tuple[str, Union[bool, Sequence[st
     if not line:
         return parsed
 
-    pattern: re.Pattern[str] = re.compile(r"^([\w\-_]+):(.*)$", re.MULTILINE)
     for entry in line.split(";"):
-        m: Optional[re.Match[str]] = pattern.match(entry)
+        m: Optional[re.Match[str]] = _MULTI_ARG_PATTERN.match(entry)
         if not m:
             raise ValidationFailedException(f"{key} param: {entry} is not matching <{key}_type>:<{key}_values> syntax")
         group_type: str = m.group(1).strip().lower()
@@ -42,8 +50,7 @@ def _parse_single_arg(key: str) -> Tuple[str, str]:
     v = request.values.get(key)
     if not v:
         raise ValidationFailedException(f"{key} param is required")
-    pattern: re.Pattern[str] = re.compile(r"^([\w\-_]+):([\w\-_]+)$", re.MULTILINE)
-    m: Optional[re.Match[str]] = pattern.match(v)
+    m: Optional[re.Match[str]] = _SINGLE_ARG_PATTERN.match(v)
     if not v or not m:
         raise ValidationFailedException(f"{key} param: is not matching <{key}_type>:<{key}_value> syntax")
     return m.group(1).strip().lower(), m.group(2).strip().lower()
@@ -58,20 +65,9 @@ class GeoSet:
         if not isinstance(geo_values, bool):
             if geo_values == ['']:
                 raise ValidationFailedException(f"geo_value is empty for the requested geo_type {geo_type}!")
-            # TODO: keep this translator in sync with CsvImporter.GEOGRAPHIC_RESOLUTIONS in acquisition/covidcast/ and with GeoMapper
-            # NOTE: We are not including `hsa_nci` here as the geomapper code does not support that version of the HSA definition.
-            geo_type_translator = {
-                "county": "fips",
-                "state": "state_id",
-                "zip": "zip",
-                "hrr": "hrr",
-                "hhs": "hhs",
-                "msa": "msa",
-                "nation": "nation"
-            }
-            if geo_type in geo_type_translator: # else geo_type is unknown to GeoMapper
-                allowed_values = delphi_utils.geomap.GeoMapper().get_geo_values(geo_type_translator[geo_type])
-                invalid_values = set(geo_values) - set(allowed_values)
+            allowed_values = valid_geo_values.allowed(geo_type)
+            if allowed_values is not None: # else geo_type is unknown to GeoMapper
+                invalid_values = set(geo_values) - allowed_values
                 if invalid_values:
                     raise ValidationFailedException(f"Invalid geo_value(s) {', '.join(invalid_values)} for the requested geo_type {geo_type}")
         self.geo_type = geo_type
@@ -176,19 +172,21 @@ def _verify_range(start: int, end: int) -> IntRange:
     raise ValidationFailedException(f"the given range {start}-{end} is inverted")
 
 
+# time values repeat across requests (e.g. the same date ranges of a dashboard), keep their parsed forms per process
+@lru_cache(maxsize=4096)
 def parse_week_value(time_value: str) -> IntRange:
     count_dashes = time_value.count("-")
     msg = f"{time_value} does not match a known format YYYYWW or YYYYWW-YYYYWW"
 
     if count_dashes == 0:
         # plain delphi date YYYYWW
-        if not re.match(r"^(\d{6})$", time_value, re.MULTILINE):
+        if not _WEEK_PATTERN.match(time_value):
             raise ValidationFailedException(msg)
         return int(time_value)
 
     if count_dashes == 1:
         # delphi date range YYYYWW-YYYYWW
-        if not re.match(r"^(\d{6})-(\d{6})$", time_value, re.MULTILINE):
+        if not _WEEK_RANGE_PATTERN.match(time_value):
             raise ValidationFailedException(msg)
         [first, last] = time_value.split("-", 2)
         return _verify_range(int(first), int(last))
@@ -196,32 +194,33 @@ def parse_week_value(time_value: str) -> IntRange:
     raise ValidationFailedException(msg)
 
 
+@lru_cache(maxsize=4096)
 def parse_day_value(time_value: str) -> IntRange:
     count_dashes = time_value.count("-")
     msg = f"{time_value} does not match a known format YYYYMMDD, YYYY-MM-DD, YYYYMMDD-YYYYMMDD, or YYYY-MM-DD--YYYY-MM-DD"
 
     if count_dashes == 0:
         # plain delphi date YYYYMMDD
-        if not re.match(r"^(\d{8})$", time_value, re.MULTILINE):
+        if not _DAY_PATTERN.match(time_value):
             raise ValidationFailedException(msg)
         return int(time_value)
 
     if count_dashes == 2:
         # iso date YYYY-MM-DD
-        if not re.match(r"^(\d{4}-\d{2}-\d{2})$", time_value, re.MULTILINE):
+        if not _ISO_DAY_PATTERN.match(time_value):
             raise ValidationFailedException(msg)
         return int(time_value.replace("-", ""))
 
     if count_dashes == 1:
         # delphi date range YYYYMMDD-YYYYMMDD
-        if not re.match(r"^(\d{8})-(\d{8})$", time_value, re.MULTILINE):
+        if not _DAY_RANGE_PATTERN.match(time_value):
             raise ValidationFailedException(msg)
         [first, last] = time_value.split("-", 2)
         return _verify_range(int(first), int(last))
 
     if count_dashes == 6:
         # delphi iso date range YYYY-MM-DD--YYYY-MM-DD
-        if not re.match(r"^(\d{4}-\d{2}-\d{2})--(\d{4}-\d{2}-\d{2})$", time_value, re.MULTILINE):
+        if not _ISO_DAY_RANGE_PATTERN.match(time_value):
             raise ValidationFailedException(msg)
         [first, last] = time_value.split("--", 2)
         return _verify_range(int(first.replace("-", "")), int(last.replace("-", "")))
@@ -402,6 +401,18 @@ def extract_integers(key: Union[str, Sequence[str]]) -> Optional[List[IntRange]]
         raise ValidationFailedException(f"{key}: not a number: {str(e)}")
 
 
+def extract_unordered(key: Union[str, Sequence[str]] = "order") -> bool:
+    """
+    whether the client opted out of sorted results (`order=none`), e.g. for bulk loads into a data frame
+    """
+    s = _extract_value(key)
+    if not s or s == "sorted":
+        return False
+    if s == "none":
+        return True
+    raise ValidationFailedException(f"{key}: unknown order {s}, use 'sorted' or 'none'")
+
+
 def parse_date(s: str) -> int:
     # parses a given string in format YYYYMMDD or YYYY-MM-DD to a number in the form YYYYMMDD
     try:
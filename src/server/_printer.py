@@ -1,12 +1,18 @@
-from csv import DictWriter
-from io import StringIO
-from typing import Any, Dict, Iterable, List, Optional, Union
+from csv import writer
+from io import RawIOBase, StringIO
+from operator import itemgetter
+from time import monotonic
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
 
 from flask import Response, jsonify, stream_with_context
 from flask.json import dumps
 import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-from ._config import MAX_RESULTS, MAX_COMPATIBILITY_RESULTS
+from ._compression import compress_body, compress_stream
+from ._config import ARROW_BATCH_SIZE, MAX_RESULTS, MAX_COMPATIBILITY_RESULTS, PRINTER_CHUNK_SIZE, PRINTER_FLUSH_INTERVAL
 from ._common import is_compatibility_mode, log_info_with_request
 from delphi_utils import get_structured_logger
 
@@ -30,10 +36,39 @@ def print_non_standard(format: str, data):
 
 
 class APrinter:
+    # whether the output is worth compressing on the fly
+    compressible = True
+
     def __init__(self):
         self.count: int = 0
         self.result: int = -1
         self._max_results: int = MAX_COMPATIBILITY_RESULTS if is_compatibility_mode() else MAX_RESULTS
+        self._field_types: Dict[str, str] = {}
+        self._grouped_by: Optional[str] = None
+        # continuation token to fetch the rows after the truncated result, see `QueryBuilder.apply_cursor`
+        self.next_cursor: Optional[str] = None
+
+    def set_field_types(
+        self,
+        fields_string: Sequence[str] = (),
+        fields_int: Sequence[str] = (),
+        fields_float: Sequence[str] = (),
+    ):
+        """
+        declares the types of the fields to be printed, used by typed output formats
+        """
+        self._field_types = {
+            **{f: "string" for f in fields_string},
+            **{f: "int" for f in fields_int},
+            **{f: "float" for f in fields_float},
+        }
+
+    def set_grouped_by(self, field: Optional[str]):
+        """
+        declares that all rows with the same value of the given field arrive next to each other,
+        e.g. since the query is sorted by it
+        """
+        self._grouped_by = field
 
     def make_response(self, gen, headers=None):
         return Response(
@@ -42,7 +77,12 @@ class APrinter:
             headers=headers,
         )
 
-    def __call__(self, generator: Iterable[Dict[str, Any]], headers=None) -> Response:
+    def __call__(self, generator: Iterable[Dict[str, Any]], headers=None, capture=None) -> Response:
+        """
+        streams the rows of the given generator, if a `capture` is given (see `_cache.ResponseCapture`)
+        all sent chunks are written to it as well (before being compressed, see `_compression.py`)
+        """
+
         def gen():
             self.result = -2  # no result, default response
             began = False
@@ -74,7 +114,47 @@ class APrinter:
             if r is not None:
                 yield r
 
-        return self.make_response(stream_with_context(gen()), headers=headers)
+        def coalesced(chunks):
+            # merge the small per row chunks into fewer and larger writes,
+            # flushed when the buffer is full or was kept for too long
+            buffer: List[bytes] = []
+            size = 0
+            last_flush = monotonic()
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                buffer.append(data)
+                size += len(data)
+                if size >= PRINTER_CHUNK_SIZE or monotonic() - last_flush >= PRINTER_FLUSH_INTERVAL:
+                    yield b"".join(buffer)
+                    buffer = []
+                    size = 0
+                    last_flush = monotonic()
+            if buffer:
+                yield b"".join(buffer)
+
+        def captured(chunks):
+            for chunk in chunks:
+                capture.write(chunk)
+                yield chunk
+            capture.finish(self.result != -1)
+
+        chunks = coalesced(gen())
+        if capture is not None:
+            chunks = captured(chunks)
+        if self.compressible:
+            headers, chunks = compress_stream(chunks, headers)
+        return self.make_response(stream_with_context(chunks), headers=headers)
+
+    def replay(self, body: bytes, headers=None) -> Response:
+        """
+        sends a previously captured response body
+        """
+        log_info_with_request("APrinter replayed cached response", size=len(body))
+        if self.compressible:
+            headers, body = compress_body(body, headers)
+        return self.make_response(body, headers=headers)
 
     @property
     def remaining_rows(self) -> int:
@@ -134,32 +214,63 @@ class ClassicPrinter(APrinter):
             # no array to end
             prefix = ""
 
+        cursor = ""
         if self.count == 0:
             message = "no results"
         elif self.result == 2:
             message = "too many results, data truncated"
-        return f'{prefix}"result": {self.result}, "message": {dumps(message)} }}'.encode("utf-8")
+            if self.next_cursor and not is_compatibility_mode():
+                cursor = f', "next_cursor": {dumps(self.next_cursor)}'
+        return f'{prefix}"result": {self.result}, "message": {dumps(message)}{cursor} }}'.encode("utf-8")
+
+
+def _collation_run(group: Any) -> str:
+    """
+    the value the database sorts the given group by: its default collations ignore case, accents and trailing spaces,
+    so groups differing only by those can arrive interleaved
+    """
+    decomposed = unicodedata.normalize("NFKD", str(group))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().rstrip(" ")
 
 
 class ClassicTreePrinter(ClassicPrinter):
     """
-    a printer class writing a tree by the given grouping criteria as the first element in the epidata array
+    a printer class writing a tree by the given grouping criteria as the first element in the epidata array.
+    if the rows arrive grouped by the criteria (see `set_grouped_by`) each group is streamed as it arrives,
+    otherwise the whole tree is buffered and written at the end
     """
 
     group: str
-    _tree: Dict[str, List[Dict]] = dict()
 
     def __init__(self, group: str):
         super(ClassicTreePrinter, self).__init__()
         self.group = group
+        self._tree: Dict[str, List[Dict]] = dict()
+        self._reset_stream()
+
+    def _reset_stream(self):
+        # the groups sorted alike by the database arrive as one run, the first group of the run is streamed
+        # and the rows of any others are buffered until the run ends
+        self._run: Optional[str] = None
+        self._ended_runs: Set[str] = set()
+        self._current_group: Any = None
+        self._streamed_group: Any = None
+        self._buffered_groups: Dict[str, List[bytes]] = dict()
+
+    @property
+    def streaming(self) -> bool:
+        return self._grouped_by == self.group
 
     def _begin(self):
         self._tree = dict()
+        self._reset_stream()
         return super(ClassicTreePrinter, self)._begin()
 
     def _format_row(self, first: bool, row: Dict):
         group = row.get(self.group, "")
         del row[self.group]
+        if self.streaming:
+            return self._stream_row(first, group, row)
         if group in self._tree:
             self._tree[group].append(row)
         else:
@@ -168,12 +279,51 @@ class ClassicTreePrinter(ClassicPrinter):
             return b'"epidata": ['
         return None
 
+    def _stream_row(self, first: bool, group: Any, row: Dict) -> Optional[bytes]:
+        if not first and group == self._current_group:
+            if group == self._streamed_group:
+                return b"," + orjson.dumps(row)
+            self._buffered_groups[str(group)].append(orjson.dumps(row))
+            return None
+
+        self._current_group = group
+        run = _collation_run(group)
+        if not first and run == self._run:
+            if group == self._streamed_group:
+                return b"," + orjson.dumps(row)
+            self._buffered_groups.setdefault(str(group), []).append(orjson.dumps(row))
+            return None
+
+        if run in self._ended_runs:
+            # a group can't be continued once written
+            raise ValueError(f"tree input not grouped by {self.group}: {group} arrived again")
+        if first:
+            sep = b'"epidata": [{' if is_compatibility_mode() else b"{"
+        else:
+            sep = self._end_run() + b","
+        self._run = run
+        self._streamed_group = group
+        # keys are strings in JSON
+        return sep + orjson.dumps(str(group)) + b":[" + orjson.dumps(row)
+
+    def _end_run(self) -> bytes:
+        """
+        ends the array of the streamed group and writes the buffered groups of the current run
+        """
+        self._ended_runs.add(self._run)
+        buffered = b"".join(b"," + orjson.dumps(key) + b":[" + b",".join(rows) + b"]" for key, rows in self._buffered_groups.items())
+        self._buffered_groups = dict()
+        return b"]" + buffered
+
     def _end(self):
         if self.count == 0:
             return super(ClassicTreePrinter, self)._end()
 
-        tree = orjson.dumps(self._tree)
-        self._tree = dict()
+        if self.streaming:
+            tree = self._end_run() + b"}"
+        else:
+            tree = orjson.dumps(self._tree)
+            self._tree = dict()
         r = super(ClassicTreePrinter, self)._end()
         return tree + r
 
@@ -183,13 +333,15 @@ class CSVPrinter(APrinter):
     a printer class writing in a CSV file
     """
 
-    _stream = StringIO()
-    _writer: DictWriter
     _filename: Optional[str]
 
     def __init__(self, filename: Optional[str] = "epidata"):
         super(CSVPrinter, self).__init__()
         self._filename = filename
+        self._stream = StringIO()
+        self._writer = writer(self._stream, lineterminator="\n")
+        self._columns: List[str] = []
+        self._values: Callable[[Dict], Sequence[Any]] = lambda row: ()
 
     def make_response(self, gen, headers=None):
         if headers is None:
@@ -198,30 +350,39 @@ class CSVPrinter(APrinter):
             headers["Content-Disposition"] = f"attachment; filename={self._filename}.csv"
         return Response(gen, mimetype="text/csv; charset=utf8", headers=headers)
 
+    def _drain(self) -> str:
+        v = self._stream.getvalue()
+        self._stream.seek(0)
+        self._stream.truncate(0)
+        return v
+
     def _begin(self):
         return None
 
     def _error(self, error: Exception) -> str:
-        # send an generic error
-        return f"unknown error occurred:\n{error}"
+        # send the rows written so far and an generic error
+        return f"{self._drain()}unknown error occurred:\n{error}"
 
     def _format_row(self, first: bool, row: Dict):
         if first:
-            columns = list(row.keys())
-            self._writer = DictWriter(self._stream, columns, lineterminator="\n")
-            self._writer.writeheader()
-        self._writer.writerow(row)
-
-        # remove the stream content to print just one line at a time
-        self._stream.flush()
-        v = self._stream.getvalue()
-        self._stream.seek(0)
-        self._stream.truncate(0)
-        return v
+            self._columns = list(row.keys())
+            self._writer.writerow(self._columns)
+            getter = itemgetter(*self._columns)
+            self._values = getter if len(self._columns) > 1 else lambda row: (getter(row),)
+        try:
+            values = self._values(row)
+        except KeyError:
+            # missing fields are written as empty values
+            values = [row.get(c) for c in self._columns]
+        self._writer.writerow(values)
+
+        # write out the collected rows once they are worth a chunk
+        if self._stream.tell() >= PRINTER_CHUNK_SIZE:
+            return self._drain()
+        return None
 
     def _end(self):
-        self._writer = None
-        return ""
+        return self._drain()
 
 
 class JSONPrinter(APrinter):
@@ -256,18 +417,158 @@ class JSONLPrinter(APrinter):
         return b""
 
 
+class _DrainableSink(RawIOBase):
+    """
+    a write-only stream whose content written so far can be taken out, so binary writers can be streamed
+    """
+
+    def __init__(self):
+        super(_DrainableSink, self).__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_ARROW_TYPES = {"string": pa.string(), "int": pa.int64(), "float": pa.float64()}
+
+
+class ArrowPrinter(APrinter):
+    """
+    a printer class writing an Apache Arrow IPC stream, rows are collected into record batches of `ARROW_BATCH_SIZE` rows
+    """
+
+    _attachment: Optional[str] = None
+    _mimetype = "application/vnd.apache.arrow.stream"
+
+    def __init__(self):
+        super(ArrowPrinter, self).__init__()
+        self._sink = _DrainableSink()
+        self._schema: Optional[pa.Schema] = None
+        self._writer = None
+        self._columns: Dict[str, List[Any]] = {}
+        self._pending = 0
+
+    def make_response(self, gen, headers=None):
+        if self._attachment:
+            headers = dict(headers or {})
+            headers["Content-Disposition"] = f"attachment; filename={self._attachment}"
+        return Response(gen, mimetype=self._mimetype, headers=headers)
+
+    def _open_writer(self, schema: pa.Schema):
+        return pa.ipc.new_stream(self._sink, schema)
+
+    def _write_batch(self, batch: pa.RecordBatch):
+        self._writer.write_batch(batch)
+
+    def _infer_schema(self) -> pa.Schema:
+        fields = []
+        for name, values in self._columns.items():
+            data_type = _ARROW_TYPES.get(self._field_types.get(name, ""))
+            if data_type is None:
+                # not declared, e.g. added by a transformation
+                data_type = pa.array(values).type if values else pa.string()
+                if pa.types.is_null(data_type):
+                    data_type = pa.string()
+            fields.append(pa.field(name, data_type))
+        return pa.schema(fields)
+
+    def _flush(self) -> bytes:
+        if self._schema is None:
+            self._schema = self._infer_schema()
+            self._writer = self._open_writer(self._schema)
+        if self._pending > 0:
+            arrays = [pa.array(self._columns[f.name], type=f.type) for f in self._schema]
+            self._write_batch(pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+            self._columns = {k: [] for k in self._columns}
+            self._pending = 0
+        return self._sink.drain()
+
+    def _error(self, error: Exception) -> bytes:
+        # there is no way to transport an error within the stream,
+        # so append the message to make the stream unreadable for clients
+        return f"unknown error occurred:\n{error}".encode("utf-8")
+
+    def _format_row(self, first: bool, row: Dict):
+        if first:
+            self._columns = {k: [] for k in row.keys()}
+        for k, values in self._columns.items():
+            values.append(row.get(k))
+        self._pending += 1
+        if self._pending >= ARROW_BATCH_SIZE:
+            return self._flush()
+        return None
+
+    def _end(self):
+        if self.result == -1:
+            # don't finish a broken stream
+            return None
+        if self.count == 0:
+            # no rows to derive the columns from
+            self._columns = {k: [] for k in self._field_types}
+        r = self._flush()
+        self._writer.close()
+        return r + self._sink.drain()
+
+
+class ParquetPrinter(ArrowPrinter):
+    """
+    a printer class writing a Parquet file, each batch of `ARROW_BATCH_SIZE` rows is written as a row group
+    """
+
+    _attachment = "epidata.parquet"
+    _mimetype = "application/vnd.apache.parquet"
+    # parquet pages are compressed already
+    compressible = False
+
+    def _open_writer(self, schema: pa.Schema):
+        return pq.ParquetWriter(self._sink, schema)
+
+    def _write_batch(self, batch: pa.RecordBatch):
+        self._writer.write_table(pa.Table.from_batches([batch]))
+
+
+def tree_group(format: Optional[str]) -> Optional[str]:
+    """
+    the field the tree format groups by, if the given format is a tree format
+    """
+    if format == "tree":
+        return "signal"
+    if format and format.startswith("tree-"):
+        # support tree format by any property following the dash
+        return format[len("tree-") :]
+    return None
+
+
 def create_printer(format: str) -> APrinter:
     if format is None:
         return ClassicPrinter()
-    if format == "tree":
-        return ClassicTreePrinter("signal")
-    if format.startswith("tree-"):
-        # support tree format by any property following the dash
-        return ClassicTreePrinter(format[len("tree-") :])
+    group = tree_group(format)
+    if group is not None:
+        return ClassicTreePrinter(group)
     if format == "json":
         return JSONPrinter()
     if format == "csv":
         return CSVPrinter()
     if format == "jsonl":
         return JSONLPrinter()
+    if format == "arrow":
+        return ArrowPrinter()
+    if format == "parquet":
+        return ParquetPrinter()
     return ClassicPrinter()
\ No newline at end of file
@@ -1,9 +1,14 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
 from datetime import date, datetime
+import heapq
+from threading import Event
 from typing import (
     Any,
     Callable,
     Dict,
     Iterable,
+    Iterator,
     List,
     Optional,
     Sequence,
@@ -13,14 +18,21 @@ from typing import (
 )
 from flask import Response
 
+from delphi_utils import get_structured_logger
 from flask import request
+import orjson
 from sqlalchemy import text
 from sqlalchemy.engine import Row
+from werkzeug.http import is_resource_modified
 
-from ._common import db
+from ._cache import ResponseValidator, make_cache_key, response_cache
+from ._common import current_engine, db, is_compatibility_mode, log_info_with_request
+from ._config import FILTER_KEY_TABLE_THRESHOLD, QUERY_FETCH_SIZE
 from ._printer import create_printer, APrinter
-from ._exceptions import DatabaseErrorException
+from ._exceptions import DatabaseErrorException, ValidationFailedException
+from ._parallel import is_parallel_enabled, start_queries
 from ._params import extract_strings, GeoSet, SourceSignalSet, TimeSet
+from ._singleflight import single_flight
 from .utils import time_values_to_ranges, IntRange, TimeValues
 
 
@@ -49,6 +61,49 @@ def to_condition(
     return f"{field} = :{param_key}"
 
 
+def to_set_condition(
+    field: str,
+    values: Sequence[Union[str, int]],
+    param_key: str,
+    params: Dict[str, Any],
+    formatter=lambda x: x,
+) -> str:
+    """
+    builds a single set membership condition for the given scalar values.
+    above `FILTER_KEY_TABLE_THRESHOLD` values the set is shipped as a single JSON parameter
+    which is expanded into a key table on the database side, so the statement stays small.
+    its strings are compared in the collation of the tables rather than the binary one of JSON
+    """
+    if len(values) == 1:
+        return to_condition(field, values[0], f"{param_key}_0", params, formatter)
+    if len(values) > FILTER_KEY_TABLE_THRESHOLD:
+        keys = [formatter(v) for v in values]
+        key_type = "BIGINT" if all(isinstance(v, int) for v in keys) else "VARCHAR(255) COLLATE utf8mb4_0900_ai_ci"
+        params[f"{param_key}_keys"] = orjson.dumps(keys).decode("utf-8")
+        key_table = f"JSON_TABLE(:{param_key}_keys, '$[*]' COLUMNS (v {key_type} PATH '$')) AS {param_key}_keys"
+        return f"{field} IN (SELECT v FROM {key_table})"
+    keys = []
+    for i, v in enumerate(values):
+        params[f"{param_key}_{i}"] = formatter(v)
+        keys.append(f":{param_key}_{i}")
+    return f"{field} IN ({', '.join(keys)})"
+
+
+def coalesce_integers(values: Sequence[IntRange]) -> List[IntRange]:
+    """
+    merges overlapping and adjacent integer values and ranges, similar to `time_values_to_ranges` for dates
+    e.g. [5, 1, 2, (3, 4), 8] -> [(1, 5), 8]
+    """
+    intervals = sorted((v[0], v[1]) if isinstance(v, (list, tuple)) else (v, v) for v in values)
+    merged: List[List[int]] = []
+    for first, last in intervals:
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return [first if first == last else (first, last) for first, last in merged]
+
+
 def filter_values(
     field: str,
     values: Optional[Sequence[Union[str, IntRange]]],
@@ -61,7 +116,14 @@ def filter_values(
     # builds a SQL expression to filter strings (ex: locations)
     #   $field: name of the field to filter
     #   $values: array of values
-    conditions = [to_condition(field, v, f"{param_key}_{i}", params, formatter) for i, v in enumerate(values)]
+    # scalar values are merged into a single set condition, ranges are kept as BETWEEN conditions
+    scalars = list(dict.fromkeys(v for v in values if not isinstance(v, (list, tuple))))
+    ranges = list(dict.fromkeys(tuple(v) for v in values if isinstance(v, (list, tuple))))
+    conditions = []
+    if scalars:
+        conditions.append(to_set_condition(field, scalars, param_key, params, formatter))
+    for i, v in enumerate(ranges, len(scalars)):
+        conditions.append(to_condition(field, v, f"{param_key}_{i}", params, formatter))
     return f"({' OR '.join(conditions)})"
 
 
@@ -80,6 +142,8 @@ def filter_integers(
     param_key: str,
     params: Dict[str, Any],
 ) -> str:
+    if values and all(isinstance(v, int) or (isinstance(v, (list, tuple)) and all(isinstance(x, int) for x in v)) for v in values):
+        values = coalesce_integers(values)
     return filter_values(field, values, param_key, params)
 
 
@@ -116,33 +180,73 @@ def filter_fields(generator: Iterable[Dict[str, Any]]):
             yield filtered
 
 
-def filter_geo_sets(
+def requested_field_filter() -> Optional[Callable[[str], bool]]:
+    """
+    returns a predicate for the fields selected by the `fields` parameter, or None if all fields are requested.
+    the parameter lists fields to include, and fields to exclude prefixed with `-`
+    """
+    fields = set(extract_strings("fields") or [])
+    if not fields:
+        return None
+    exclude_fields = {f[1:] for f in fields if f.startswith("-")}
+    include_fields = {f for f in fields if not f.startswith("-") and f not in exclude_fields}
+    return lambda f: (not include_fields or f in include_fields) and f not in exclude_fields
+
+
+def filter_typed_sets(
     type_field: str,
     value_field: str,
-    values: Sequence[GeoSet],
+    values: Sequence[Tuple[str, Union[bool, Sequence[str]]]],
     param_key: str,
     params: Dict[str, Any],
 ) -> str:
     """
-    returns the SQL sub query to filter by the given geo sets
+    returns the SQL sub query to filter by the given (type, values) pairs.
+    pairs of the same type are merged and all wildcard types are collected into a single set condition
     """
+    merged: Dict[str, Union[bool, List[str]]] = {}
+    for set_type, set_values in values:
+        current = merged.get(set_type, [])
+        if current is True or (isinstance(set_values, bool) and set_values):
+            merged[set_type] = True
+        else:
+            merged[set_type] = cast(List[str], current) + list(cast(Sequence[str], set_values or []))
+
+    if not merged:
+        # something has to be selected
+        return "FALSE"
 
-    def filter_set(gset: GeoSet, i) -> str:
+    parts: List[str] = []
+    wildcards: List[str] = []
+    for i, (set_type, set_values) in enumerate(merged.items()):
         type_param = f"{param_key}_{i}t"
-        params[type_param] = gset.geo_type
-        if isinstance(gset.geo_values, bool) and gset.geo_values:
-            return f"{type_field} = :{type_param}"
-        return f"({type_field} = :{type_param} AND {filter_strings(value_field, cast(Sequence[str], gset.geo_values), type_param, params)})"
+        params[type_param] = set_type
+        if set_values is True:
+            wildcards.append(f":{type_param}")
+        else:
+            parts.append(f"({type_field} = :{type_param} AND {filter_strings(value_field, cast(Sequence[str], set_values), type_param, params)})")
 
-    parts = [filter_set(p, i) for i, p in enumerate(values)]
-
-    if not parts:
-        # something has to be selected
-        return "FALSE"
+    if len(wildcards) == 1:
+        parts.insert(0, f"{type_field} = {wildcards[0]}")
+    elif wildcards:
+        parts.insert(0, f"{type_field} IN ({', '.join(wildcards)})")
 
     return f"({' OR '.join(parts)})"
 
 
+def filter_geo_sets(
+    type_field: str,
+    value_field: str,
+    values: Sequence[GeoSet],
+    param_key: str,
+    params: Dict[str, Any],
+) -> str:
+    """
+    returns the SQL sub query to filter by the given geo sets
+    """
+    return filter_typed_sets(type_field, value_field, [(g.geo_type, g.geo_values) for g in values], param_key, params)
+
+
 def filter_source_signal_sets(
     source_field: str,
     signal_field: str,
@@ -153,21 +257,7 @@ def filter_source_signal_sets(
     """
     returns the SQL sub query to filter by the given source signal sets
     """
-
-    def filter_set(ssset: SourceSignalSet, i) -> str:
-        source_param = f"{param_key}_{i}t"
-        params[source_param] = ssset.source
-        if isinstance(ssset.signal, bool) and ssset.signal:
-            return f"{source_field} = :{source_param}"
-        return f"({source_field} = :{source_param} AND {filter_strings(signal_field, cast(Sequence[str], ssset.signal), source_param, params)})"
-
-    parts = [filter_set(p, i) for i, p in enumerate(values)]
-
-    if not parts:
-        # something has to be selected
-        return "FALSE"
-
-    return f"({' OR '.join(parts)})"
+    return filter_typed_sets(source_field, signal_field, [(s.source, s.signal) for s in values], param_key, params)
 
 
 def filter_time_set(
@@ -218,6 +308,88 @@ def parse_row(
     return parsed
 
 
+def _to_string(v: Any) -> Any:
+    if isinstance(v, (date, datetime)):
+        return v.strftime("%Y-%m-%d")  # format to iso date
+    return v
+
+
+def _to_int(v: Any) -> Optional[int]:
+    return int(v) if v is not None else None
+
+
+def _to_float(v: Any) -> Optional[float]:
+    return float(v) if v is not None else None
+
+
+def _to_none(_: Any) -> None:
+    return None
+
+
+class RowDecoder:
+    """
+    decodes the rows of a result set into dictionaries of the requested fields, like `parse_row`.
+    the column positions and converters are resolved just once per result set
+    and rows are fetched from the cursor in batches of `QUERY_FETCH_SIZE`
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        fields_string: Optional[Sequence[str]] = None,
+        fields_int: Optional[Sequence[str]] = None,
+        fields_float: Optional[Sequence[str]] = None,
+    ):
+        positions = {c: i for i, c in enumerate(columns)}
+        fields: Dict[str, Tuple[int, Callable[[Any], Any]]] = {}
+        for names, converter in ((fields_string, _to_string), (fields_int, _to_int), (fields_float, _to_float)):
+            for f in names or []:
+                # fields not provided by the result set are always None
+                fields[f] = (positions[f], converter) if f in positions else (0, _to_none)
+        self._fields = [(f, i, converter) for f, (i, converter) in fields.items()]
+
+    @staticmethod
+    def of(
+        result: Any,
+        fields_string: Optional[Sequence[str]] = None,
+        fields_int: Optional[Sequence[str]] = None,
+        fields_float: Optional[Sequence[str]] = None,
+    ) -> "RowDecoder":
+        return RowDecoder(list(result.keys()), fields_string, fields_int, fields_float)
+
+    def decode(self, row: Row) -> Dict[str, Any]:
+        return {f: converter(row[i]) for f, i, converter in self._fields}
+
+    def batches(self, result: Any, batch_size: int = QUERY_FETCH_SIZE) -> Iterator[List[Row]]:
+        while True:
+            batch = result.fetchmany(batch_size)
+            if not batch:
+                return
+            yield batch
+
+    def rows(self, result: Any, batch_size: int = QUERY_FETCH_SIZE) -> Iterator[Tuple[Dict[str, Any], Row]]:
+        """
+        yields the decoded rows of the given result along with the raw rows
+        """
+        fields = self._fields
+        for batch in self.batches(result, batch_size):
+            for row in batch:
+                yield {f: converter(row[i]) for f, i, converter in fields}, row
+
+
+def decode_rows(
+    result: Any,
+    fields_string: Optional[Sequence[str]] = None,
+    fields_int: Optional[Sequence[str]] = None,
+    fields_float: Optional[Sequence[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    decodes all rows of the given result into dictionaries of the requested fields
+    """
+    for parsed, _ in RowDecoder.of(result, fields_string, fields_int, fields_float).rows(result):
+        yield parsed
+
+
 def parse_result(
     query: str,
     params: Dict[str, Any],
@@ -228,7 +400,29 @@ def parse_result(
     """
     execute the given query and return the result as a list of dictionaries
     """
-    return [parse_row(row, fields_string, fields_int, fields_float) for row in db.execute(text(query), **params)]
+    return list(decode_rows(db.execute(text(query), **params), fields_string, fields_int, fields_float))
+
+
+def encode_cursor(fields: Sequence[str], values: Sequence[Any]) -> str:
+    """
+    encodes the sort key of the last sent row as an opaque continuation token
+    """
+    return urlsafe_b64encode(orjson.dumps([list(fields), list(values)])).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, fields: Sequence[str]) -> List[Any]:
+    """
+    decodes a continuation token created by `encode_cursor` for a query sorted by the given fields
+    """
+    try:
+        cursor_fields, values = orjson.loads(urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (Base64Error, ValueError, TypeError):
+        raise ValidationFailedException("invalid cursor")
+    if cursor_fields != list(fields) or not isinstance(values, list) or len(values) != len(fields):
+        raise ValidationFailedException("cursor does not match the query")
+    if not all(isinstance(v, (str, int)) and not isinstance(v, bool) for v in values):
+        raise ValidationFailedException("invalid cursor")
+    return values
 
 
 def limit_query(query: str, limit: int) -> str:
@@ -243,6 +437,24 @@ def run_query(p: APrinter, query_tuple: Tuple[str, Dict[str, Any]]) -> Iterable[
     return db.execution_options(stream_results=True).execute(full_query, **params)
 
 
+# maps the characters of the labels stored in the database (sources, signals, geo types and values) so that python sorts
+# them like the default collation of the columns (utf8mb4_0900_ai_ci) does: case insensitive, with spaces and
+# punctuation (in the order of the unicode collation algorithm) before digits before letters
+_COLLATION_ORDER = str.maketrans(
+    {
+        **{c: chr(1 + i) for i, c in enumerate(" _-,;:!?.'\"()[]{}@*/\\&#%`^+<=>|~$")},
+        **{chr(c): chr(c).lower() for c in range(ord("A"), ord("Z") + 1)},
+    }
+)
+
+
+def collation_key(value: Any) -> Any:
+    """
+    the key to sort the given value by like the database sorts its column
+    """
+    return value.translate(_COLLATION_ORDER) if isinstance(value, str) else value
+
+
 def _identity_transform(row: Dict[str, Any], _: Row) -> Dict[str, Any]:
     """
     identity transform
@@ -256,26 +468,63 @@ def execute_queries(
     fields_int: Sequence[str],
     fields_float: Sequence[str],
     transform: Callable[[Dict[str, Any], Row], Dict[str, Any]] = _identity_transform,
+    validator: Optional[ResponseValidator] = None,
+    grouped_by: Optional[str] = None,
+    cursor_fields: Optional[Sequence[str]] = None,
+    merge_by: Optional[Sequence[str]] = None,
+    fallback: Optional[Tuple[str, Dict[str, Any]]] = None,
 ) -> Response:
     """
     execute the given queries and return the response to send them
+
+    if a `validator` of the queried data is given, the response carries `ETag` and `Last-Modified` headers,
+    conditional requests are answered with 304 without running the queries,
+    and the response is served from and stored in the response cache (see `_cache.py`)
+
+    `grouped_by` declares a field the rows of all queries together are sorted by, which allows grouping printers to stream
+
+    `cursor_fields` are the fields the rows of all queries together are sorted by (see `QueryBuilder.sort_fields`),
+    if the result gets truncated a continuation token of the last sent row is passed to the printer
+
+    `merge_by` are the fields each of the queries is sorted by, the queries are then run concurrently and their rows merged
+    into one sorted stream (the fields must not be NULL). if there are not enough idle workers for that, the `fallback` query
+    returning the same rows is run instead
     """
+    if merge_by and fallback is None:
+        raise ValueError("merging queries requires a fallback query")
 
     p = create_printer(request.values.get("format"))
+    p.set_grouped_by(grouped_by)
 
     fields_to_send = set(extract_strings("fields") or [])
-    if fields_to_send:
-        exclude_fields = {f[1:] for f in fields_to_send if f.startswith("-")}
-        include_fields = {f for f in fields_to_send if not f.startswith("-") and f not in exclude_fields}
-
-        if include_fields:
-            fields_string = [v for v in fields_string if v in include_fields]
-            fields_int = [v for v in fields_int if v in include_fields]
-            fields_float = [v for v in fields_float if v in include_fields]
-        if exclude_fields:
-            fields_string = [v for v in fields_string if v not in exclude_fields]
-            fields_int = [v for v in fields_int if v not in exclude_fields]
-            fields_float = [v for v in fields_float if v not in exclude_fields]
+
+    headers = None
+    capture = None
+    if validator is not None:
+        # the representation also depends on the format, the selected fields, and the compatibility mode
+        key = make_cache_key(validator.tag, request.values.get("format"), sorted(fields_to_send), is_compatibility_mode())
+        headers = validator.headers(key)
+        if request.method in ("GET", "HEAD") and not is_resource_modified(request.environ, key, last_modified=validator.last_modified_date):
+            log_info_with_request("not modified", etag=key)
+            return Response(status=304, headers=headers)
+        if response_cache.enabled:
+            cached = response_cache.get(key)
+            if cached is not None:
+                return p.replay(cached, headers=headers)
+        # let identical requests arriving meanwhile wait for the response of this one
+        coalesced, flight = single_flight.join(key, lambda: response_cache.get(key))
+        if coalesced is not None:
+            return p.replay(coalesced.body, headers=headers)
+        if response_cache.enabled or flight is not None:
+            capture = response_cache.capture(key, validator.immutable, flight.complete if flight is not None else None)
+
+    is_requested = requested_field_filter()
+    if is_requested:
+        fields_string = [v for v in fields_string if is_requested(v)]
+        fields_int = [v for v in fields_int if is_requested(v)]
+        fields_float = [v for v in fields_float if is_requested(v)]
+
+    p.set_field_types(fields_string, fields_int, fields_float)
 
     query_list = list(queries)
 
@@ -284,19 +533,68 @@ def execute_queries(
             yield {}
 
     if not query_list or p.remaining_rows <= 0:
-        return p(dummy_gen)
+        return p(dummy_gen(), headers=headers, capture=capture)
+
+    last_row: List[Optional[Row]] = [None]
+
+    def decoded(r):
+        return RowDecoder.of(r, fields_string, fields_int, fields_float).rows(r)
+
+    def rows(decoded_rows):
+        for parsed, row in decoded_rows:
+            if cursor_fields:
+                if p.remaining_rows > 0:
+                    last_row[0] = row
+                elif last_row[0] is not None and p.next_cursor is None:
+                    # this row gets truncated, continue after the last one sent
+                    p.next_cursor = encode_cursor(cursor_fields, [last_row[0][f] for f in cursor_fields])
+            yield transform(parsed, row)
 
     def gen(first_rows):
-        for row in first_rows:
-            yield transform(parse_row(row, fields_string, fields_int, fields_float), row)
+        yield from rows(decoded(first_rows))
 
         for query_params in query_list:
             if p.remaining_rows <= 0:
                 # no more rows
                 break
-            r = run_query(p, query_params)
-            for row in r:
-                yield transform(parse_row(row, fields_string, fields_int, fields_float), row)
+            yield from rows(decoded(run_query(p, query_params)))
+
+    def gen_parallel(results, stop: Event):
+        try:
+            if merge_by:
+                # each query returns its rows in the order of the database, which python has to follow
+                key = lambda parsed_row: [collation_key(parsed_row[1][f]) for f in merge_by]
+                yield from rows(heapq.merge(*(decoded(r) for r in results), key=key))
+                return
+            for r in results:
+                if p.remaining_rows <= 0:
+                    # no more rows
+                    break
+                yield from rows(decoded(r))
+        finally:
+            # cancel the queries still running
+            stop.set()
+
+    if merge_by or is_parallel_enabled(len(query_list)):
+        # run all queries concurrently, sending their rows in the given order or merged
+        stop = Event()
+        limit = p.remaining_rows + 1
+        results = start_queries([(limit_query(query, limit), params) for query, params in query_list], stop, current_engine())
+        if results is not None:
+            try:
+                # wait for the (first) queries to start, to report their errors like in the sequential case
+                for r in results if merge_by else results[:1]:
+                    r.keys()
+            except Exception as e:
+                stop.set()
+                raise DatabaseErrorException(str(e))
+            response = p(gen_parallel(results, stop), headers=headers, capture=capture)
+            # also when the response body is never consumed (e.g. the client disconnects early)
+            response.call_on_close(stop.set)
+            return response
+        if merge_by:
+            # not enough idle workers, let the database do the merging
+            query_list = [fallback]
 
     # execute first query
     try:
@@ -305,7 +603,7 @@ def execute_queries(
         raise DatabaseErrorException(str(e))
 
     # now use a generator for sending the rows and execute all the other queries
-    return p(gen(r))
+    return p(gen(r), headers=headers, capture=capture)
 
 
 def execute_query(
@@ -315,11 +613,31 @@ def execute_query(
     fields_int: Sequence[str],
     fields_float: Sequence[str],
     transform: Callable[[Dict[str, Any], Row], Dict[str, Any]] = _identity_transform,
+    validator: Optional[ResponseValidator] = None,
+    grouped_by: Optional[str] = None,
+    cursor_fields: Optional[Sequence[str]] = None,
 ) -> Response:
     """
     execute the given query and return the response to send it
     """
-    return execute_queries([(query, params)], fields_string, fields_int, fields_float, transform)
+    return execute_queries([(query, params)], fields_string, fields_int, fields_float, transform, validator, grouped_by, cursor_fields)
+
+
+def fetch_validator(version_query: str, version_params: Dict[str, Any], *parts: Any) -> Optional[ResponseValidator]:
+    """
+    builds a validator of the data selected by the given parts (e.g., the query and its parameters).
+    the version query has to return a single row with a `version` and a `last_modified` (unix timestamp) column
+    which change whenever the underlying data changes
+    """
+    try:
+        row = db.execute(text(version_query), **version_params).first()
+    except Exception as e:
+        get_structured_logger("server_api").warning("failed to fetch data version", exception=e)
+        return None
+    if row is None or row["version"] is None:
+        return None
+    last_modified = float(row["last_modified"]) if row["last_modified"] is not None else None
+    return ResponseValidator(make_cache_key(*parts, row["version"], last_modified), last_modified)
 
 
 def _join_l(value: Union[str, List[str]]) -> str:
@@ -336,11 +654,15 @@ class QueryBuilder:
         self.alias: str = alias
         self.group_by: Union[str, List[str]] = ""
         self.order: Union[str, List[str]] = ""
+        self.sort_fields: List[str] = []
         self.fields: Union[str, List[str]] = "*"
+        self.field_names: List[str] = []
         self.conditions: List[str] = []
         self.params: Dict[str, Any] = {}
         self.subquery: str = ""
         self.index: Optional[str] = None
+        # whether rows are filtered by their issue or lag, see `apply_as_of_filter`
+        self.filters_issues: bool = False
 
     def retable(self, new_table: str):
         """
@@ -472,6 +794,7 @@ class QueryBuilder:
             self.retable(history_table)
             # history_table has full spectrum of lag values to search from whereas the latest_table does not
             self.where(lag=lag)
+            self.filters_issues = True
         return self
 
     def apply_issues_filter(self, history_table: str, issues: Optional[TimeValues]) -> "QueryBuilder":
@@ -481,22 +804,60 @@ class QueryBuilder:
             else:
                 self.retable(history_table)
                 self.where_integers("issue", issues)
+                self.filters_issues = True
         return self
 
-    def apply_as_of_filter(self, history_table: str, as_of: Optional[int]) -> "QueryBuilder":
-        if as_of is not None:
+    def apply_as_of_filter(
+        self,
+        history_table: str,
+        as_of: Optional[int],
+        dimension_fields: Sequence[str] = ("source", "signal", "geo_type", "geo_value"),
+        interval_field: Optional[str] = None,
+    ) -> "QueryBuilder":
+        """
+        selects the latest issue up to `as_of` of every key.
+        with `interval_field`, the column holding the issue that replaced a row, this is a plain range condition,
+        otherwise the history is grouped by `dimension_fields` and the time fields in a subquery.
+        the subquery picks the latest issue among the rows matching the issue and lag filters, which the interval
+        doesn't, so these are always grouped
+        """
+        if as_of is not None and interval_field and not self.filters_issues:
+            self.retable(history_table)
+            self.params["as_of"] = as_of
+            self.conditions.append(f"({self.alias}.issue <= :as_of AND :as_of < {self._fq_field(interval_field)})")
+        elif as_of is not None:
             self.retable(history_table)
             sub_condition_asof = "(issue <= :as_of)"
             self.params["as_of"] = as_of
-            sub_fields = "max(issue) max_issue, time_type, time_value, `source`, `signal`, geo_type, geo_value"
-            sub_group = "time_type, time_value, `source`, `signal`, geo_type, geo_value"
+            dimensions = ", ".join(f"`{f}`" for f in dimension_fields)
+            sub_fields = f"max(issue) max_issue, time_type, time_value, {dimensions}"
+            sub_group = f"time_type, time_value, {dimensions}"
             alias = self.alias
-            sub_condition = f"x.max_issue = {alias}.issue AND x.time_type = {alias}.time_type AND x.time_value = {alias}.time_value AND x.source = {alias}.source AND x.signal = {alias}.signal AND x.geo_type = {alias}.geo_type AND x.geo_value = {alias}.geo_value"
+            sub_condition = " AND ".join(
+                [f"x.max_issue = {alias}.issue", f"x.time_type = {alias}.time_type", f"x.time_value = {alias}.time_value"]
+                + [f"x.{f} = {alias}.{f}" for f in dimension_fields]
+            )
             self.subquery = f"JOIN (SELECT {sub_fields} FROM {self.table} WHERE {self.conditions_clause} AND {sub_condition_asof} GROUP BY {sub_group}) x ON {sub_condition}"
         return self
 
     def set_fields(self, *fields: Iterable[str]) -> "QueryBuilder":
-        self.fields = [f"{self.alias}.{field}" for field_list in fields for field in field_list]
+        self.field_names = [field for field_list in fields for field in field_list]
+        self.fields = [f"{self.alias}.{field}" for field in self.field_names]
+        return self
+
+    def project_requested_fields(self, *keep: str) -> "QueryBuilder":
+        """
+        narrows the selected fields to the ones requested by the `fields` parameter (see `execute_queries`),
+        so that the database doesn't read and send unused columns.
+        the sort fields and the given fields needed otherwise (e.g. by a transform) are always selected
+        """
+        is_requested = requested_field_filter()
+        if is_requested:
+            needed = set(self.sort_fields).union(keep)
+            names = [f for f in self.field_names if is_requested(f) or f in needed]
+            if names:
+                self.field_names = names
+                self.fields = [f"{self.alias}.{field}" for field in names]
         return self
 
     def set_sort_order(self, *args: str) -> "QueryBuilder":
@@ -505,6 +866,20 @@ class QueryBuilder:
         """
 
         self.order = [f"{self.alias}.{k} ASC" for k in args]
+        self.sort_fields = list(args)
+        return self
+
+    def apply_cursor(self, cursor: Optional[str]) -> "QueryBuilder":
+        """
+        continues after the row identified by the given continuation token (see `encode_cursor`) using a seek predicate.
+        has to be applied last, after the sort order is set, and the sort fields have to identify a row and must not be NULL
+        """
+        if cursor:
+            values = decode_cursor(cursor, self.sort_fields)
+            keys = [f"cursor_{i}" for i in range(len(values))]
+            fq_fields = ", ".join(self._fq_field(f) for f in self.sort_fields)
+            self.conditions.append(f"({fq_fields}) > ({', '.join(f':{k}' for k in keys)})")
+            self.params.update(zip(keys, values))
         return self
 
     def with_max_issue(self, *args: str) -> "QueryBuilder":
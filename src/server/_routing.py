@@ -0,0 +1,79 @@
+from math import isinf
+from typing import Optional, Sequence
+
+from delphi_utils import get_structured_logger
+from flask import g, request
+
+from ._config import HEAVY_QUERY_COST_THRESHOLD
+from ._db import engine, heavy_engine
+from ._metrics import metrics
+from ._params import GeoSet, SourceSignalSet, TimeSet
+from .utils import TimeValues
+
+# assumed number of items selected by a wildcard, for estimating the cost of a request
+_SIGNALS_PER_SOURCE = 50
+_GEO_VALUES_PER_TYPE = {
+    "county": 3300,
+    "zip": 33000,
+    "hrr": 310,
+    "msa": 400,
+    "dma": 210,
+    "state": 60,
+    "hhs": 10,
+    "nation": 1,
+}
+_GEO_VALUES_OTHER_TYPE = 1000
+_TIME_VALUES_PER_TYPE = {"day": 1500, "week": 220}
+# assumed number of issues of a single time value in the history
+_ISSUES_PER_TIME_VALUE = 10
+
+
+def _bounded(count: float, wildcard: float) -> float:
+    return wildcard if isinf(count) else count
+
+
+def estimate_cost(
+    source_signal_sets: Sequence[SourceSignalSet],
+    geo_sets: Sequence[GeoSet],
+    time_set: Optional[TimeSet],
+    history: bool = False,
+    issues: Optional[TimeValues] = None,
+) -> float:
+    """
+    estimates the number of rows a request reads: signals x geo values x time values, times the number of issues
+    per value if it reads the `history` (e.g. `as_of` or `lag`) or selects `issues`
+    """
+    signals = sum(_bounded(s.count(), _SIGNALS_PER_SOURCE) for s in source_signal_sets)
+    geos = sum(_bounded(s.count(), _GEO_VALUES_PER_TYPE.get(s.geo_type, _GEO_VALUES_OTHER_TYPE)) for s in geo_sets)
+    if time_set is None:
+        times = _TIME_VALUES_PER_TYPE["day"]
+    else:
+        times = _bounded(time_set.count(), _TIME_VALUES_PER_TYPE.get(time_set.time_type, _TIME_VALUES_PER_TYPE["day"]))
+    cost = signals * geos * times
+    if issues:
+        if all(isinstance(v, int) for v in issues):
+            # each listed issue matches at most one row per value
+            return cost * min(len(issues), _ISSUES_PER_TIME_VALUE)
+        return cost * _ISSUES_PER_TIME_VALUE
+    if history:
+        return cost * _ISSUES_PER_TIME_VALUE
+    return cost
+
+
+def route_request(cost: float) -> bool:
+    """
+    runs the queries of the current request on the heavy engine if its estimated cost reaches
+    `HEAVY_QUERY_COST_THRESHOLD`, returns whether it does
+    """
+    heavy = HEAVY_QUERY_COST_THRESHOLD > 0 and cost >= HEAVY_QUERY_COST_THRESHOLD
+    metrics.increment("routing.heavy" if heavy else "routing.default")
+    get_structured_logger("server_api").info(
+        "Routed request", endpoint=request.endpoint, estimated_cost=cost, threshold=HEAVY_QUERY_COST_THRESHOLD, heavy=heavy
+    )
+    if heavy and heavy_engine is not engine and g.get("engine") is not heavy_engine:
+        # connected lazily on the next use of `db`
+        conn = g.pop("db", None)
+        if conn is not None:
+            conn.close()
+        g.engine = heavy_engine
+    return heavy
@@ -1,19 +1,25 @@
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 from functools import wraps
-from typing import Optional, cast
+from threading import Lock
+from time import monotonic
+from typing import FrozenSet, NamedTuple, Optional, Tuple, cast
 
-import redis
 from delphi_utils import get_structured_logger
 from flask import g, request
-from werkzeug.exceptions import Unauthorized
+from werkzeug.exceptions import TooManyRequests, Unauthorized
 from werkzeug.local import LocalProxy
 
+from ._cache import LRUCache
 from ._config import (
-    REDIS_HOST,
-    REDIS_PASSWORD,
+    AUTH_CACHE_MAX_ENTRIES,
+    AUTH_CACHE_MISS_RATE,
+    AUTH_CACHE_NEGATIVE_TTL,
+    AUTH_CACHE_TTL,
     API_KEY_REGISTRATION_FORM_LINK_LOCAL,
     URL_PREFIX,
 )
+from ._last_used import last_used_writer
+from ._metrics import metrics
 from .admin.models import User
 
 
@@ -24,6 +30,7 @@ ERROR_MSG_INVALID_KEY = (
     "API key does not exist. Register a new key at {} or contact delphi-support+privacy@andrew.cmu.edu to troubleshoot".format(API_KEY_REGISTRATION_FORM_LINK_LOCAL)
 )
 ERROR_MSG_INVALID_ROLE = "Provided API key does not have access to this endpoint. Please contact delphi-support+privacy@andrew.cmu.edu."
+ERROR_MSG_KEY_LOOKUPS = "Too many requests with unknown API keys, please retry later."
 
 
 def resolve_auth_token() -> Optional[str]:
@@ -40,17 +47,105 @@ def resolve_auth_token() -> Optional[str]:
     return None
 
 
+class AuthenticatedUser(NamedTuple):
+    """
+    the user of an api key as needed to serve requests, detached from the database session it was loaded in
+    """
+
+    id: int
+    api_key: str
+    roles: FrozenSet[str]
+
+    @staticmethod
+    def of(user: Optional[User]) -> Optional["AuthenticatedUser"]:
+        if user is None:
+            return None
+        return AuthenticatedUser(user.id, user.api_key, frozenset(role.name for role in user.roles))
+
+    def has_role(self, required_role: str) -> bool:
+        return required_role in self.roles
+
+
+class AuthCache:
+    """
+    in process cache of the users of api keys, unknown keys are cached as well (for `negative_ttl` seconds).
+    looking up uncached keys is limited to `miss_rate` per second, so that guessing keys can't flood the database
+    """
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float, miss_rate: float):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.miss_rate = miss_rate
+        # the user is wrapped, as a cached unknown key is None as well
+        self._users: LRUCache[str, Tuple[Optional[AuthenticatedUser]]] = LRUCache(max_entries, ttl)
+        self._lock = Lock()
+        self._tokens = miss_rate
+        self._refilled = monotonic()
+
+    def _take_lookup(self) -> bool:
+        if self.miss_rate <= 0:
+            return True
+        with self._lock:
+            now = monotonic()
+            # allows bursts of up to a second worth of lookups
+            self._tokens = min(self.miss_rate, self._tokens + (now - self._refilled) * self.miss_rate)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _update_hit_ratio(self) -> None:
+        hits, misses = metrics.get("auth_cache.hits"), metrics.get("auth_cache.misses")
+        metrics.set("auth_cache.hit_ratio", round(hits / (hits + misses), 4))
+
+    def get(self, api_key: str) -> Optional[AuthenticatedUser]:
+        """
+        returns the user of the given api key, or None if the key is unknown
+        """
+        if self.ttl <= 0:
+            return AuthenticatedUser.of(User.find_user(api_key=api_key))
+        cached = self._users.get(api_key)
+        if cached is not None:
+            metrics.increment("auth_cache.hits")
+            self._update_hit_ratio()
+            return cached[0]
+        metrics.increment("auth_cache.misses")
+        self._update_hit_ratio()
+        if not self._take_lookup():
+            metrics.increment("auth_cache.throttled")
+            get_structured_logger("api_security").warning("throttled api key lookup", api_key=api_key)
+            raise TooManyRequests(ERROR_MSG_KEY_LOOKUPS)
+        user = AuthenticatedUser.of(User.find_user(api_key=api_key))
+        self._users.set(api_key, (user,), self.ttl if user is not None else self.negative_ttl)
+        return user
+
+    def invalidate(self, *api_keys: Optional[str]) -> None:
+        """
+        forgets the given api keys, e.g. after their users changed
+        """
+        for api_key in api_keys:
+            if api_key:
+                self._users.pop(api_key)
+
+    def clear(self) -> None:
+        self._users.clear()
+
+
+auth_cache = AuthCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL, AUTH_CACHE_NEGATIVE_TTL, AUTH_CACHE_MISS_RATE)
+
+
 def _get_current_user():
     if "user" not in g:
         api_key = resolve_auth_token()
         if api_key:
-            g.user = User.find_user(api_key=api_key)
+            g.user = auth_cache.get(api_key)
         else:
             g.user = None
     return g.user
 
 
-current_user: User = cast(User, LocalProxy(_get_current_user))
+current_user: AuthenticatedUser = cast(AuthenticatedUser, LocalProxy(_get_current_user))
 
 
 def _is_public_route() -> bool:
@@ -100,7 +195,5 @@ sources_protected_by_roles = {
 
 def update_key_last_time_used(user):
     if user:
-        # update last usage for this user's api key to "now()"
-        # TODO: consider making this call asynchronously
-        r = redis.Redis(host=REDIS_HOST, password=REDIS_PASSWORD)
-        r.set(f"LAST_USED/{user.api_key}", datetime.strftime(datetime.now(), "%Y-%m-%d"))
+        # update last usage for this user's api key to "now()", written to redis in the background
+        last_used_writer.record(user.api_key)
@@ -0,0 +1,148 @@
+from threading import Lock
+from time import monotonic, sleep
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+from redis.lock import Lock as RedisLock
+from delphi_utils import get_structured_logger
+from flask import g
+
+from ._config import REDIS_HOST, REDIS_PASSWORD, RESPONSE_CACHE_REDIS, SINGLE_FLIGHT_TIMEOUT
+from ._metrics import metrics
+
+# seconds between checks for the response of a request running in another process
+_POLL_INTERVAL = 0.05
+
+
+class Flight:
+    """
+    the execution of a request on behalf of all identical requests arriving meanwhile in other processes
+    """
+
+    def __init__(self, owner: "SingleFlight", key: str):
+        self.key = key
+        self.body: Optional[bytes] = None
+        self.done = False
+        self._owner = owner
+        self._redis_lock: Optional[RedisLock] = None
+
+    def complete(self, body: Optional[bytes]) -> None:
+        """
+        ends the flight with the response body (None if there is none to share, e.g. since it failed)
+        """
+        self._owner.complete(self, body)
+
+
+class SingleFlight:
+    """
+    coalesces identical concurrent requests of different processes, so that only one of them runs the queries and the
+    others send its response. requests are identical if they have the same key, e.g. the response cache key.
+    the leading process holds a lock in redis, the waiting processes pick up the response from the shared response cache.
+
+    a worker serves its requests as greenlets of a single thread (meinheld) and nothing here yields to the others:
+    waiting blocks the worker, just as running the queries would, but spares the database. requests never wait for a
+    flight of their own process, which would block its leader as well, they run on their own instead
+    """
+
+    def __init__(self, timeout: float, use_redis: bool = False):
+        self.timeout = timeout
+        self._use_redis = use_redis
+        self._redis: Optional[redis.Redis] = None
+        self._lock = Lock()
+        self._flights: Dict[str, Flight] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.timeout > 0 and self._use_redis
+
+    def _get_redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.Redis(host=REDIS_HOST, password=REDIS_PASSWORD)
+        return self._redis
+
+    def join(self, key: str, lookup: Callable[[], Optional[bytes]]) -> Tuple[Optional[Flight], Optional[Flight]]:
+        """
+        joins the flight of the given key: returns the completed flight of an identical request to send its body,
+        or the flight led by this request, which has to be completed with the response (see `ResponseCapture`).
+        returns (None, None) if this request runs on its own, e.g. since the identical request failed or took too long.
+        `lookup` checks the shared response cache for the response of the identical request
+        """
+        if not self.enabled:
+            return None, None
+        with self._lock:
+            flight = self._flights.get(key)
+            leading = flight is None
+            if leading:
+                flight = self._flights[key] = Flight(self, key)
+        if not leading:
+            # led by this process, possibly by a request still streaming its response in this very thread
+            metrics.increment("single_flight.concurrent")
+            return None, None
+
+        if not self._lock_redis(flight):
+            # the identical request runs in another process
+            metrics.increment("single_flight.waited")
+            body = self._wait_redis(key, lookup)
+            self.complete(flight, body)
+            if body is None:
+                metrics.increment("single_flight.fallback")
+                return None, None
+            metrics.increment("single_flight.coalesced")
+            return flight, None
+
+        metrics.increment("single_flight.led")
+        # completed at the latest when the request ends (see `release_request_flights`)
+        flights: List[Flight] = g.setdefault("flights", [])
+        flights.append(flight)
+        return None, flight
+
+    def complete(self, flight: Flight, body: Optional[bytes]) -> None:
+        with self._lock:
+            if flight.done:
+                return
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            flight.body = body
+            flight.done = True
+        if flight._redis_lock is not None:
+            try:
+                flight._redis_lock.release()
+            except redis.RedisError:
+                # expired already
+                pass
+
+    def _lock_redis(self, flight: Flight) -> bool:
+        try:
+            lock = self._get_redis().lock(f"FLIGHT/{flight.key}", timeout=self.timeout)
+            if not lock.acquire(blocking=False):
+                return False
+            flight._redis_lock = lock
+        except redis.RedisError as e:
+            get_structured_logger("single_flight").warning("failed to lock in redis", exception=e)
+        return True
+
+    def _wait_redis(self, key: str, lookup: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        r = self._get_redis()
+        deadline = monotonic() + self.timeout
+        try:
+            while monotonic() < deadline:
+                body = lookup()
+                if body is not None:
+                    return body
+                if not r.exists(f"FLIGHT/{key}"):
+                    # finished, but maybe without a response to share
+                    return lookup()
+                sleep(_POLL_INTERVAL)
+        except redis.RedisError as e:
+            get_structured_logger("single_flight").warning("failed to wait in redis", exception=e)
+        return None
+
+    def release_request_flights(self) -> None:
+        """
+        completes the flights led by the current request without a response, if it ended (or failed) before completing them
+        """
+        for flight in g.pop("flights", []):
+            flight.complete(None)
+
+
+single_flight = SingleFlight(SINGLE_FLIGHT_TIMEOUT, RESPONSE_CACHE_REDIS)
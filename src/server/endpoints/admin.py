@@ -10,7 +10,8 @@ from werkzeug.utils import redirect
 from .._common import db, log_info_with_request
 from .._config import ADMIN_PASSWORD, API_KEY_REGISTRATION_FORM_LINK, API_KEY_REMOVAL_REQUEST_LINK, REGISTER_WEBHOOK_TOKEN
 from .._db import WriteSession
-from .._security import resolve_auth_token
+from .._metrics import metrics
+from .._security import auth_cache, resolve_auth_token
 from ..admin.models import User, UserRole
 
 self_dir = Path(__file__).parent
@@ -73,6 +74,8 @@ def _index():
                     user_roles=set(request.values.getlist("roles")),
                     session=session
                 )
+                # the key may be cached as unknown
+                auth_cache.invalidate(request.values["api_key"])
                 flags["banner"] = "Successfully Added"
             else:
                 flags["banner"] = "User with such email and/or api key already exists."
@@ -89,6 +92,7 @@ def _detail(user_id: int):
             raise NotFound()
         if request.method == "DELETE" or "delete" in request.values:
             User.delete_user(user.id, session=session)
+            auth_cache.invalidate(user.api_key)
             return redirect(f"./?auth={token}")
         flags = dict()
         if request.method in ["PUT", "POST"]:
@@ -96,6 +100,7 @@ def _detail(user_id: int):
             if user_check and user_check.id != user.id:
                 flags["banner"] = "Could not update user; same api_key and/or email already exists."
             else:
+                old_api_key = user.api_key
                 user = User.update_user(
                     user=user,
                     api_key=request.values["api_key"],
@@ -103,6 +108,7 @@ def _detail(user_id: int):
                     roles=set(request.values.getlist("roles")),
                     session=session
                 )
+                auth_cache.invalidate(old_api_key, user.api_key)
                 flags["banner"] = "Successfully Saved"
         return _render("detail", token, flags, session=session, user=user.as_dict)
 
@@ -123,6 +129,7 @@ def _register():
                 409,
             )
         User.create_user(api_key=user_api_key, email=user_email, session=session)
+    auth_cache.invalidate(user_api_key)
     return make_response(f"Successfully registered API key '{user_api_key}'", 200)
 
 
@@ -151,3 +158,10 @@ def diags():
         'database_host': db_host,
     }
     return make_response(json.dumps(response_data), 200, {'content-type': 'text/plain'})
+
+
+@bp.route("/metrics", methods=["GET"])
+def _metrics():
+    # counters of this server process, e.g. of coalesced requests
+    _require_admin()
+    return make_response(json.dumps(metrics.snapshot()), 200, {"content-type": "application/json"})
@@ -3,6 +3,7 @@ from flask import Blueprint, request
 from .._params import extract_integers, extract_strings
 from .._query import execute_query, QueryBuilder
 from .._validate import require_all
+from .covid_hosp_utils import fetch_dataset_validator
 
 # first argument is the endpoint name
 bp = Blueprint("covid_hosp_facility", __name__)
@@ -141,6 +142,7 @@ def handle():
 
     # basic query info
     q.set_sort_order("collection_week", "hospital_pk", "publication_date")
+    q.project_requested_fields()
 
     # build the filter
     q.where_integers("collection_week", collection_weeks)
@@ -156,4 +158,6 @@ def handle():
         q.condition = []  # since used for join
 
     # send query
-    return execute_query(str(q), q.params, fields_string, fields_int, fields_float)
+    query = str(q)
+    validator = fetch_dataset_validator("covid_hosp_facility", query, q.params)
+    return execute_query(query, q.params, fields_string, fields_int, fields_float, validator=validator)
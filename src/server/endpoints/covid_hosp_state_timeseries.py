@@ -3,6 +3,7 @@ from flask import Blueprint, request
 from .._params import extract_integers, extract_strings, extract_date
 from .._query import execute_query, QueryBuilder
 from .._validate import require_all
+from .covid_hosp_utils import fetch_dataset_validator
 
 # first argument is the endpoint name
 bp = Blueprint("covid_hosp_state_timeseries", __name__)
@@ -147,6 +148,7 @@ def handle():
 
     q.set_fields(fields_string, fields_int, fields_float)
     q.set_sort_order("date", "state", "issue")
+    q.project_requested_fields()
 
     # build the filter
     q.where_integers("date", dates)
@@ -167,4 +169,5 @@ def handle():
         query = f"WITH c as (SELECT {q.fields_clause}, ROW_NUMBER() OVER (PARTITION BY date, state, issue ORDER BY record_type) `row` FROM {q.table} JOIN {subquery} ON {condition}) select {q.fields_clause} FROM {q.alias} WHERE `row` = 1 ORDER BY {q.order_clause}"
 
     # send query
-    return execute_query(query, q.params, fields_string, fields_int, fields_float)
+    validator = fetch_dataset_validator("covid_hosp_state_timeseries", query, q.params)
+    return execute_query(query, q.params, fields_string, fields_int, fields_float, validator=validator)
@@ -0,0 +1 @@
+from .versions import fetch_dataset_validator
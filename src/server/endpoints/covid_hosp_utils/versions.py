@@ -0,0 +1,18 @@
+from typing import Any, Dict, Optional
+
+from ..._cache import ResponseValidator
+from ..._query import fetch_validator
+
+
+def fetch_dataset_validator(dataset_name: str, query: str, params: Dict[str, Any]) -> Optional[ResponseValidator]:
+    """
+    builds a validator of the given query on a covid_hosp dataset.
+    every acquired revision of a dataset is recorded in `covid_hosp_meta`, so its latest entry identifies the data version
+    """
+    return fetch_validator(
+        "SELECT MAX(`id`) AS `version`, UNIX_TIMESTAMP(MAX(`acquisition_datetime`)) AS `last_modified` FROM `covid_hosp_meta` WHERE `dataset_name` = :dataset_name",
+        {"dataset_name": dataset_name},
+        dataset_name,
+        query,
+        params,
+    )
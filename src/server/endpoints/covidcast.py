@@ -3,12 +3,12 @@ from itertools import groupby
 from datetime import date, timedelta
 from epiweeks import Week
 from flask import Blueprint, request
-from flask.json import loads, jsonify
+from flask.json import jsonify
 from bisect import bisect_right
-from sqlalchemy import text
 from pandas import read_csv, to_datetime
 
-from .._common import is_compatibility_mode, db
+from .._common import is_compatibility_mode
+from .._config import COVIDCAST_DIMENSION_CACHE, COVIDCAST_FANOUT_MIN_QUERIES
 from .._exceptions import ValidationFailedException, DatabaseErrorException
 from .._params import (
     GeoSet,
@@ -17,6 +17,7 @@ from .._params import (
     extract_date,
     extract_dates,
     extract_integer,
+    extract_unordered,
     parse_geo_arg,
     parse_source_signal_arg,
     parse_day_or_week_arg,
@@ -28,14 +29,21 @@ from .._params import (
     parse_source_signal_sets,
     parse_time_set,
 )
-from .._query import QueryBuilder, execute_query, run_query, parse_row, filter_fields
-from .._printer import create_printer, CSVPrinter
+from .._cache import ResponseValidator, canonical_sets, canonical_time_set, make_cache_key
+from .._query import QueryBuilder, execute_queries, execute_query, run_query, decode_rows, filter_fields
+from .._parallel import is_parallel_enabled
+from .._printer import create_printer, tree_group, CSVPrinter
+from .._routing import estimate_cost, route_request
 from .._security import current_user, sources_protected_by_roles
 from .._validate import require_all
 from .._pandas import as_pandas, print_pandas
 from .covidcast_utils import compute_trend, compute_trends, compute_trend_value, CovidcastMetaEntry
 from ..utils import shift_day_value, day_to_time_value, time_value_to_iso, time_value_to_day, shift_week_value, time_value_to_week, guess_time_value_is_day, week_to_time_value, TimeValues
 from .covidcast_utils.model import TimeType, count_signal_time_types, data_sources, create_source_signal_alias_mapper
+from .covidcast_utils.dimensions import dimension_cache
+from .covidcast_utils.meta_cache import meta_cache
+from .covidcast_utils.intervals import ISSUE_INTERVAL_FIELD, has_issue_intervals
+from .covidcast_utils.versions import fetch_signal_versions
 from delphi_utils import get_structured_logger
 
 # first argument is the endpoint name
@@ -44,6 +52,9 @@ alias = None
 
 latest_table = "epimetric_latest_v"
 history_table = "epimetric_full_v"
+# the fact tables without the dimension joins, the labels are then attached from the dimension cache
+latest_keyed_table = "epimetric_latest"
+history_keyed_table = "epimetric_full"
 
 def restrict_by_roles(source_signal_sets):
     # takes a list of SourceSignalSet objects
@@ -69,6 +80,8 @@ def restrict_by_roles(source_signal_sets):
 def handle():
     source_signal_sets = parse_source_signal_sets()
     source_signal_sets = restrict_by_roles(source_signal_sets)
+    # the requested (aliased) sources label the rows, so they identify the response rather than their db sources
+    requested_source_signal_sets = source_signal_sets
     source_signal_sets, alias_mapper = create_source_signal_alias_mapper(source_signal_sets)
     time_set = parse_time_set()
     geo_sets = parse_geo_sets()
@@ -76,42 +89,179 @@ def handle():
     as_of = extract_date("as_of")
     issues = extract_dates("issues")
     lag = extract_integer("lag")
+    route_request(estimate_cost(source_signal_sets, geo_sets, time_set, history=as_of is not None or lag is not None, issues=issues))
 
     # build query
-    q = QueryBuilder(latest_table, "t")
-
     fields_string = ["geo_value", "signal"]
     fields_int = ["time_value", "direction", "issue", "lag", "missing_value", "missing_stderr", "missing_sample_size"]
     fields_float = ["value", "stderr", "sample_size"]
     is_compatibility = is_compatibility_mode()
     if is_compatibility:
-        q.set_sort_order("signal", "time_value", "geo_value", "issue")
+        sort_order = ["signal", "time_value", "geo_value", "issue"]
     else:
         # transfer also the new detail columns
         fields_string.extend(["source", "geo_type", "time_type"])
-        q.set_sort_order("source", "signal", "time_type", "time_value", "geo_type", "geo_value", "issue")
-    q.set_fields(fields_string, fields_int, fields_float)
-
-    # basic query info
-    # data type of each field
-    # build the source, signal, time, and location (type and id) filters
-
-    q.apply_source_signal_filters("source", "signal", source_signal_sets)
-    q.apply_geo_filters("geo_type", "geo_value", geo_sets)
-    q.apply_time_filter("time_type", "time_value", time_set)
-
-    q.apply_issues_filter(history_table, issues)
-    q.apply_lag_filter(history_table, lag)
-    q.apply_as_of_filter(history_table, as_of)
+        sort_order = ["source", "signal", "time_type", "time_value", "geo_type", "geo_value", "issue"]
+    # sort by the tree group first, so that the tree can be streamed group by group
+    group = tree_group(request.values.get("format"))
+    # only strings are streamed as keys of the tree, and aliased sources are relabeled after the sort
+    if group in fields_string and not (group == "source" and alias_mapper):
+        sort_order = [group] + [f for f in sort_order if f != group]
+    else:
+        group = None
+    cursor = request.values.get("cursor")
+    unordered = extract_unordered()
+    if unordered:
+        # rows are streamed as the database finds them, without waiting for a sort.
+        # a tree is then buffered completely, and there is no sort key to continue from
+        if cursor:
+            raise ValidationFailedException("cursor: not supported with order=none")
+        sort_order = []
+        group = None
+
+    interval_field = ISSUE_INTERVAL_FIELD if as_of is not None and has_issue_intervals() else None
+
+    # unordered rows don't need the labels for sorting, so they are selected by their keys from the plain fact tables
+    # and labeled from the in-memory copy of the dimension tables, which saves the joins of the views
+    dimensions = dimension_cache.get() if unordered and COVIDCAST_DIMENSION_CACHE else None
+    label_fields = ["source", "signal", "geo_type", "geo_value"]
+
+    def build_query(source_signal_sets: List[SourceSignalSet], geo_sets: List[GeoSet]) -> QueryBuilder:
+        if dimensions is not None:
+            q = QueryBuilder(latest_keyed_table, "t")
+            q.set_fields(["signal_key_id", "geo_key_id"], [f for f in fields_string if f not in label_fields], [f for f in fields_int if f != "direction"], fields_float)
+            q.project_requested_fields("signal_key_id", "geo_key_id")
+            q.where_integers("signal_key_id", dimensions.signal_keys(source_signal_sets))
+            q.where_integers("geo_key_id", dimensions.geo_keys(geo_sets))
+            q.apply_time_filter("time_type", "time_value", time_set)
+            q.apply_issues_filter(history_keyed_table, issues)
+            q.apply_lag_filter(history_keyed_table, lag)
+            q.apply_as_of_filter(history_keyed_table, as_of, ("signal_key_id", "geo_key_id"), interval_field)
+            return q
+
+        q = QueryBuilder(latest_table, "t")
+        q.set_sort_order(*sort_order)
+        q.set_fields(fields_string, fields_int, fields_float)
+        # the signal is needed to resolve the source aliases
+        q.project_requested_fields("signal")
+
+        # basic query info
+        # data type of each field
+        # build the source, signal, time, and location (type and id) filters
+
+        q.apply_source_signal_filters("source", "signal", source_signal_sets)
+        q.apply_geo_filters("geo_type", "geo_value", geo_sets)
+        q.apply_time_filter("time_type", "time_value", time_set)
+
+        q.apply_issues_filter(history_table, issues)
+        q.apply_lag_filter(history_table, lag)
+        q.apply_as_of_filter(history_table, as_of, interval_field=interval_field)
+        # continue a truncated result, has to come last to not end up in the `as_of` subquery
+        q.apply_cursor(cursor)
+        return q
+
+    q = build_query(source_signal_sets, geo_sets)
+
+    def label_row(row, proxy):
+        source, signal = dimensions.signals[proxy["signal_key_id"]]
+        geo_type, geo_value = dimensions.geos[proxy["geo_key_id"]]
+        for key, value in (("source", source), ("signal", signal), ("geo_type", geo_type), ("geo_value", geo_value)):
+            if key in row:
+                row[key] = value
+        if not is_compatibility and alias_mapper and "source" in row:
+            row["source"] = alias_mapper(source, signal)
+        return row
 
     def transform_row(row, proxy):
+        if dimensions is not None:
+            return label_row(row, proxy)
         if is_compatibility or not alias_mapper or "source" not in row:
             return row
         row["source"] = alias_mapper(row["source"], proxy["signal"])
         return row
 
+    # identify the response by the selected data and the generation counters of the selected signals
+    immutable = _is_immutable_query(as_of, issues)
+    versions = None if immutable else fetch_signal_versions(source_signal_sets)
+    validator = None
+    if immutable or versions is not None:
+        validator = ResponseValidator(
+            make_cache_key(
+                "covidcast",
+                canonical_sets(requested_source_signal_sets),
+                canonical_sets(geo_sets),
+                canonical_time_set(time_set),
+                as_of,
+                issues,
+                lag,
+                cursor,
+                unordered,
+                versions,
+            ),
+            max((v[3] for v in versions), default=None) if versions else None,
+            immutable,
+        )
+
+    # wide requests are split into one query per signal and geo type, which are run concurrently and merged
+    # (or just concatenated if unordered)
+    parts = _fan_out(source_signal_sets, geo_sets)
+    if COVIDCAST_FANOUT_MIN_QUERIES > 0 and len(parts) >= COVIDCAST_FANOUT_MIN_QUERIES and is_parallel_enabled(len(parts)):
+        queries = [(str(sub), sub.params) for sub in (build_query(*part) for part in parts)]
+        return execute_queries(
+            queries,
+            fields_string,
+            fields_int,
+            fields_float,
+            transform=transform_row,
+            validator=validator,
+            grouped_by=group,
+            cursor_fields=q.sort_fields,
+            merge_by=q.sort_fields,
+            fallback=(str(q), q.params),
+        )
+
     # send query
-    return execute_query(str(q), q.params, fields_string, fields_int, fields_float, transform=transform_row)
+    return execute_query(str(q), q.params, fields_string, fields_int, fields_float, transform=transform_row, validator=validator, grouped_by=group, cursor_fields=q.sort_fields)
+
+
+def _fan_out(source_signal_sets: List[SourceSignalSet], geo_sets: List[GeoSet]) -> List[Tuple[List[SourceSignalSet], List[GeoSet]]]:
+    """
+    splits the selection into disjoint parts of a single signal (or all signals of a source) and a single geo type
+    """
+    signals: Dict[str, Any] = {}
+    for s in source_signal_sets:
+        if isinstance(s.signal, bool):
+            if s.signal:
+                signals[s.source] = True
+        elif signals.get(s.source) is not True:
+            signals.setdefault(s.source, set()).update(s.signal)
+    signal_parts: List[List[SourceSignalSet]] = []
+    for source, sigs in signals.items():
+        if sigs is True:
+            signal_parts.append([SourceSignalSet(source, True)])
+        else:
+            signal_parts.extend([SourceSignalSet(source, [sig])] for sig in sorted(sigs))
+    geo_parts: Dict[str, List[GeoSet]] = {}
+    for g in geo_sets:
+        geo_parts.setdefault(g.geo_type, []).append(g)
+    return [(signal_part, geo_part) for signal_part in signal_parts for geo_part in geo_parts.values()]
+
+
+def _is_past_issue(issue: int) -> bool:
+    if guess_time_value_is_day(issue):
+        return issue < day_to_time_value(date.today())
+    return issue < week_to_time_value(Week.thisweek())
+
+
+def _is_immutable_query(as_of: Optional[int], issues: Optional[TimeValues]) -> bool:
+    """
+    whether the result of the query can't change anymore, since it is pinned to issues that are already published
+    """
+    if as_of is not None:
+        return _is_past_issue(as_of)
+    if not issues or "*" in issues:
+        return False
+    return all(_is_past_issue(issue[1] if isinstance(issue, tuple) else issue) for issue in issues)
 
 
 def _verify_argument_time_type_matches(is_day_argument: bool, count_daily_signal: int, count_weekly_signal: int) -> None:
@@ -160,7 +310,7 @@ def handle_trend():
     p = create_printer(request.values.get("format"))
 
     def gen(rows):
-        for key, group in groupby((parse_row(row, fields_string, fields_int, fields_float) for row in rows), lambda row: (row["geo_type"], row["geo_value"], row["source"], row["signal"])):
+        for key, group in groupby(decode_rows(rows, fields_string, fields_int, fields_float), lambda row: (row["geo_type"], row["geo_value"], row["source"], row["signal"])):
             geo_type, geo_value, source, signal = key
             if alias_mapper:
                 source = alias_mapper(source, signal)
@@ -213,7 +363,7 @@ def handle_trendseries():
         shifter = lambda x: shift_week_value(x, -basis_shift)
 
     def gen(rows):
-        for key, group in groupby((parse_row(row, fields_string, fields_int, fields_float) for row in rows), lambda row: (row["geo_type"], row["geo_value"], row["source"], row["signal"])):
+        for key, group in groupby(decode_rows(rows, fields_string, fields_int, fields_float), lambda row: (row["geo_type"], row["geo_value"], row["source"], row["signal"])):
             geo_type, geo_value, source, signal = key
             if alias_mapper:
                 source = alias_mapper(source, signal)
@@ -266,7 +416,7 @@ def handle_export():
     q.apply_time_filter("time_type", "time_value", TimeSet("day" if is_day else "week", [(start_day, end_day)]))
     q.apply_geo_filters("geo_type", "geo_value", [GeoSet(geo_type, True if geo_values == "*" else geo_values)])
 
-    q.apply_as_of_filter(history_table, as_of)
+    q.apply_as_of_filter(history_table, as_of, interval_field=ISSUE_INTERVAL_FIELD if as_of is not None and has_issue_intervals() else None)
 
     format_date = time_value_to_iso if is_day else lambda x: time_value_to_week(x).cdcformat()
     # tag as_of in filename, if it was specified
@@ -332,6 +482,7 @@ def handle_backfill():
     reference_anchor_lag = extract_integer("anchor_lag")  # in days or weeks
     if reference_anchor_lag is None:
         reference_anchor_lag = 60
+    route_request(estimate_cost(source_signal_sets, [geo_set], time_set, history=True))
 
     # build query
     q = QueryBuilder(history_table, "t")
@@ -359,7 +510,7 @@ def handle_backfill():
 
     def gen(rows):
         # stream per time_value
-        for time_value, group in groupby((parse_row(row, fields_string, fields_int, fields_float) for row in rows), lambda row: row["time_value"]):
+        for time_value, group in groupby(decode_rows(rows, fields_string, fields_int, fields_float), lambda row: row["time_value"]):
             # compute data per time value
             issues: List[Dict[str, Any]] = [r for r in group]
             shifted_time_value = shift_day_value(time_value, reference_anchor_lag) if is_day else shift_week_value(time_value, reference_anchor_lag)
@@ -423,19 +574,17 @@ def handle_meta():
     elif "week" in flags:
         filter_active = TimeType.week
 
-    row = db.execute(text("SELECT epidata FROM covidcast_meta_cache LIMIT 1")).fetchone()
-
-    data = loads(row["epidata"]) if row and row["epidata"] else []
-
-    by_signal: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
-    for row in data:
-        entry = by_signal.setdefault((row["data_source"], row["signal"]), [])
-        entry.append(row)
+    metadata, _ = meta_cache.get()
+    if metadata is None:
+        return jsonify([])
 
     user = current_user
     sources: List[Dict[str, Any]] = []
     for source in data_sources:
         src = source.db_source
+        if src not in metadata.by_source:
+            # no metadata for any of its signals
+            continue
         if src in sources_protected_by_roles:
             role = sources_protected_by_roles[src]
             if not (user and user.has_role(role)):
@@ -460,7 +609,7 @@ def handle_meta():
                 continue
             if filter_time_type is not None and signal.time_type != filter_time_type:
                 continue
-            meta_data = by_signal.get((source.db_source, signal.signal))
+            meta_data = metadata.signal_entries(source.db_source, signal.signal)
             if not meta_data:
                 continue
             row = meta_data[0]
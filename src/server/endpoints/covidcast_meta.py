@@ -1,14 +1,12 @@
 from typing import Dict, List, Optional
 
 from flask import Blueprint, request
-from flask.json import loads
-from sqlalchemy import text
 
-from .._common import db
 from .._params import extract_strings
 from .._printer import create_printer
 from .._query import filter_fields
 from .._security import current_user, sources_protected_by_roles
+from .covidcast_utils.meta_cache import meta_cache
 from delphi_utils import get_structured_logger
 
 bp = Blueprint("covidcast_meta", __name__)
@@ -39,21 +37,16 @@ def handle():
     geo_types = extract_strings("geo_types")
 
     printer = create_printer(request.values.get("format"))
+    user = current_user
 
-    metadata = db.execute(
-        text(
-            "SELECT UNIX_TIMESTAMP(NOW()) - timestamp AS age, epidata FROM covidcast_meta_cache LIMIT 1"
-        )
-    ).fetchone()
+    metadata, age = meta_cache.get()
 
-    if not metadata or "epidata" not in metadata:
+    if metadata is None:
         # the db table `covidcast_meta_cache` has no rows
         get_structured_logger('server_api').warning("no data in covidcast_meta cache")
         return printer(_nonerator())
 
-    metadata_list = loads(metadata["epidata"])
-
-    if not metadata_list:
+    if not metadata.entries:
         # the db table has a row, but there is no metadata about any signals in it
         get_structured_logger('server_api').warning("empty entry in covidcast_meta cache")
         return printer(_nonerator())
@@ -69,17 +62,10 @@ def handle():
     # if we start updating the metadata table much more frequently and having up-to-the-minute
     # metadata accuracy becomes important to users once more.
     # TODO: get the above two values ^ from config vars?
-    age = metadata["age"]
     reported_age = max(0, min(age, standard_age) - age_margin)
 
-    user = current_user
-
     def cache_entry_gen():
-        for entry in metadata_list:
-            if time_types and entry.get("time_type") not in time_types:
-                continue
-            if geo_types and entry.get("geo_type") not in geo_types:
-                continue
+        for entry in metadata.select([(s.source, s.signal) for s in signals], time_types, geo_types):
             entry_source = entry.get("data_source")
             if entry_source in sources_protected_by_roles:
                 role = sources_protected_by_roles[entry_source]
@@ -89,20 +75,11 @@ def handle():
                     # (or if we have no user)
                     # then skip this source
                     continue
-            if not signals:
-                yield entry
-            for signal in signals:
-                # match source and (signal or no signal or signal = *)
-                if entry_source == signal.source and (
-                    signal.signal == "*" or signal.signal == entry.get("signal")
-                ):
-                    yield entry
-
-    return printer(
-        filter_fields(cache_entry_gen()),
-        headers={
-            "Cache-Control": f"max-age={standard_age}, public",
-            "Age": f"{reported_age}",
-            # TODO?: "Expires": f"{}", # superseded by Cache-Control: https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Expires
-        }
-    )
+            yield entry
+
+    headers = {
+        "Cache-Control": f"max-age={standard_age}, public",
+        "Age": f"{reported_age}",
+        # TODO?: "Expires": f"{}", # superseded by Cache-Control: https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Expires
+    }
+    return printer(filter_fields(cache_entry_gen()), headers=headers)
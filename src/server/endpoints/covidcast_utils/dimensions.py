@@ -0,0 +1,112 @@
+from threading import Lock
+from time import monotonic
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from delphi_utils import get_structured_logger
+from sqlalchemy import text
+
+from ..._common import db
+from ..._config import DIMENSION_CACHE_TTL
+from ..._params import GeoSet, SourceSignalSet
+
+
+class Dimensions(NamedTuple):
+    """
+    a snapshot of the `signal_dim` and `geo_dim` tables
+    """
+
+    # signal_key_id -> (source, signal)
+    signals: Dict[int, Tuple[str, str]]
+    # geo_key_id -> (geo_type, geo_value)
+    geos: Dict[int, Tuple[str, str]]
+    # source -> signal -> signal_key_id
+    signal_ids: Dict[str, Dict[str, int]]
+    # geo_type -> geo_value -> geo_key_id
+    geo_ids: Dict[str, Dict[str, int]]
+    # the maximum keys of both tables
+    version: Tuple[int, int]
+
+    def signal_keys(self, source_signal_sets: Sequence[SourceSignalSet]) -> List[int]:
+        """
+        translates the given sets into the keys of the matching signals, unknown signals are skipped
+        """
+        keys: List[int] = []
+        for s in source_signal_sets:
+            ids = self.signal_ids.get(s.source, {})
+            if isinstance(s.signal, bool):
+                keys.extend(ids.values() if s.signal else [])
+            else:
+                keys.extend(ids[signal] for signal in s.signal if signal in ids)
+        return sorted(set(keys))
+
+    def geo_keys(self, geo_sets: Sequence[GeoSet]) -> List[int]:
+        """
+        translates the given sets into the keys of the matching locations, unknown locations are skipped
+        """
+        keys: List[int] = []
+        for g in geo_sets:
+            ids = self.geo_ids.get(g.geo_type, {})
+            if isinstance(g.geo_values, bool):
+                keys.extend(ids.values() if g.geo_values else [])
+            else:
+                keys.extend(ids[geo_value] for geo_value in g.geo_values if geo_value in ids)
+        return sorted(set(keys))
+
+
+def _index(labels: Dict[int, Tuple[str, str]]) -> Dict[str, Dict[str, int]]:
+    ids: Dict[str, Dict[str, int]] = {}
+    for key, (dimension_type, value) in labels.items():
+        ids.setdefault(dimension_type, {})[value] = key
+    return ids
+
+
+class DimensionCache:
+    """
+    process wide copy of the small dimension tables, which only ever grow during acquisition.
+    new rows are loaded once the maximum keys changed, which is checked at most every `DIMENSION_CACHE_TTL` seconds
+    """
+
+    def __init__(self, ttl: float):
+        self._ttl = ttl
+        self._lock = Lock()
+        self._dimensions: Optional[Dimensions] = None
+        self._checked = 0.0
+
+    def get(self) -> Optional[Dimensions]:
+        """
+        returns an up to date snapshot of the dimensions, or None if they are not available
+        """
+        dimensions = self._dimensions
+        if dimensions is not None and self._ttl > 0 and monotonic() - self._checked < self._ttl:
+            return dimensions
+        try:
+            with self._lock:
+                self._dimensions = self._refresh(self._dimensions)
+                self._checked = monotonic()
+                return self._dimensions
+        except Exception as e:
+            get_structured_logger("dimension_cache").warning("failed to load dimensions", exception=e)
+            return None
+
+    def _refresh(self, dimensions: Optional[Dimensions]) -> Dimensions:
+        row = db.execute(
+            text("SELECT (SELECT MAX(`signal_key_id`) FROM `signal_dim`) AS `signal_version`, (SELECT MAX(`geo_key_id`) FROM `geo_dim`) AS `geo_version`")
+        ).first()
+        version = (int(row["signal_version"] or 0), int(row["geo_version"] or 0))
+        if dimensions is not None and dimensions.version == version:
+            return dimensions
+        if dimensions is not None and (version[0] < dimensions.version[0] or version[1] < dimensions.version[1]):
+            # the tables were reset, start over
+            dimensions = None
+        signal_version, geo_version = dimensions.version if dimensions is not None else (0, 0)
+        # copy on write, so that readers of the previous snapshot are not affected
+        signals = dict(dimensions.signals) if dimensions is not None else {}
+        geos = dict(dimensions.geos) if dimensions is not None else {}
+        for r in db.execute(text("SELECT `signal_key_id`, `source`, `signal` FROM `signal_dim` WHERE `signal_key_id` > :v"), v=signal_version):
+            signals[int(r["signal_key_id"])] = (r["source"], r["signal"])
+        for r in db.execute(text("SELECT `geo_key_id`, `geo_type`, `geo_value` FROM `geo_dim` WHERE `geo_key_id` > :v"), v=geo_version):
+            geos[int(r["geo_key_id"])] = (r["geo_type"], r["geo_value"])
+        return Dimensions(signals, geos, _index(signals), _index(geos), (max(signals, default=0), max(geos, default=0)))
+
+
+dimension_cache = DimensionCache(DIMENSION_CACHE_TTL)
@@ -0,0 +1,36 @@
+from time import monotonic
+
+from delphi_utils import get_structured_logger
+from sqlalchemy import text
+
+from ..._common import db
+from ..._config import AS_OF_ISSUE_INTERVALS
+
+# the column holding the issue that replaced a row, see `epimetric_full` in "v4_schema.sql"
+ISSUE_INTERVAL_FIELD = "next_issue"
+
+# seconds until a missing column is looked up again, e.g. while the migration is still running
+_RECHECK_INTERVAL = 5 * 60
+
+_available = False
+_checked = 0.0
+
+
+def has_issue_intervals() -> bool:
+    """
+    whether `as_of` can be answered with a range on the issue intervals.
+    the history view only provides the column once the migration filled it, so its presence is checked (and memoized)
+    """
+    global _available, _checked
+    if AS_OF_ISSUE_INTERVALS != "auto":
+        return AS_OF_ISSUE_INTERVALS in ("true", "1", "yes")
+    if _available or (_checked and monotonic() - _checked < _RECHECK_INTERVAL):
+        return _available
+    try:
+        columns = db.execute(text("SELECT * FROM `epimetric_full_v` LIMIT 0")).keys()
+        _available = ISSUE_INTERVAL_FIELD in columns
+    except Exception as e:
+        get_structured_logger("issue_intervals").warning("failed to check for issue intervals", exception=e)
+        _available = False
+    _checked = monotonic()
+    return _available
@@ -0,0 +1,113 @@
+from collections import Counter
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from flask.json import loads
+from sqlalchemy import text
+
+from ..._common import db
+from ..._config import COVIDCAST_META_CACHE, META_CACHE_TTL
+
+
+class Metadata(NamedTuple):
+    """
+    the parsed content of `covidcast_meta_cache`, indexed by the positions of its entries
+    """
+
+    timestamp: int
+    entries: List[Dict[str, Any]]
+    by_source: Dict[str, List[int]]
+    by_signal: Dict[Tuple[str, str], List[int]]
+    by_time_type: Dict[str, Set[int]]
+    by_geo_type: Dict[str, Set[int]]
+
+    @staticmethod
+    def parse(timestamp: int, epidata: str) -> "Metadata":
+        entries: List[Dict[str, Any]] = loads(epidata) if epidata else []
+        by_source: Dict[str, List[int]] = {}
+        by_signal: Dict[Tuple[str, str], List[int]] = {}
+        by_time_type: Dict[str, Set[int]] = {}
+        by_geo_type: Dict[str, Set[int]] = {}
+        for i, entry in enumerate(entries):
+            by_source.setdefault(entry.get("data_source"), []).append(i)
+            by_signal.setdefault((entry.get("data_source"), entry.get("signal")), []).append(i)
+            by_time_type.setdefault(entry.get("time_type"), set()).add(i)
+            by_geo_type.setdefault(entry.get("geo_type"), set()).add(i)
+        return Metadata(timestamp, entries, by_source, by_signal, by_time_type, by_geo_type)
+
+    def signal_entries(self, source: str, signal: str) -> List[Dict[str, Any]]:
+        return [self.entries[i] for i in self.by_signal.get((source, signal), [])]
+
+    def select(
+        self,
+        signals: Sequence[Tuple[str, str]] = (),
+        time_types: Optional[Sequence[str]] = None,
+        geo_types: Optional[Sequence[str]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        yields the entries matching the filters in their cached order, an entry matching several of the given
+        (source, signal or "*") pairs is yielded once for each of them
+        """
+        if signals:
+            matches: Counter = Counter()
+            for source, signal in signals:
+                matches.update(self.by_source.get(source, []) if signal == "*" else self.by_signal.get((source, signal), []))
+        else:
+            matches = Counter(range(len(self.entries)))
+        allowed: Optional[Set[int]] = None
+        for index, values in ((self.by_time_type, time_types), (self.by_geo_type, geo_types)):
+            if values:
+                selected = set().union(*(index.get(v, set()) for v in values))
+                allowed = selected if allowed is None else allowed & selected
+        for i in sorted(matches):
+            if allowed is None or i in allowed:
+                entry = self.entries[i]
+                for _ in range(matches[i]):
+                    yield entry
+
+
+class MetadataCache:
+    """
+    process wide copy of the parsed `covidcast_meta_cache`, which is only parsed again once its timestamp changed.
+    the timestamp is probed at most every `META_CACHE_TTL` seconds
+    """
+
+    def __init__(self, ttl: float, enabled: bool = True):
+        self._ttl = ttl
+        self._enabled = enabled
+        self._lock = Lock()
+        self._metadata: Optional[Metadata] = None
+        # age of the metadata in seconds according to the database at the last probe
+        self._age = 0
+        self._checked = 0.0
+
+    def get(self) -> Tuple[Optional[Metadata], int]:
+        """
+        returns the current metadata (None if the table has no rows) and its age in seconds
+        """
+        if not self._enabled:
+            row = db.execute(text("SELECT UNIX_TIMESTAMP(NOW()) - `timestamp` AS `age`, `timestamp`, `epidata` FROM `covidcast_meta_cache` LIMIT 1")).fetchone()
+            if not row:
+                return None, 0
+            return Metadata.parse(row["timestamp"], row["epidata"]), row["age"]
+
+        metadata = self._metadata
+        if metadata is not None and self._ttl > 0 and monotonic() - self._checked < self._ttl:
+            return metadata, self._age + int(monotonic() - self._checked)
+        row = db.execute(text("SELECT UNIX_TIMESTAMP(NOW()) - `timestamp` AS `age`, `timestamp` FROM `covidcast_meta_cache` LIMIT 1")).fetchone()
+        if not row:
+            return None, 0
+        with self._lock:
+            metadata = self._metadata
+            if metadata is None or metadata.timestamp != row["timestamp"]:
+                loaded = db.execute(text("SELECT `timestamp`, `epidata` FROM `covidcast_meta_cache` LIMIT 1")).fetchone()
+                if not loaded:
+                    return None, 0
+                metadata = self._metadata = Metadata.parse(loaded["timestamp"], loaded["epidata"])
+            self._age = row["age"]
+            self._checked = monotonic()
+            return metadata, self._age
+
+
+meta_cache = MetadataCache(META_CACHE_TTL, COVIDCAST_META_CACHE)
@@ -0,0 +1,40 @@
+from typing import List, Optional, Sequence, Tuple
+
+from delphi_utils import get_structured_logger
+from sqlalchemy import text
+
+from ..._cache import LRUCache, canonical_sets, make_cache_key
+from ..._common import db
+from ..._config import SIGNAL_VERSION_TTL
+from ..._params import SourceSignalSet
+from ..._query import filter_source_signal_sets
+
+# (source, signal, version, last modified as unix timestamp)
+SignalVersion = Tuple[str, str, int, float]
+
+_signal_versions: LRUCache[str, List[SignalVersion]] = LRUCache(1024, SIGNAL_VERSION_TTL)
+
+
+def fetch_signal_versions(source_signal_sets: Sequence[SourceSignalSet]) -> Optional[List[SignalVersion]]:
+    """
+    looks up the generation counters of the given signals, as maintained by the acquisition in `signal_version`.
+    returns None if the versions are not available, in which case nothing should be cached
+    """
+    key = make_cache_key(canonical_sets(source_signal_sets))
+    if SIGNAL_VERSION_TTL > 0:
+        cached = _signal_versions.get(key)
+        if cached is not None:
+            return cached
+
+    params = {}
+    condition = filter_source_signal_sets("`source`", "`signal`", source_signal_sets, "sv", params)
+    query = f"SELECT `source`, `signal`, `version`, UNIX_TIMESTAMP(`last_modified`) AS `last_modified` FROM `signal_version` WHERE {condition} ORDER BY `source`, `signal`"
+    try:
+        versions = [(r["source"], r["signal"], int(r["version"]), float(r["last_modified"])) for r in db.execute(text(query), **params)]
+    except Exception as e:
+        get_structured_logger("signal_versions").warning("failed to fetch signal versions", exception=e)
+        return None
+
+    if SIGNAL_VERSION_TTL > 0:
+        _signal_versions.set(key, versions)
+    return versions
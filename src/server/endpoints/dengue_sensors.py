@@ -28,6 +28,7 @@ def handle():
     q.set_fields(fields_string, fields_int, fields_float)
     
     q.set_sort_order('epiweek', 'name', 'location')
+    q.project_requested_fields()
     
     q.where_strings('name', names)
     q.where_strings('location', locations)
@@ -56,6 +56,7 @@ def handle():
     ]
     q.set_fields(fields_string, fields_int, fields_float)
     q.set_sort_order("epiweek", "location", "issue")
+    q.project_requested_fields()
 
     q.where_integers("epiweek", epiweeks)
     q.where_strings("location", locations)
@@ -24,6 +24,7 @@ def handle():
     fields_float = ["percent_positive", "percent_a", "percent_b"]
     q.set_fields(fields_string, fields_int, fields_float)
     q.set_sort_order("epiweek", "region", "issue")
+    q.project_requested_fields()
 
     q.where_integers("epiweek", epiweeks)
     q.where_strings("region", regions)
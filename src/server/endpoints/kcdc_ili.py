@@ -26,6 +26,7 @@ def handle():
     q.set_fields(fields_string, fields_int, fields_float)
 
     q.set_sort_order("epiweek", "region", "issue")
+    q.project_requested_fields()
     # build the filter
     q.where_integers("epiweek", epiweeks)
     q.where_strings("region", regions)
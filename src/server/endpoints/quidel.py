@@ -27,6 +27,7 @@ def handle():
     q.set_fields(fields_string, fields_int, fields_float)
 
     q.set_sort_order("epiweek", "location")
+    q.project_requested_fields()
 
     # build the filter
     q.where_strings("location", locations)
@@ -14,6 +14,8 @@ from ._exceptions import MissingOrWrongSourceException
 from .endpoints import endpoints
 from .endpoints.admin import bp as admin_bp, enable_admin
 from ._limiter import limiter, apply_limit
+from ._admission import admit, apply_admission
+from ._geo_values import valid_geo_values
 
 SENTRY_DSN = os.environ.get('SENTRY_DSN')
 if SENTRY_DSN:
@@ -32,17 +34,25 @@ __all__ = ["app"]
 logger = get_structured_logger("webapp_main")
 
 endpoint_map: Dict[str, Callable[[], Response]] = {}
+# blueprint name of the endpoints and their aliases
+endpoint_names: Dict[str, str] = {}
 
 for endpoint in endpoints:
     logger.info("registering endpoint", bp_name=endpoint.bp.name)
     apply_limit(endpoint.bp)
+    apply_admission(endpoint.bp)
     app.register_blueprint(endpoint.bp, url_prefix=f"{URL_PREFIX}/{endpoint.bp.name}")
 
     endpoint_map[endpoint.bp.name] = endpoint.handle
+    endpoint_names[endpoint.bp.name] = endpoint.bp.name
     alias = getattr(endpoint, "alias", None)
     if alias:
         logger.info("endpoint has alias", bp_name=endpoint.bp.name, alias=alias)
         endpoint_map[alias] = endpoint.handle
+        endpoint_names[alias] = endpoint.bp.name
+
+# load the valid geo values when the worker starts instead of with its first request
+valid_geo_values.load()
 
 if enable_admin():
     logger.info("admin endpoint enabled")
@@ -58,6 +68,7 @@ def handle_generic():
     endpoint = request.values.get("endpoint", request.values.get("source"))
     if not endpoint or endpoint not in endpoint_map:
         raise MissingOrWrongSourceException(endpoint_map.keys())
+    admit(endpoint_names[endpoint])
     return endpoint_map[endpoint]()
 
 
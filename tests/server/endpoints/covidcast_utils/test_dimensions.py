@@ -0,0 +1,62 @@
+import unittest
+
+from sqlalchemy import text
+
+from delphi.epidata.server._common import app, db
+from delphi.epidata.server._params import GeoSet, SourceSignalSet
+from delphi.epidata.server.endpoints.covidcast_utils.dimensions import DimensionCache, Dimensions
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server.endpoints.covidcast_utils.dimensions"
+
+
+def _dimensions() -> Dimensions:
+    signals = {1: ("src", "a"), 2: ("src", "b"), 3: ("other", "a")}
+    geos = {1: ("state", "pa"), 2: ("state", "ny"), 3: ("county", "42003")}
+    return Dimensions(signals, geos, {"src": {"a": 1, "b": 2}, "other": {"a": 3}}, {"state": {"pa": 1, "ny": 2}, "county": {"42003": 3}}, (3, 3))
+
+
+class UnitTests(unittest.TestCase):
+    def test_signal_keys(self):
+        d = _dimensions()
+        self.assertEqual(d.signal_keys([SourceSignalSet("src", ["b", "a"])]), [1, 2])
+        self.assertEqual(d.signal_keys([SourceSignalSet("src", True), SourceSignalSet("other", ["a"])]), [1, 2, 3])
+        self.assertEqual(d.signal_keys([SourceSignalSet("src", ["unknown"]), SourceSignalSet("unknown", True)]), [])
+        self.assertEqual(d.signal_keys([SourceSignalSet("src", False)]), [])
+
+    def test_geo_keys(self):
+        d = _dimensions()
+        self.assertEqual(d.geo_keys([GeoSet("state", ["ny"]), GeoSet("county", True)]), [2, 3])
+        self.assertEqual(d.geo_keys([GeoSet("state", True), GeoSet("state", ["pa"])]), [1, 2])
+        self.assertEqual(d.geo_keys([GeoSet("hrr", True), GeoSet("state", ["ca"])]), [])
+
+    def test_cache(self):
+        with app.app_context():
+            # temporary tables are only visible to the connection of this context
+            db.execute(text("CREATE TEMPORARY TABLE signal_dim (signal_key_id INTEGER PRIMARY KEY, source TEXT, signal TEXT)"))
+            db.execute(text("CREATE TEMPORARY TABLE geo_dim (geo_key_id INTEGER PRIMARY KEY, geo_type TEXT, geo_value TEXT)"))
+            db.execute(text("INSERT INTO signal_dim VALUES (1, 'src', 'a')"))
+            db.execute(text("INSERT INTO geo_dim VALUES (1, 'state', 'pa')"))
+            cache = DimensionCache(0)
+
+            first = cache.get()
+            self.assertEqual(first.signals, {1: ("src", "a")})
+            self.assertEqual(first.geo_ids, {"state": {"pa": 1}})
+            self.assertIs(cache.get(), first)
+
+            with self.subTest("new rows"):
+                db.execute(text("INSERT INTO signal_dim VALUES (2, 'src', 'b')"))
+                second = cache.get()
+                self.assertEqual(second.signal_ids, {"src": {"a": 1, "b": 2}})
+                self.assertEqual(second.version, (2, 1))
+                # the previous snapshot is unchanged
+                self.assertEqual(first.signals, {1: ("src", "a")})
+
+            with self.subTest("reset"):
+                db.execute(text("DELETE FROM signal_dim"))
+                db.execute(text("INSERT INTO signal_dim VALUES (1, 'new', 'c')"))
+                self.assertEqual(cache.get().signals, {1: ("new", "c")})
+
+            with self.subTest("error"):
+                db.execute(text("DROP TABLE geo_dim"))
+                self.assertIsNone(cache.get())
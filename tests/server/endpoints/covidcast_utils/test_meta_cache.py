@@ -0,0 +1,75 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+from delphi.epidata.server.endpoints.covidcast_utils.meta_cache import Metadata, MetadataCache
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server.endpoints.covidcast_utils.meta_cache"
+
+
+def _entry(source: str, signal: str, time_type: str, geo_type: str):
+    return {"data_source": source, "signal": signal, "time_type": time_type, "geo_type": geo_type}
+
+
+ENTRIES = [
+    _entry("src", "a", "day", "county"),
+    _entry("src", "a", "day", "state"),
+    _entry("src", "b", "week", "state"),
+    _entry("other", "a", "day", "state"),
+]
+
+
+class UnitTests(unittest.TestCase):
+    def test_select(self):
+        metadata = Metadata.parse(1, json.dumps(ENTRIES))
+        self.assertEqual(list(metadata.select()), ENTRIES)
+        self.assertEqual(list(metadata.select([("src", "*")])), ENTRIES[:3])
+        self.assertEqual(list(metadata.select([("other", "a"), ("src", "b")])), [ENTRIES[2], ENTRIES[3]])
+        self.assertEqual(list(metadata.select([("src", "*")], ["day"], ["state"])), [ENTRIES[1]])
+        self.assertEqual(list(metadata.select(geo_types=["state", "hrr"])), ENTRIES[1:])
+        self.assertEqual(list(metadata.select([("unknown", "*")])), [])
+        with self.subTest("overlapping signals"):
+            self.assertEqual(list(metadata.select([("src", "b"), ("src", "*")], ["week"])), [ENTRIES[2], ENTRIES[2]])
+        with self.subTest("signal entries"):
+            self.assertEqual(metadata.signal_entries("src", "a"), ENTRIES[:2])
+            self.assertEqual(metadata.signal_entries("src", "c"), [])
+
+    def test_cache(self):
+        rows = {"timestamp": 1, "epidata": json.dumps(ENTRIES[:1])}
+
+        def execute(query, **kwargs):
+            result = MagicMock()
+            result.fetchone.return_value = dict(rows, age=5)
+            return result
+
+        db = MagicMock()
+        db.execute.side_effect = execute
+        with patch("delphi.epidata.server.endpoints.covidcast_utils.meta_cache.db", db):
+            cache = MetadataCache(0)
+            first, age = cache.get()
+            self.assertEqual(first.entries, ENTRIES[:1])
+            self.assertEqual(age, 5)
+            # probed, but not parsed again
+            self.assertIs(cache.get()[0], first)
+            self.assertEqual(db.execute.call_count, 3)
+
+            with self.subTest("new timestamp"):
+                rows.update(timestamp=2, epidata=json.dumps(ENTRIES))
+                self.assertEqual(cache.get()[0].entries, ENTRIES)
+
+            with self.subTest("ttl"):
+                cache = MetadataCache(60)
+                cached = cache.get()[0]
+                db.execute.reset_mock()
+                self.assertIs(cache.get()[0], cached)
+                db.execute.assert_not_called()
+
+            with self.subTest("disabled"):
+                cache = MetadataCache(0, enabled=False)
+                self.assertIsNot(cache.get()[0], cache.get()[0])
+
+            with self.subTest("no rows"):
+                db.execute.side_effect = None
+                db.execute.return_value.fetchone.return_value = None
+                self.assertEqual(MetadataCache(0).get(), (None, 0))
@@ -1,9 +1,12 @@
 # standard library
 import unittest
+from unittest.mock import patch
 
 from flask.testing import FlaskClient
 from flask import Response
 from delphi.epidata.server.main import app
+from delphi.epidata.server._params import GeoSet, SourceSignalSet
+from delphi.epidata.server.endpoints.covidcast import _fan_out, handle
 
 # py3tester coverage target
 __test_target__ = "delphi.epidata.server.endpoints.covidcast"
@@ -33,3 +36,38 @@ class UnitTests(unittest.TestCase):
         self.assertEqual(rv.status_code, 200)
         self.assertEqual(msg["result"], -2)  # no result
         self.assertEqual(msg["message"], "no results")
+
+    def test_fan_out(self):
+        nation, states, states2 = GeoSet("nation", True), GeoSet("state", True), GeoSet("state", False)
+        parts = _fan_out(
+            [SourceSignalSet("src1", ["b", "a"]), SourceSignalSet("src1", ["a"]), SourceSignalSet("src2", True), SourceSignalSet("src2", ["c"])],
+            [nation, states, states2],
+        )
+        self.assertEqual(
+            parts,
+            [
+                ([SourceSignalSet("src1", ["a"])], [nation]),
+                ([SourceSignalSet("src1", ["a"])], [states, states2]),
+                ([SourceSignalSet("src1", ["b"])], [nation]),
+                ([SourceSignalSet("src1", ["b"])], [states, states2]),
+                ([SourceSignalSet("src2", True)], [nation]),
+                ([SourceSignalSet("src2", True)], [states, states2]),
+            ],
+        )
+        self.assertEqual(_fan_out([SourceSignalSet("src1", ["a"])], [states]), [([SourceSignalSet("src1", ["a"])], [states])])
+        self.assertEqual(_fan_out([], [states]), [])
+
+    def test_cache_key_of_aliases(self):
+        def validator_of(signal: str):
+            with app.app_context(), app.test_request_context("/covidcast/", query_string=dict(signal=signal, time="day:20200101", geo="state:pa")):
+                with patch("delphi.epidata.server.endpoints.covidcast.fetch_signal_versions", return_value=[("safegraph", "bars_visit_num", 1, 0.0)]), patch(
+                    "delphi.epidata.server.endpoints.covidcast.execute_query"
+                ) as execute_query:
+                    handle()
+            return execute_query.call_args.kwargs["validator"]
+
+        # the same rows, labeled with different sources
+        aliased = validator_of("safegraph-weekly:bars_visit_num")
+        direct = validator_of("safegraph:bars_visit_num")
+        self.assertNotEqual(aliased.tag, direct.tag)
+        self.assertEqual(aliased.tag, validator_of("safegraph-weekly:bars_visit_num").tag)
@@ -0,0 +1,100 @@
+"""Unit tests for the admission control."""
+
+# standard library
+import unittest
+from unittest.mock import MagicMock, patch
+
+# from flask.testing import FlaskClient
+from delphi.epidata.server._common import app
+from delphi.epidata.server._admission import AdmissionGate, RedisAdmissionGate, _gates, admit, query_class
+from delphi.epidata.server._exceptions import ServiceUnavailableException
+from delphi.epidata.server._metrics import metrics
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._admission"
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    # app: FlaskClient
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        app.config["DEBUG"] = False
+        metrics.clear()
+        _gates.clear()
+
+    def test_gate(self):
+        gate = AdmissionGate("test", 1)
+        token = gate.enter()
+        self.assertIsNotNone(token)
+        self.assertEqual(metrics.get("admission.test.in_flight"), 1)
+
+        with self.subTest("full"):
+            # rejected right away instead of waiting for the slot
+            self.assertIsNone(gate.enter())
+
+        with self.subTest("released"):
+            gate.leave(token)
+            other = gate.enter()
+            self.assertIsNotNone(other)
+            # leaving twice doesn't free the slot of another request
+            gate.leave(token)
+            self.assertIsNone(gate.enter())
+            gate.leave(other)
+            self.assertEqual(metrics.get("admission.test.in_flight"), 0)
+
+    def test_redis_gate(self):
+        r = MagicMock()
+        gate = RedisAdmissionGate("test", 1, r)
+        # the results of the pipeline: removed expired slots, added, expiry set, rank, slots taken
+        r.pipeline.return_value.execute.return_value = [0, 1, True, 0, 1]
+        token = gate.enter()
+        self.assertIsNotNone(token)
+        self.assertEqual(metrics.get("admission.test.in_flight"), 1)
+
+        with self.subTest("full"):
+            r.pipeline.return_value.execute.side_effect = [[0, 1, True, 1, 2], [1, 1]]
+            self.assertIsNone(gate.enter())
+            self.assertEqual(metrics.get("admission.test.in_flight"), 1)
+
+        with self.subTest("released"):
+            r.pipeline.return_value.execute.side_effect = [[1, 0]]
+            gate.leave(token)
+            self.assertEqual(metrics.get("admission.test.in_flight"), 0)
+
+    def test_query_class(self):
+        with app.test_request_context("/covidcast/?signal=src:sig"):
+            self.assertEqual(query_class("covidcast"), "covidcast")
+        with app.test_request_context("/covidcast/?signal=src:sig&as_of=20200101"):
+            self.assertEqual(query_class("covidcast"), "history")
+        with app.test_request_context("/covidcast/backfill"):
+            self.assertEqual(query_class("covidcast"), "history")
+        with app.test_request_context("/fluview/?issues=202001"):
+            self.assertEqual(query_class("fluview"), "fluview")
+
+    def test_admit(self):
+        limits = {"history": 1, "covidcast_meta": 1}
+        with patch("delphi.epidata.server._admission.ADMISSION_LIMITS", limits):
+            with app.test_request_context("/covidcast/?as_of=20200101"):
+                admit("covidcast")
+                # concurrent requests have their own app context
+                with self.subTest("shed"):
+                    with app.app_context(), app.test_request_context("/covidcast/?issues=20200101"):
+                        with self.assertRaises(ServiceUnavailableException) as ctx:
+                            admit("covidcast")
+                    self.assertEqual(ctx.exception.response.status_code, 503)
+                    self.assertEqual(ctx.exception.response.headers["Retry-After"], "5")
+                with self.subTest("other class"):
+                    with app.app_context(), app.test_request_context("/covidcast/"):
+                        admit("covidcast")
+                    with app.app_context(), app.test_request_context("/covidcast_meta/"):
+                        admit("covidcast_meta")
+            with self.subTest("released with the request"):
+                with app.test_request_context("/covidcast/?as_of=20200101"):
+                    admit("covidcast")
+        self.assertEqual(metrics.get("admission.history.admitted"), 2)
+        self.assertEqual(metrics.get("admission.history.rejected"), 1)
+        self.assertEqual(metrics.get("admission.history.in_flight"), 0)
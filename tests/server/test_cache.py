@@ -0,0 +1,123 @@
+"""Unit tests for the response cache."""
+
+# standard library
+import unittest
+from unittest.mock import patch
+
+# from flask.testing import FlaskClient
+from delphi.epidata.server._common import app
+from delphi.epidata.server._cache import (
+    LRUCache,
+    ResponseCache,
+    ResponseValidator,
+    canonical_sets,
+    canonical_time_set,
+    make_cache_key,
+)
+from delphi.epidata.server._params import GeoSet, SourceSignalSet, TimeSet
+from delphi.epidata.server._printer import JSONPrinter
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._cache"
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    # app: FlaskClient
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        app.config["DEBUG"] = False
+
+    def test_lru_cache(self):
+        with self.subTest("eviction"):
+            c = LRUCache(2)
+            c.set("a", 1)
+            c.set("b", 2)
+            self.assertEqual(c.get("a"), 1)
+            c.set("c", 3)
+            self.assertIsNone(c.get("b"))
+            self.assertEqual(c.get("a"), 1)
+            self.assertEqual(c.get("c"), 3)
+            self.assertEqual(len(c), 2)
+        with self.subTest("weight"):
+            c = LRUCache(10, max_weight=5, weigher=len)
+            c.set("a", b"abc")
+            c.set("b", b"de")
+            c.set("c", b"f")
+            self.assertIsNone(c.get("a"))
+            self.assertEqual(c.get("b"), b"de")
+            c.set("d", b"too large")
+            self.assertIsNone(c.get("d"))
+            self.assertEqual(c.pop("b"), b"de")
+            self.assertIsNone(c.get("b"))
+        with self.subTest("ttl"):
+            with patch("delphi.epidata.server._cache.monotonic", side_effect=[0, 5, 20]):
+                c = LRUCache(2, ttl=10)
+                c.set("a", 1)
+                self.assertEqual(c.get("a"), 1)
+                self.assertIsNone(c.get("a"))
+        with self.subTest("disabled"):
+            c = LRUCache(0)
+            c.set("a", 1)
+            self.assertIsNone(c.get("a"))
+
+    def test_canonical_sets(self):
+        self.assertEqual(
+            canonical_sets([GeoSet("state", ["pa", "ca"]), GeoSet("nation", True), GeoSet("state", ["ca", "ak"])]),
+            [("nation", True), ("state", ["ak", "ca", "pa"])],
+        )
+        self.assertEqual(
+            canonical_sets([SourceSignalSet("src", ["sig"]), SourceSignalSet("src", True)]),
+            [("src", True)],
+        )
+        self.assertEqual(canonical_sets(None), [])
+        self.assertEqual(canonical_time_set(TimeSet("day", [20200103, 20200101, 20200102])), ("day", [(20200101, 20200103)]))
+        self.assertEqual(canonical_time_set(TimeSet("day", True)), ("day", True))
+
+    def test_make_cache_key(self):
+        a = make_cache_key("covidcast", canonical_sets([GeoSet("state", ["pa", "ca"])]), [("src", "sig", 1, 0.0)])
+        b = make_cache_key("covidcast", canonical_sets([GeoSet("state", ["ca", "pa"])]), [("src", "sig", 1, 0.0)])
+        c = make_cache_key("covidcast", canonical_sets([GeoSet("state", ["ca", "pa"])]), [("src", "sig", 2, 0.0)])
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_capture(self):
+        cache = ResponseCache(LRUCache(10))
+        with self.subTest("complete response"):
+            with app.test_request_context("/"):
+                r = JSONPrinter()(iter([{"a": 1}, {"a": 2}]), capture=cache.capture("k"))
+                body = r.get_data()
+            self.assertEqual(body, b'[{"a":1},{"a":2}]')
+            self.assertEqual(cache.get("k"), body)
+
+        with self.subTest("failed response"):
+
+            def failing():
+                yield {"a": 1}
+                raise Exception("broken")
+
+            with app.test_request_context("/"):
+                JSONPrinter()(failing(), capture=cache.capture("failed")).get_data()
+            self.assertIsNone(cache.get("failed"))
+
+        with self.subTest("too large"):
+            with patch("delphi.epidata.server._cache.RESPONSE_CACHE_MAX_ENTRY_BYTES", 5):
+                with app.test_request_context("/"):
+                    JSONPrinter()(iter([{"a": 1}]), capture=cache.capture("large")).get_data()
+            self.assertIsNone(cache.get("large"))
+
+        with self.subTest("replay"):
+            with app.test_request_context("/"):
+                r = JSONPrinter().replay(cache.get("k"))
+                self.assertEqual(r.get_data(), b'[{"a":1},{"a":2}]')
+                self.assertEqual(r.mimetype, "application/json")
+
+    def test_validator_headers(self):
+        self.assertEqual(ResponseValidator("abc").headers("abc"), {"ETag": 'W/"abc"'})
+        self.assertEqual(
+            ResponseValidator("abc", 1600000000.5).headers("abc"),
+            {"ETag": 'W/"abc"', "Last-Modified": "Sun, 13 Sep 2020 12:26:40 GMT"},
+        )
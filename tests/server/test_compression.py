@@ -0,0 +1,130 @@
+"""Unit tests for the on the fly response compression."""
+
+# standard library
+import gzip
+import unittest
+from unittest.mock import patch
+
+# third party
+import zstandard
+
+# from flask.testing import FlaskClient
+from delphi.epidata.server._common import app
+from delphi.epidata.server._compression import compress_body, compress_stream, negotiate_encoding
+from delphi.epidata.server._printer import CSVPrinter, ParquetPrinter
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._compression"
+
+
+def _rows(n):
+    return [dict(geo_value="pa", time_value=20200101 + i, value=float(i)) for i in range(n)]
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    # app: FlaskClient
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        app.config["DEBUG"] = False
+
+    def test_negotiate_encoding(self):
+        cases = [
+            (None, None),
+            ("identity", None),
+            ("gzip, deflate", "gzip"),
+            ("gzip, zstd", "zstd"),
+            ("gzip;q=1.0, zstd;q=0.5", "gzip"),
+            ("zstd;q=0, gzip", "gzip"),
+            ("*", None),
+        ]
+        for accept, expected in cases:
+            with self.subTest(accept=accept):
+                headers = {"Accept-Encoding": accept} if accept else {}
+                with app.test_request_context("/", headers=headers):
+                    self.assertEqual(negotiate_encoding(), expected)
+
+    def test_compress_stream(self):
+        chunks = [b"a" * 600, b"b" * 600, b"c" * 600]
+        with self.subTest("gzip"):
+            with app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+                headers, out = compress_stream(iter(chunks), {"ETag": "x"})
+                self.assertEqual(headers, {"ETag": "x", "Vary": "Accept-Encoding", "Content-Encoding": "gzip"})
+                self.assertEqual(gzip.decompress(b"".join(out)), b"".join(chunks))
+        with self.subTest("zstd"):
+            with app.test_request_context("/", headers={"Accept-Encoding": "zstd"}):
+                headers, out = compress_stream(iter(chunks))
+                self.assertEqual(headers["Content-Encoding"], "zstd")
+                body = zstandard.ZstdDecompressor().decompressobj().decompress(b"".join(out))
+                self.assertEqual(body, b"".join(chunks))
+        with self.subTest("small"):
+            # the size of a stream is unknown when the headers are sent
+            with app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+                headers, out = compress_stream(iter([b"abc"]))
+                self.assertEqual(headers["Content-Encoding"], "gzip")
+                self.assertEqual(gzip.decompress(b"".join(out)), b"abc")
+        with self.subTest("not accepted"):
+            with app.test_request_context("/"):
+                headers, out = compress_stream(iter(chunks))
+                self.assertNotIn("Content-Encoding", headers)
+                self.assertEqual(b"".join(out), b"".join(chunks))
+        with self.subTest("disabled"):
+            with patch("delphi.epidata.server._compression.COMPRESSION_ENCODINGS", []):
+                with app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+                    headers, out = compress_stream(iter(chunks))
+                    self.assertEqual(headers, {})
+                    self.assertEqual(b"".join(out), b"".join(chunks))
+
+    def test_incremental(self):
+        # every compressed chunk is decodable on its own, without waiting for the end of the stream
+        pulled = []
+
+        def chunks():
+            for chunk in [b"a" * 2000, b"b" * 2000]:
+                pulled.append(chunk)
+                yield chunk
+            raise AssertionError("should not be consumed")
+
+        with app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+            headers, out = compress_stream(chunks())
+            # the headers are decided without pulling from the stream
+            self.assertEqual(headers["Content-Encoding"], "gzip")
+            self.assertEqual(pulled, [])
+            decompressor = gzip.zlib.decompressobj(31)
+            self.assertEqual(decompressor.decompress(next(out)), b"a" * 2000)
+            self.assertEqual(decompressor.decompress(next(out)), b"b" * 2000)
+
+    def test_printer(self):
+        with self.subTest("csv"):
+            with app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+                r = CSVPrinter()(iter(_rows(200)))
+                self.assertEqual(r.headers["Content-Encoding"], "gzip")
+                body = gzip.decompress(r.get_data()).decode("utf-8")
+            self.assertTrue(body.startswith("geo_value,time_value,value\npa,20200101,0.0\n"))
+            self.assertEqual(len(body.splitlines()), 201)
+        with self.subTest("parquet"):
+            with app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+                r = ParquetPrinter()(iter(_rows(200)))
+                r.get_data()
+                self.assertNotIn("Content-Encoding", r.headers)
+        with self.subTest("replay"):
+            with app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+                r = CSVPrinter().replay(b"x" * 2000, {"ETag": "y"})
+                self.assertEqual(r.headers["Content-Encoding"], "gzip")
+                self.assertEqual(r.headers["ETag"], "y")
+                self.assertEqual(gzip.decompress(r.get_data()), b"x" * 2000)
+
+    def test_compress_body(self):
+        with app.test_request_context("/", headers={"Accept-Encoding": "zstd"}):
+            headers, body = compress_body(b"x" * 2000)
+        self.assertEqual(headers["Content-Encoding"], "zstd")
+        self.assertEqual(zstandard.ZstdDecompressor().decompressobj().decompress(body), b"x" * 2000)
+
+        with self.subTest("too small"):
+            with app.test_request_context("/", headers={"Accept-Encoding": "gzip"}):
+                headers, body = compress_body(b"abc", {"ETag": "x"})
+            self.assertEqual(headers, {"ETag": "x", "Vary": "Accept-Encoding"})
+            self.assertEqual(body, b"abc")
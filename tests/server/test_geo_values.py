@@ -0,0 +1,32 @@
+"""Unit tests for the valid geo values."""
+
+# standard library
+import os
+from tempfile import TemporaryDirectory
+import unittest
+
+from delphi.epidata.server._geo_values import GeoValues, read_geo_values, write_geo_values
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._geo_values"
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    def test_allowed(self):
+        values = GeoValues()
+        self.assertIsNone(values.allowed("unknown"))
+        self.assertIn("pa", values.allowed("state"))
+        self.assertIn("us", values.allowed("nation"))
+        self.assertNotIn("xx", values.allowed("state"))
+        self.assertIsInstance(values.allowed("county"), frozenset)
+        # loaded once
+        self.assertIs(values.load(), values.load())
+
+    def test_file(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "geo_values.json.gz")
+            write_geo_values(path)
+            self.assertEqual(read_geo_values(path), read_geo_values())
+            self.assertIn("42003", GeoValues(path).allowed("county"))
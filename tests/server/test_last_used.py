@@ -0,0 +1,57 @@
+"""Unit tests for the tracking of the last usage of api keys."""
+
+# standard library
+from datetime import date
+import unittest
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from delphi.epidata.server._last_used import LastUsedWriter
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._last_used"
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    def _writer(self, flush_interval: float):
+        writer = LastUsedWriter(flush_interval, 2)
+        r = MagicMock()
+        patcher = patch.object(writer, "_get_redis", return_value=r)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return writer, r.pipeline.return_value
+
+    def test_synchronous(self):
+        writer, pipe = self._writer(0)
+        writer.record("abc")
+        writer.record("abc")
+        pipe.set.assert_called_once_with("LAST_USED/abc", date.today().isoformat())
+
+    def test_batched(self):
+        writer, pipe = self._writer(3600)
+        with patch.object(writer, "_ensure_thread"):
+            for key in ("a", "b", "c", "a"):
+                writer.record(key)
+            pipe.set.assert_not_called()
+            writer.flush()
+        self.assertEqual(sorted(c.args[0] for c in pipe.set.call_args_list), ["LAST_USED/a", "LAST_USED/b", "LAST_USED/c"])
+        # in batches of 2
+        self.assertEqual(pipe.execute.call_count, 2)
+
+        with self.subTest("written keys"):
+            pipe.reset_mock()
+            writer.record("b")
+            writer.flush()
+            pipe.set.assert_not_called()
+
+    def test_redis_down(self):
+        writer, pipe = self._writer(0)
+        pipe.execute.side_effect = redis.ConnectionError()
+        writer.record("abc")
+        pipe.execute.side_effect = None
+        pipe.set.reset_mock()
+        writer.flush()
+        pipe.set.assert_called_once_with("LAST_USED/abc", date.today().isoformat())
@@ -0,0 +1,71 @@
+"""Unit tests for the rate limit storage counting in process."""
+
+# standard library
+import unittest
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from delphi.epidata.server._limiter_storage import LocalRedisStorage
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._limiter_storage"
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    def setUp(self):
+        self.storage = LocalRedisStorage("local+redis://localhost:6379", sync_interval=3600)
+        self.storage._redis = MagicMock()
+        self.pipe = self.storage._redis.pipeline.return_value
+        patcher = patch.object(self.storage, "_ensure_thread")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counts_locally(self):
+        # nothing counted in redis yet
+        self.pipe.execute.return_value = [None, -2]
+        self.assertEqual(self.storage.get("k"), 0)
+        # 3 hits in other processes
+        self.pipe.execute.return_value = [True, 4, 60000]
+        self.assertEqual(self.storage.incr("k", 60), 4)
+        self.pipe.execute.reset_mock()
+        self.assertEqual(self.storage.incr("k", 60), 5)
+        self.assertEqual(self.storage.incr("k", 60, amount=2), 7)
+        self.assertEqual(self.storage.get("k"), 7)
+        self.assertGreater(self.storage.get_expiry("k"), 0)
+        self.pipe.execute.assert_not_called()
+
+        with self.subTest("sync"):
+            # 10 more hits in other processes
+            self.pipe.execute.return_value = [True, 17, 50000]
+            self.storage.sync()
+            self.pipe.incrby.assert_called_with("k", 3)
+            self.assertEqual(self.storage.get("k"), 17)
+
+        with self.subTest("untouched keys are not synced"):
+            self.pipe.execute.reset_mock()
+            self.storage.sync()
+            self.storage.sync()
+            self.assertEqual(self.pipe.execute.call_count, 1)
+
+        with self.subTest("window ended"):
+            self.storage.incr("k", 60)
+            self.pipe.execute.return_value = [True, 1, -2]
+            self.storage.sync()
+            self.pipe.execute.return_value = [None, -2]
+            self.assertEqual(self.storage.get("k"), 0)
+
+    def test_redis_down(self):
+        self.pipe.execute.return_value = [True, 1, 60000]
+        self.storage.incr("k", 60)
+        self.storage.incr("k", 60)
+        self.pipe.execute.side_effect = redis.ConnectionError()
+        self.storage.sync()
+        self.assertEqual(self.storage.get("k"), 2)
+        self.pipe.execute.side_effect = None
+        self.pipe.execute.return_value = [True, 2, 60000]
+        self.storage.sync()
+        self.pipe.incrby.assert_called_with("k", 1)
+        self.assertEqual(self.storage.get("k"), 2)
@@ -0,0 +1,103 @@
+"""Unit tests for the concurrent query execution."""
+
+# standard library
+from threading import Event
+import unittest
+from unittest.mock import patch
+
+# third party
+import orjson
+
+# from flask.testing import FlaskClient
+from delphi.epidata.server._common import app
+from delphi.epidata.server._parallel import is_parallel_enabled, start_queries
+from delphi.epidata.server._query import execute_queries, run_query
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._parallel"
+
+
+def _values(n, offset=0):
+    # a query returning n rows with the column `a` without needing any table
+    return " UNION ALL ".join(f"SELECT {offset + i} AS a" for i in range(n))
+
+
+def _consume(result):
+    rows = []
+    while True:
+        batch = result.fetchmany()
+        if not batch:
+            return rows
+        rows.extend(tuple(r) for r in batch)
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    # app: FlaskClient
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        app.config["DEBUG"] = False
+
+    def test_is_parallel_enabled(self):
+        with patch("delphi.epidata.server._parallel.QUERY_PARALLELISM", 4):
+            self.assertTrue(is_parallel_enabled(2))
+            self.assertFalse(is_parallel_enabled(1))
+        with patch("delphi.epidata.server._parallel.QUERY_PARALLELISM", 1):
+            self.assertFalse(is_parallel_enabled(2))
+
+    def test_start_queries(self):
+        with self.subTest("rows"):
+            stop = Event()
+            a, b = start_queries([(_values(3), {}), (_values(2, 10), {})], stop)
+            self.assertEqual(a.keys(), ["a"])
+            self.assertEqual(_consume(a), [(0,), (1,), (2,)])
+            self.assertEqual(_consume(b), [(10,), (11,)])
+            self.assertEqual(a.fetchmany(), [])
+        with self.subTest("batches"):
+            with patch("delphi.epidata.server._parallel.QUERY_FETCH_SIZE", 2):
+                (a,) = start_queries([(_values(5), {})], Event())
+                self.assertEqual(len(a.fetchmany()), 2)
+                self.assertEqual(len(_consume(a)), 3)
+        with self.subTest("error"):
+            (a,) = start_queries([("SELECT * FROM missing_table", {})], Event())
+            with self.assertRaises(Exception):
+                a.keys()
+            self.assertEqual(a.fetchmany(), [])
+        with self.subTest("stopped"):
+            stop = Event()
+            with patch("delphi.epidata.server._parallel.QUERY_FETCH_SIZE", 1), patch("delphi.epidata.server._parallel.QUERY_PARALLEL_BUFFER", 1):
+                (a,) = start_queries([(_values(10), {})], stop)
+                a.keys()
+                stop.set()
+                self.assertLess(len(_consume(a)), 10)
+
+    def test_execute_queries(self):
+        queries = [(_values(2), {}), (_values(2, 10), {}), (_values(2, 20), {})]
+        with patch("delphi.epidata.server._parallel.QUERY_PARALLELISM", 4):
+            with self.subTest("in order"):
+                with app.test_request_context("/"):
+                    body = execute_queries(queries, [], ["a"], []).get_data()
+                self.assertEqual(orjson.loads(body)["epidata"], [{"a": v} for v in [0, 1, 10, 11, 20, 21]])
+            with self.subTest("limit"):
+                with patch("delphi.epidata.server._printer.MAX_RESULTS", 3), app.test_request_context("/"):
+                    body = orjson.loads(execute_queries(queries, [], ["a"], []).get_data())
+                self.assertEqual(body["epidata"], [{"a": v} for v in [0, 1, 10]])
+                self.assertEqual(body["result"], 2)
+
+    def test_merge(self):
+        queries = [(_values(3, 0) + " ORDER BY a", {}), (_values(3, 1) + " ORDER BY a", {})]
+        fallback = (f"SELECT a FROM ({_values(3, 0)} UNION ALL {_values(3, 1)}) ORDER BY a", {})
+        with patch("delphi.epidata.server._parallel.QUERY_PARALLELISM", 4):
+            with self.subTest("merged"):
+                with app.test_request_context("/"):
+                    body = execute_queries(queries, [], ["a"], [], merge_by=["a"], fallback=fallback).get_data()
+                self.assertEqual(orjson.loads(body)["epidata"], [{"a": v} for v in [0, 1, 1, 2, 2, 3]])
+            with self.subTest("no idle workers"):
+                with patch("delphi.epidata.server._parallel._idle_workers", 0), patch("delphi.epidata.server._query.run_query", wraps=run_query) as m:
+                    with app.test_request_context("/"):
+                        body = execute_queries(queries, [], ["a"], [], merge_by=["a"], fallback=fallback).get_data()
+                    self.assertEqual(m.call_args[0][1], fallback)
+                self.assertEqual(orjson.loads(body)["epidata"], [{"a": v} for v in [0, 1, 1, 2, 2, 3]])
@@ -12,6 +12,7 @@ from delphi.epidata.server._params import (
     extract_integer,
     extract_date,
     extract_dates,
+    extract_unordered,
     parse_geo_arg,
     parse_single_geo_arg,
     parse_source_signal_arg,
@@ -405,6 +406,20 @@ class UnitTests(unittest.TestCase):
             with app.test_request_context("/?s=a"):
                 self.assertRaises(ValidationFailedException, lambda: extract_integer("s"))
 
+    def test_extract_unordered(self):
+        with self.subTest("empty"):
+            with app.test_request_context("/"):
+                self.assertFalse(extract_unordered())
+        with self.subTest("sorted"):
+            with app.test_request_context("/?order=sorted"):
+                self.assertFalse(extract_unordered())
+        with self.subTest("none"):
+            with app.test_request_context("/?order=none"):
+                self.assertTrue(extract_unordered())
+        with self.subTest("unknown"):
+            with app.test_request_context("/?order=random"):
+                self.assertRaises(ValidationFailedException, lambda: extract_unordered())
+
     def test_extract_integers(self):
         with self.subTest("empty"):
             with app.test_request_context("/"):
@@ -507,3 +522,4 @@ class UnitTests(unittest.TestCase):
         with self.subTest("single range iso"):
             with app.test_request_context("/?s=2020-01-01:2020-01-01"):
                 self.assertEqual(extract_dates("s"), [20200101])
+
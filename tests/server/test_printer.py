@@ -0,0 +1,187 @@
+"""Unit tests for the response printers."""
+
+# standard library
+from io import BytesIO
+import unittest
+from unittest.mock import patch
+
+# third party
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# from flask.testing import FlaskClient
+from delphi.epidata.server._common import app
+from delphi.epidata.server._printer import (
+    ArrowPrinter,
+    ClassicTreePrinter,
+    CSVPrinter,
+    JSONPrinter,
+    ParquetPrinter,
+    create_printer,
+    tree_group,
+)
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._printer"
+
+
+def _rows(n):
+    return [dict(geo_value="pa", time_value=20200101 + i, value=float(i) if i % 3 else None) for i in range(n)]
+
+
+def _print(printer, rows):
+    printer.set_field_types(["geo_value"], ["time_value"], ["value"])
+    r = printer(iter(rows))
+    return r, b"".join(c if isinstance(c, bytes) else c.encode("utf-8") for c in r.response)
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    # app: FlaskClient
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        app.config["DEBUG"] = False
+
+    def test_create_printer(self):
+        with app.test_request_context("/"):
+            self.assertIsInstance(create_printer("arrow"), ArrowPrinter)
+            self.assertIsInstance(create_printer("parquet"), ParquetPrinter)
+
+    def test_arrow(self):
+        with patch("delphi.epidata.server._printer.ARROW_BATCH_SIZE", 10):
+            with app.test_request_context("/"):
+                r, data = _print(ArrowPrinter(), _rows(25))
+        self.assertEqual(r.mimetype, "application/vnd.apache.arrow.stream")
+        reader = pa.ipc.open_stream(data)
+        self.assertEqual([b.num_rows for b in reader], [10, 10, 5])
+        table = pa.ipc.open_stream(data).read_all()
+        self.assertEqual(table.schema, pa.schema([("geo_value", pa.string()), ("time_value", pa.int64()), ("value", pa.float64())]))
+        self.assertEqual(table.to_pylist(), _rows(25))
+
+    def test_arrow_empty(self):
+        with app.test_request_context("/"):
+            _, data = _print(ArrowPrinter(), [])
+        table = pa.ipc.open_stream(data).read_all()
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.schema.names, ["geo_value", "time_value", "value"])
+
+    def test_arrow_max_results(self):
+        with app.test_request_context("/"):
+            p = ArrowPrinter()
+            p._max_results = 5
+            _, data = _print(p, _rows(8))
+        self.assertEqual(p.result, 2)
+        self.assertEqual(pa.ipc.open_stream(data).read_all().num_rows, 5)
+
+    def test_parquet(self):
+        with patch("delphi.epidata.server._printer.ARROW_BATCH_SIZE", 10):
+            with app.test_request_context("/"):
+                r, data = _print(ParquetPrinter(), _rows(25))
+        self.assertEqual(r.headers["Content-Disposition"], "attachment; filename=epidata.parquet")
+        f = pq.ParquetFile(BytesIO(data))
+        self.assertEqual(f.metadata.num_row_groups, 3)
+        self.assertEqual(f.read().to_pylist(), _rows(25))
+
+    def test_coalescing(self):
+        rows = [dict(a=i) for i in range(100)]
+        with self.subTest("single chunk"):
+            with app.test_request_context("/"):
+                chunks = list(JSONPrinter()(iter(rows)).response)
+            self.assertEqual(len(chunks), 1)
+            self.assertEqual(chunks[0], b"[" + b",".join(f'{{"a":{i}}}'.encode() for i in range(100)) + b"]")
+        with self.subTest("chunk size"):
+            with patch("delphi.epidata.server._printer.PRINTER_CHUNK_SIZE", 100):
+                with app.test_request_context("/"):
+                    chunks = list(CSVPrinter()(iter(rows)).response)
+            self.assertGreater(len(chunks), 1)
+            self.assertTrue(all(len(c) >= 100 for c in chunks[:-1]))
+            self.assertEqual(b"".join(chunks), b"a\n" + b"".join(f"{i}\n".encode() for i in range(100)))
+        with self.subTest("flush interval"):
+            with patch("delphi.epidata.server._printer.PRINTER_FLUSH_INTERVAL", 0):
+                with app.test_request_context("/"):
+                    chunks = list(JSONPrinter()(iter(rows[:3])).response)
+            self.assertEqual(chunks, [b"[", b'{"a":0}', b',{"a":1}', b',{"a":2}', b"]"])
+        with self.subTest("error"):
+
+            def failing():
+                yield from rows[:2]
+                raise Exception("broken")
+
+            with app.test_request_context("/"):
+                p = CSVPrinter()
+                body = b"".join(p(failing()).response)
+            self.assertEqual(p.result, -1)
+            self.assertEqual(body, b"a\n0\n1\nunknown error occurred:\nbroken")
+
+    def test_csv(self):
+        with self.subTest("format"):
+            with app.test_request_context("/"):
+                r = CSVPrinter()(iter([dict(a=1, b="x,y", c=None), dict(a=2.5, c=3), dict(a=3, b="z", c=4)]))
+                self.assertEqual(r.headers["Content-Disposition"], "attachment; filename=epidata.csv")
+                self.assertEqual(r.get_data(), b'a,b,c\n1,"x,y",\n2.5,,3\n3,z,4\n')
+        with self.subTest("single column"):
+            with app.test_request_context("/"):
+                self.assertEqual(CSVPrinter()(iter([dict(a=1), dict(a=2)])).get_data(), b"a\n1\n2\n")
+        with self.subTest("independent instances"):
+            with patch("delphi.epidata.server._printer.PRINTER_CHUNK_SIZE", 0), app.test_request_context("/"):
+                a, b = CSVPrinter(), CSVPrinter()
+                self.assertEqual(a._format_row(True, dict(a=1)), "a\n1\n")
+                self.assertEqual(b._format_row(True, dict(b=2)), "b\n2\n")
+                self.assertEqual(a._format_row(False, dict(a=3)), "3\n")
+
+    def test_tree(self):
+        rows = [dict(signal="a", v=1), dict(signal="a", v=2), dict(signal="b", v=3)]
+        expected = {"epidata": [{"a": [{"v": 1}, {"v": 2}], "b": [{"v": 3}]}], "result": 1, "message": "success"}
+        with self.subTest("buffered"):
+            with app.test_request_context("/"):
+                p = ClassicTreePrinter("signal")
+                self.assertFalse(p.streaming)
+                body = p(iter([dict(r) for r in rows])).get_data()
+            self.assertEqual(orjson.loads(body), expected)
+        with self.subTest("streaming"):
+            with patch("delphi.epidata.server._printer.PRINTER_FLUSH_INTERVAL", 0):
+                with app.test_request_context("/"):
+                    p = ClassicTreePrinter("signal")
+                    p.set_grouped_by("signal")
+                    self.assertTrue(p.streaming)
+                    chunks = list(p(iter([dict(r) for r in rows])).response)
+            self.assertEqual(chunks, [b'{ "epidata": [', b'{"a":[{"v":1}', b',{"v":2}', b'],"b":[{"v":3}', b']}], "result": 1, "message": "success" }'])
+            self.assertEqual(orjson.loads(b"".join(chunks)), expected)
+        with self.subTest("streaming compatibility"):
+            with app.test_request_context("/?format=tree"), patch("delphi.epidata.server._printer.is_compatibility_mode", return_value=True):
+                p = ClassicTreePrinter("signal")
+                p.set_grouped_by("signal")
+                body = p(iter([dict(r) for r in rows])).get_data()
+            self.assertEqual(orjson.loads(body), expected)
+        with self.subTest("streaming int group"):
+            with app.test_request_context("/"):
+                p = ClassicTreePrinter("time_value")
+                p.set_grouped_by("time_value")
+                body = p(iter([dict(time_value=20200101, v=1), dict(time_value=20200101, v=2), dict(time_value=20200102, v=3), dict(time_value=None, v=4)])).get_data()
+            self.assertEqual(orjson.loads(body)["epidata"], [{"20200101": [{"v": 1}, {"v": 2}], "20200102": [{"v": 3}], "None": [{"v": 4}]}])
+        with self.subTest("streaming interleaved by collation"):
+            # sorted case insensitively by the database
+            interleaved = [dict(signal="a", v=1), dict(signal="A", v=2), dict(signal="a", v=3), dict(signal="b", v=4)]
+            with app.test_request_context("/"):
+                p = ClassicTreePrinter("signal")
+                p.set_grouped_by("signal")
+                body = p(iter(interleaved)).get_data()
+            self.assertEqual(orjson.loads(body)["epidata"], [{"a": [{"v": 1}, {"v": 3}], "A": [{"v": 2}], "b": [{"v": 4}]}])
+        with self.subTest("streaming empty"):
+            with app.test_request_context("/"):
+                p = ClassicTreePrinter("signal")
+                p.set_grouped_by("signal")
+                body = p(iter([])).get_data()
+            self.assertEqual(orjson.loads(body), {"epidata": [], "result": -2, "message": "no results"})
+        with self.subTest("create"):
+            with app.test_request_context("/"):
+                self.assertEqual(create_printer("tree").group, "signal")
+                self.assertEqual(create_printer("tree-geo_value").group, "geo_value")
+            self.assertEqual(tree_group("tree"), "signal")
+            self.assertEqual(tree_group("tree-geo_value"), "geo_value")
+            self.assertIsNone(tree_group("csv"))
+            self.assertIsNone(tree_group(None))
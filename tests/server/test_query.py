@@ -1,6 +1,11 @@
 # standard library
 import unittest
 import base64
+from datetime import date
+from unittest.mock import patch
+
+# third party
+import orjson
 
 # from flask.testing import FlaskClient
 from delphi.epidata.server._common import app
@@ -13,7 +18,16 @@ from delphi.epidata.server._query import (
     filter_geo_sets,
     filter_source_signal_sets,
     filter_time_set,
+    execute_query,
+    RowDecoder,
+    decode_rows,
+    encode_cursor,
+    decode_cursor,
+    collation_key,
+    QueryBuilder,
 )
+from delphi.epidata.server._cache import ResponseValidator, make_cache_key
+from delphi.epidata.server._exceptions import ValidationFailedException
 from delphi.epidata.server._params import (
     GeoSet,
     TimeSet,
@@ -54,12 +68,15 @@ class UnitTests(unittest.TestCase):
         self.assertEqual(filter_strings("a", ["1"], "a", params), "(a = :a_0)")
         self.assertEqual(params, {"a_0": "1"})
         params = {}
-        self.assertEqual(filter_strings("a", ["1", "2"], "a", params), "(a = :a_0 OR a = :a_1)")
+        self.assertEqual(filter_strings("a", ["1", "2"], "a", params), "(a IN (:a_0, :a_1))")
+        self.assertEqual(params, {"a_0": "1", "a_1": "2"})
+        params = {}
+        self.assertEqual(filter_strings("a", ["1", "2", "1"], "a", params), "(a IN (:a_0, :a_1))")
         self.assertEqual(params, {"a_0": "1", "a_1": "2"})
         params = {}
         self.assertEqual(
             filter_strings("a", ["1", "2", ("1", "4")], "a", params),
-            "(a = :a_0 OR a = :a_1 OR a BETWEEN :a_2 AND :a_2_2)",
+            "(a IN (:a_0, :a_1) OR a BETWEEN :a_2 AND :a_2_2)",
         )
         self.assertEqual(params, {"a_0": "1", "a_1": "2", "a_2": "1", "a_2_2": "4"})
 
@@ -71,14 +88,38 @@ class UnitTests(unittest.TestCase):
         self.assertEqual(filter_integers("a", [1], "a", params), "(a = :a_0)")
         self.assertEqual(params, {"a_0": 1})
         params = {}
-        self.assertEqual(filter_integers("a", [1, 2], "a", params), "(a = :a_0 OR a = :a_1)")
-        self.assertEqual(params, {"a_0": 1, "a_1": 2})
+        self.assertEqual(filter_integers("a", [1, 3], "a", params), "(a IN (:a_0, :a_1))")
+        self.assertEqual(params, {"a_0": 1, "a_1": 3})
+        params = {}
+        self.assertEqual(filter_integers("a", [1, 2], "a", params), "(a BETWEEN :a_0 AND :a_0_2)")
+        self.assertEqual(params, {"a_0": 1, "a_0_2": 2})
         params = {}
         self.assertEqual(
             filter_integers("a", [1, 2, (1, 4)], "a", params),
-            "(a = :a_0 OR a = :a_1 OR a BETWEEN :a_2 AND :a_2_2)",
+            "(a BETWEEN :a_0 AND :a_0_2)",
         )
-        self.assertEqual(params, {"a_0": 1, "a_1": 2, "a_2": 1, "a_2_2": 4})
+        self.assertEqual(params, {"a_0": 1, "a_0_2": 4})
+        params = {}
+        self.assertEqual(
+            filter_integers("a", [9, (5, 6), 1, 3, 7], "a", params),
+            "(a IN (:a_0, :a_1, :a_2) OR a BETWEEN :a_3 AND :a_3_2)",
+        )
+        self.assertEqual(params, {"a_0": 1, "a_1": 3, "a_2": 9, "a_3": 5, "a_3_2": 7})
+
+    def test_filter_key_table(self):
+        with patch("delphi.epidata.server._query.FILTER_KEY_TABLE_THRESHOLD", 2):
+            params = {}
+            self.assertEqual(
+                filter_strings("a", ["x", "y", "z"], "a", params),
+                "(a IN (SELECT v FROM JSON_TABLE(:a_keys, '$[*]' COLUMNS (v VARCHAR(255) COLLATE utf8mb4_0900_ai_ci PATH '$')) AS a_keys))",
+            )
+            self.assertEqual(params, {"a_keys": '["x","y","z"]'})
+            params = {}
+            self.assertEqual(
+                filter_integers("a", [1, 3, 5, (7, 8)], "a", params),
+                "(a IN (SELECT v FROM JSON_TABLE(:a_keys, '$[*]' COLUMNS (v BIGINT PATH '$')) AS a_keys) OR a BETWEEN :a_3 AND :a_3_2)",
+            )
+            self.assertEqual(params, {"a_keys": "[1,3,5]", "a_3": 7, "a_3_2": 8})
 
     def test_filter_dates(self):
         params = {}
@@ -99,7 +140,7 @@ class UnitTests(unittest.TestCase):
         params = {}
         self.assertEqual(
             filter_dates("a", [20200101, 20200103], "a", params),
-            "(a = :a_0 OR a = :a_1)",
+            "(a IN (:a_0, :a_1))",
         )
         self.assertEqual(params, {"a_0": "2020-01-01", "a_1": "2020-01-03"})
         params = {}
@@ -117,7 +158,7 @@ class UnitTests(unittest.TestCase):
         params = {}
         self.assertEqual(
             filter_dates("a", [20200101, 20200103, (20200105, 20200107)], "a", params),
-            "(a = :a_0 OR a = :a_1 OR a BETWEEN :a_2 AND :a_2_2)",
+            "(a IN (:a_0, :a_1) OR a BETWEEN :a_2 AND :a_2_2)",
         )
         self.assertEqual(
             params,
@@ -152,7 +193,7 @@ class UnitTests(unittest.TestCase):
             params = {}
             self.assertEqual(
                 filter_geo_sets("t", "v", [GeoSet("fips", [FIPS[0], FIPS[1]])], "p", params),
-                "((t = :p_0t AND (v = :p_0t_0 OR v = :p_0t_1)))",
+                "((t = :p_0t AND (v IN (:p_0t_0, :p_0t_1))))",
             )
             self.assertEqual(params, {"p_0t": "fips", "p_0t_0": FIPS[0], "p_0t_1": FIPS[1]})
         with self.subTest("multiple pairs"):
@@ -165,7 +206,7 @@ class UnitTests(unittest.TestCase):
                     "p",
                     params,
                 ),
-                "(t = :p_0t OR t = :p_1t)",
+                "(t IN (:p_0t, :p_1t))",
             )
             self.assertEqual(params, {"p_0t": "state", "p_1t": "nation"})
         with self.subTest("multiple pairs with value"):
@@ -185,6 +226,30 @@ class UnitTests(unittest.TestCase):
                 {"p_0t": "fips", "p_0t_0": FIPS[0], "p_1t": "msa", "p_1t_0": MSA[0]},
             )
 
+        with self.subTest("merged types"):
+            params = {}
+            self.assertEqual(
+                filter_geo_sets(
+                    "t",
+                    "v",
+                    [GeoSet("fips", [FIPS[0]]), GeoSet("state", True), GeoSet("fips", [FIPS[1], FIPS[0]]), GeoSet("nation", True)],
+                    "p",
+                    params,
+                ),
+                "(t IN (:p_1t, :p_2t) OR (t = :p_0t AND (v IN (:p_0t_0, :p_0t_1))))",
+            )
+            self.assertEqual(
+                params,
+                {"p_0t": "fips", "p_0t_0": FIPS[0], "p_0t_1": FIPS[1], "p_1t": "state", "p_2t": "nation"},
+            )
+        with self.subTest("wildcard wins"):
+            params = {}
+            self.assertEqual(
+                filter_geo_sets("t", "v", [GeoSet("fips", [FIPS[0]]), GeoSet("fips", True)], "p", params),
+                "(t = :p_0t)",
+            )
+            self.assertEqual(params, {"p_0t": "fips"})
+
     def test_filter_source_signal_sets(self):
         with self.subTest("empty"):
             params = {}
@@ -208,7 +273,7 @@ class UnitTests(unittest.TestCase):
             params = {}
             self.assertEqual(
                 filter_source_signal_sets("t", "v", [SourceSignalSet("src1", ["sig1", "sig2"])], "p", params),
-                "((t = :p_0t AND (v = :p_0t_0 OR v = :p_0t_1)))",
+                "((t = :p_0t AND (v IN (:p_0t_0, :p_0t_1))))",
             )
             self.assertEqual(params, {"p_0t": "src1", "p_0t_0": "sig1", "p_0t_1": "sig2"})
         with self.subTest("multiple pairs"):
@@ -221,7 +286,7 @@ class UnitTests(unittest.TestCase):
                     "p",
                     params,
                 ),
-                "(t = :p_0t OR t = :p_1t)",
+                "(t IN (:p_0t, :p_1t))",
             )
             self.assertEqual(params, {"p_0t": "src1", "p_1t": "src2"})
         with self.subTest("multiple pairs with value"):
@@ -267,7 +332,7 @@ class UnitTests(unittest.TestCase):
             params = {}
             self.assertEqual(
                 filter_time_set("t", "v", TimeSet("day", [20201201, 20201203]), "p", params),
-                "((t = :p_0t AND (v = :p_0t_0 OR v = :p_0t_1)))",
+                "((t = :p_0t AND (v IN (:p_0t_0, :p_0t_1))))",
             )
             self.assertEqual(params, {"p_0t": "day", "p_0t_0": 20201201, "p_0t_1": 20201203})
         with self.subTest("range"):
@@ -295,6 +360,147 @@ class UnitTests(unittest.TestCase):
             params = {}
             self.assertEqual(
                 filter_time_set("t", "v", TimeSet("day", [20200101, 20200103, (20200105, 20200107)]), "p", params),
-                "((t = :p_0t AND (v = :p_0t_0 OR v = :p_0t_1 OR v BETWEEN :p_0t_2 AND :p_0t_2_2)))",
+                "((t = :p_0t AND (v IN (:p_0t_0, :p_0t_1) OR v BETWEEN :p_0t_2 AND :p_0t_2_2)))",
             )
             self.assertEqual(params, {"p_0t": "day", "p_0t_0": 20200101, "p_0t_1": 20200103, 'p_0t_2': 20200105, 'p_0t_2_2': 20200107})           
+
+    def test_conditional_request(self):
+        validator = ResponseValidator("v1", 1600000000)
+        etag = make_cache_key("v1", None, [], False)
+        with self.subTest("matching etag"):
+            with app.test_request_context("/", headers={"If-None-Match": f'W/"{etag}"'}):
+                r = execute_query("SELECT 1", {}, [], [], [], validator=validator)
+                self.assertEqual(r.status_code, 304)
+                self.assertEqual(r.headers["ETag"], f'W/"{etag}"')
+                self.assertEqual(r.get_data(), b"")
+        with self.subTest("not modified since"):
+            with app.test_request_context("/", headers={"If-Modified-Since": "Sun, 13 Sep 2020 12:26:40 GMT"}):
+                r = execute_query("SELECT 1", {}, [], [], [], validator=validator)
+                self.assertEqual(r.status_code, 304)
+                self.assertEqual(r.headers["Last-Modified"], "Sun, 13 Sep 2020 12:26:40 GMT")
+
+    def test_row_decoder(self):
+        class FakeResult:
+            def __init__(self, columns, rows):
+                self._columns = columns
+                self._rows = list(rows)
+
+            def keys(self):
+                return self._columns
+
+            def fetchmany(self, size):
+                batch, self._rows = self._rows[:size], self._rows[size:]
+                return batch
+
+        columns = ["s", "d", "i", "f"]
+        rows = [("a", date(2020, 1, 2), 1.0, 2), ("b", None, None, None), ("c", "x", "3", "4.5")]
+        decoder = RowDecoder(columns, ["s", "d", "missing"], ["i"], ["f"])
+        expected = [
+            {"s": "a", "d": "2020-01-02", "missing": None, "i": 1, "f": 2.0},
+            {"s": "b", "d": None, "missing": None, "i": None, "f": None},
+            {"s": "c", "d": "x", "missing": None, "i": 3, "f": 4.5},
+        ]
+        self.assertEqual([decoder.decode(r) for r in rows], expected)
+        self.assertEqual([list(batch) for batch in decoder.batches(FakeResult(columns, rows), 2)], [rows[:2], rows[2:]])
+        self.assertEqual(list(decoder.rows(FakeResult(columns, rows), 2)), list(zip(expected, rows)))
+        self.assertEqual(list(decode_rows(FakeResult(columns, rows), ["s", "d", "missing"], ["i"], ["f"])), expected)
+
+    def test_cursor(self):
+        fields = ["source", "signal", "time_value"]
+        with self.subTest("round trip"):
+            token = encode_cursor(fields, ["src", "sig", 20200101])
+            self.assertNotIn("=", token)
+            self.assertEqual(decode_cursor(token, fields), ["src", "sig", 20200101])
+        with self.subTest("invalid"):
+            for token in ["garbage!", base64.urlsafe_b64encode(b"[1]").decode(), encode_cursor(fields, [None, "sig", 1])]:
+                with app.test_request_context("/"), self.assertRaises(ValidationFailedException):
+                    decode_cursor(token, fields)
+        with self.subTest("other query"):
+            with app.test_request_context("/"), self.assertRaises(ValidationFailedException):
+                decode_cursor(encode_cursor(fields, ["src", "sig", 20200101]), ["signal", "source", "time_value"])
+        with self.subTest("seek predicate"):
+            q = QueryBuilder("table", "t").set_sort_order(*fields)
+            q.apply_cursor(encode_cursor(fields, ["src", "sig", 20200101]))
+            self.assertEqual(q.conditions, ["(t.source, t.signal, t.time_value) > (:cursor_0, :cursor_1, :cursor_2)"])
+            self.assertEqual(q.params, {"cursor_0": "src", "cursor_1": "sig", "cursor_2": 20200101})
+            self.assertEqual(QueryBuilder("table", "t").set_sort_order(*fields).apply_cursor(None).conditions, [])
+
+    def test_collation_key(self):
+        # punctuation sorts before digits and case is ignored, like in utf8mb4_0900_ai_ci
+        values = ["covid_ag_raw_pct_positive_age_50_64", "covid_ag_raw_pct_positive_age_5_17", "B", "a1", "a-b", "a_b", "a"]
+        self.assertEqual(
+            sorted(values, key=collation_key),
+            ["a", "a_b", "a-b", "a1", "B", "covid_ag_raw_pct_positive_age_5_17", "covid_ag_raw_pct_positive_age_50_64"],
+        )
+        self.assertEqual(collation_key("Ab"), collation_key("aB"))
+        self.assertEqual(collation_key(20200101), 20200101)
+
+    def test_as_of_filter(self):
+        with self.subTest("grouped"):
+            q = QueryBuilder("latest", "t").where(source="src").apply_as_of_filter("history", 20200105)
+            self.assertEqual(q.table, "history t")
+            self.assertIn("GROUP BY time_type, time_value, `source`, `signal`, `geo_type`, `geo_value`", q.subquery)
+            self.assertEqual(q.params, {"source": "src", "as_of": 20200105})
+        with self.subTest("keyed"):
+            q = QueryBuilder("latest", "t").apply_as_of_filter("history", 20200105, ("signal_key_id", "geo_key_id"))
+            self.assertIn("x.signal_key_id = t.signal_key_id AND x.geo_key_id = t.geo_key_id", q.subquery)
+        with self.subTest("intervals"):
+            q = QueryBuilder("latest", "t").where(source="src").apply_as_of_filter("history", 20200105, interval_field="next_issue")
+            self.assertEqual(q.table, "history t")
+            self.assertEqual(q.subquery, "")
+            self.assertEqual(q.conditions[-1], "(t.issue <= :as_of AND :as_of < t.next_issue)")
+            self.assertEqual(q.params, {"source": "src", "as_of": 20200105})
+        with self.subTest("intervals with lag"):
+            # the latest issue with the given lag, not the latest issue if it has that lag
+            q = QueryBuilder("latest", "t").apply_lag_filter("history", 3).apply_as_of_filter("history", 20200105, interval_field="next_issue")
+            self.assertIn("max(issue) max_issue", q.subquery)
+            self.assertIn("WHERE t.lag = :lag AND (issue <= :as_of)", q.subquery)
+            self.assertNotIn("next_issue", q.conditions_clause)
+        with self.subTest("intervals with issues"):
+            q = QueryBuilder("latest", "t").apply_issues_filter("history", [20200103, 20200104]).apply_as_of_filter("history", 20200105, interval_field="next_issue")
+            self.assertIn("max(issue) max_issue", q.subquery)
+        with self.subTest("no as_of"):
+            q = QueryBuilder("latest", "t").apply_as_of_filter("history", None, interval_field="next_issue")
+            self.assertEqual((q.table, q.conditions, q.params), ("latest t", [], {}))
+
+    def test_project_requested_fields(self):
+        def project(query_string, *keep):
+            q = QueryBuilder("table", "t").set_fields(["a", "b"], ["c", "d"]).set_sort_order("d")
+            with app.test_request_context("/", query_string=query_string):
+                return q.project_requested_fields(*keep).fields
+
+        self.assertEqual(project(""), ["t.a", "t.b", "t.c", "t.d"])
+        self.assertEqual(project("fields=a,c"), ["t.a", "t.c", "t.d"])
+        self.assertEqual(project("fields=-b,-d"), ["t.a", "t.c", "t.d"])
+        self.assertEqual(project("fields=c", "b"), ["t.b", "t.c", "t.d"])
+        # nothing known requested, keep the full selection
+        with app.test_request_context("/", query_string="fields=x"):
+            self.assertEqual(QueryBuilder("table", "t").set_fields(["a"]).project_requested_fields().fields, ["t.a"])
+
+    def test_next_cursor(self):
+        class FakeRow(tuple):
+            def __getitem__(self, key):
+                return super().__getitem__(["s", "t"].index(key) if isinstance(key, str) else key)
+
+        class FakeResult:
+            def __init__(self, rows):
+                self._rows = rows
+
+            def keys(self):
+                return ["s", "t"]
+
+            def fetchmany(self, size):
+                batch, self._rows = self._rows[:size], self._rows[size:]
+                return batch
+
+        rows = [FakeRow(("a", i)) for i in range(3)]
+        with patch("delphi.epidata.server._printer.MAX_RESULTS", 2), patch("delphi.epidata.server._query.run_query", return_value=FakeResult(rows)):
+            with app.test_request_context("/"):
+                body = execute_query("SELECT", {}, ["s"], ["t"], [], cursor_fields=["s", "t"]).get_data()
+        expected = {
+            "epidata": [{"s": "a", "t": 0}, {"s": "a", "t": 1}],
+            "result": 2,
+            "message": "too many results, data truncated",
+            "next_cursor": encode_cursor(["s", "t"], ["a", 1]),
+        }
+        self.assertEqual(orjson.loads(body), expected)
@@ -0,0 +1,59 @@
+"""Unit tests for the routing of heavy queries."""
+
+# standard library
+import unittest
+from unittest.mock import patch
+
+from flask import g
+from sqlalchemy import create_engine
+
+# from flask.testing import FlaskClient
+from delphi.epidata.server._common import app, current_engine
+from delphi.epidata.server._db import engine
+from delphi.epidata.server._metrics import metrics
+from delphi.epidata.server._params import GeoSet, SourceSignalSet, TimeSet
+from delphi.epidata.server._routing import estimate_cost, route_request
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._routing"
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    # app: FlaskClient
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        app.config["DEBUG"] = False
+        metrics.clear()
+
+    def test_estimate_cost(self):
+        signal = [SourceSignalSet("src", ["sig1", "sig2"])]
+        states = [GeoSet("state", ["ca", "ny", "pa"])]
+        days = TimeSet("day", [(20200101, 20200110)])
+        self.assertEqual(estimate_cost(signal, states, days), 2 * 3 * 10)
+        with self.subTest("wildcards"):
+            self.assertEqual(estimate_cost([SourceSignalSet("src", True)], [GeoSet("county", True)], days), 50 * 3300 * 10)
+            self.assertEqual(estimate_cost(signal, states, TimeSet("week", True)), 2 * 3 * 220)
+        with self.subTest("history"):
+            self.assertEqual(estimate_cost(signal, states, days, history=True), 2 * 3 * 10 * 10)
+            self.assertEqual(estimate_cost(signal, states, days, issues=[20200105, 20200106]), 2 * 3 * 10 * 2)
+            self.assertEqual(estimate_cost(signal, states, days, issues=["*"]), 2 * 3 * 10 * 10)
+
+    def test_route_request(self):
+        with patch("delphi.epidata.server._routing.HEAVY_QUERY_COST_THRESHOLD", 0):
+            with app.test_request_context("/covidcast/"):
+                self.assertFalse(route_request(1e9))
+        heavy_engine = create_engine("sqlite://")
+        with patch("delphi.epidata.server._routing.HEAVY_QUERY_COST_THRESHOLD", 1000), patch("delphi.epidata.server._routing.heavy_engine", heavy_engine):
+            with app.test_request_context("/covidcast/"):
+                self.assertFalse(route_request(999))
+                self.assertIs(current_engine(), engine)
+            with app.test_request_context("/covidcast/"):
+                self.assertTrue(route_request(1000))
+                self.assertIs(current_engine(), heavy_engine)
+                self.assertNotIn("db", g)
+        self.assertEqual(metrics.get("routing.heavy"), 1)
+        self.assertEqual(metrics.get("routing.default"), 2)
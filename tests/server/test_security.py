@@ -2,11 +2,17 @@
 
 # standard library
 import unittest
+from unittest.mock import patch
 import base64
 
+from werkzeug.exceptions import TooManyRequests
+
 # from flask.testing import FlaskClient
 from delphi.epidata.server._common import app
+from delphi.epidata.server._metrics import metrics
 from delphi.epidata.server._security import (
+    AuthCache,
+    AuthenticatedUser,
     resolve_auth_token,
 )
 
@@ -45,3 +51,40 @@ class UnitTests(unittest.TestCase):
             userpass = base64.b64encode(b"epidata:abc").decode("utf-8")
             with app.test_request_context("/", headers={"Authorization": f"Basic {userpass}"}):
                 self.assertEqual(resolve_auth_token(), "abc")
+
+    def test_auth_cache(self):
+        user = AuthenticatedUser(1, "abc", frozenset(["quidel"]))
+        users = {"abc": user}
+        metrics.clear()
+        with patch("delphi.epidata.server._security.AuthenticatedUser.of", side_effect=lambda u: u), patch(
+            "delphi.epidata.server._security.User.find_user", side_effect=lambda api_key: users.get(api_key)
+        ) as find_user:
+            cache = AuthCache(10, 60, 60, 0)
+            self.assertEqual(cache.get("abc"), user)
+            self.assertTrue(cache.get("abc").has_role("quidel"))
+            self.assertIsNone(cache.get("unknown"))
+            self.assertIsNone(cache.get("unknown"))
+            self.assertEqual(find_user.call_count, 2)
+            self.assertEqual(metrics.get("auth_cache.hit_ratio"), 0.5)
+
+            with self.subTest("invalidated"):
+                users["unknown"] = AuthenticatedUser(2, "unknown", frozenset())
+                cache.invalidate("unknown", None)
+                self.assertEqual(cache.get("unknown").id, 2)
+
+            with self.subTest("throttled misses"):
+                cache = AuthCache(10, 60, 60, 2)
+                cache.get("guess1")
+                cache.get("guess2")
+                with self.assertRaises(TooManyRequests):
+                    cache.get("guess3")
+                # cached keys are still served
+                self.assertIsNone(cache.get("guess1"))
+                self.assertEqual(metrics.get("auth_cache.throttled"), 1)
+
+            with self.subTest("disabled"):
+                cache = AuthCache(10, 0, 0, 0)
+                find_user.reset_mock()
+                cache.get("abc")
+                cache.get("abc")
+                self.assertEqual(find_user.call_count, 2)
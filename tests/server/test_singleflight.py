@@ -0,0 +1,94 @@
+"""Unit tests for the coalescing of identical concurrent requests."""
+
+# standard library
+from time import monotonic
+import unittest
+from unittest.mock import MagicMock, patch
+
+# from flask.testing import FlaskClient
+from delphi.epidata.server._cache import ResponseCapture
+from delphi.epidata.server._common import app
+from delphi.epidata.server._metrics import metrics
+from delphi.epidata.server._singleflight import SingleFlight
+
+# py3tester coverage target
+__test_target__ = "delphi.epidata.server._singleflight"
+
+
+class UnitTests(unittest.TestCase):
+    """Basic unit tests."""
+
+    # app: FlaskClient
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        app.config["DEBUG"] = False
+        metrics.clear()
+
+    def _flights(self, timeout: float = 5):
+        flights = SingleFlight(timeout, use_redis=True)
+        r = MagicMock()
+        # the lock is free, the flight of another process ended right away
+        r.lock.return_value.acquire.return_value = True
+        r.exists.return_value = False
+        patcher = patch.object(flights, "_get_redis", return_value=r)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return flights, r
+
+    def test_led(self):
+        flights, _ = self._flights()
+        with app.app_context():
+            coalesced, leader = flights.join("k", lambda: None)
+            self.assertIsNone(coalesced)
+            leader.complete(b"body")
+        self.assertTrue(leader.done)
+        leader._redis_lock.release.assert_called_once()
+        self.assertEqual(metrics.get("single_flight.led"), 1)
+
+    def test_coalesced_across_processes(self):
+        flights, r = self._flights()
+        r.lock.return_value.acquire.return_value = False
+        with app.app_context():
+            coalesced, leader = flights.join("k", lambda: b"body")
+        self.assertEqual(coalesced.body, b"body")
+        self.assertIsNone(leader)
+        self.assertEqual(metrics.get("single_flight.coalesced"), 1)
+
+        with self.subTest("without a response"):
+            with app.app_context():
+                self.assertEqual(flights.join("k", lambda: None), (None, None))
+            self.assertEqual(metrics.get("single_flight.fallback"), 1)
+
+    def test_leader_streaming_in_process(self):
+        flights, _ = self._flights(timeout=30)
+        with app.app_context():
+            _, leader = flights.join("k", lambda: None)
+            capture = ResponseCapture(None, "k", on_finish=leader.complete)
+            capture.write(b"[")
+            # an identical request of the same worker doesn't wait for the leader, which can only continue
+            # streaming once the worker thread is free
+            start = monotonic()
+            self.assertEqual(flights.join("k", lambda: None), (None, None))
+            self.assertLess(monotonic() - start, 1)
+            self.assertEqual(metrics.get("single_flight.concurrent"), 1)
+            capture.write(b"]")
+            capture.finish(True)
+        self.assertTrue(leader.done)
+        self.assertEqual(leader.body, b"[]")
+
+    def test_released_with_request(self):
+        flights, _ = self._flights()
+        with app.app_context():
+            _, leader = flights.join("k", lambda: None)
+            flights.release_request_flights()
+        self.assertTrue(leader.done)
+        with app.app_context():
+            _, leader = flights.join("k", lambda: None)
+        self.assertIsNotNone(leader)
+
+    def test_disabled(self):
+        with app.app_context():
+            self.assertEqual(SingleFlight(0, use_redis=True).join("k", lambda: None), (None, None))
+            self.assertEqual(SingleFlight(5).join("k", lambda: None), (None, None))